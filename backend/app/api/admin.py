@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from app.models.schemas import FarmerCreate, DeviceCreate
-from app.models.database_models import Farmer, Device
+from fastapi import APIRouter, HTTPException, Depends, File, Query, Request, UploadFile
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
+from app.models.schemas import (
+    ArchiveStatsResponse, DashboardRebuildResponse, DashboardSummaryResponse, DeviceCreate, DeviceListResponse,
+    DeviceQualityReport, DeviceRegisterResponse, FarmerCreate, FarmerCreateResponse, FarmerListResponse,
+    FieldSessionListResponse, ImportReportResponse, SensorQualityResponse, SMSLogListResponse, SoilTestListResponse, StatusResponse
+)
+from app.models.database_models import Farmer, Device, FieldSession, SoilTest, SMSLog
 from app.core.database import get_db
+from app.core.http_cache import bump_farmer_version, farmer_response
 from app.core.security import get_current_admin
+from app.services import bulk_import, dashboard
+from app.services.archive import archive
+from app.services.sensor_quality import sensor_quality
 import secrets
 
 router = APIRouter(dependencies=[Depends(get_current_admin)])
 
-@router.post("/farmers")
+@router.post("/farmers", response_model=FarmerCreateResponse)
 async def create_farmer(farmer_data: FarmerCreate, db: Session = Depends(get_db)):
     """Create new farmer account"""
 
@@ -28,45 +37,47 @@ async def create_farmer(farmer_data: FarmerCreate, db: Session = Depends(get_db)
         pin=pin
     )
     db.add(farmer)
+    dashboard.record_farmer(db, farmer.region)
     db.commit()
     db.refresh(farmer)
 
-    return {"status": "success", "farmer": {
-        "id": farmer.id,
-        "name": farmer.name,
-        "phone_number": farmer.phone_number,
-        "region": farmer.region,
-        "district": farmer.district,
-        "pin": farmer.pin
-    }}
+    return {"status": "success", "farmer": farmer}
 
-@router.get("/farmers")
+@router.get("/dashboard/summary", response_model=DashboardSummaryResponse)
+async def dashboard_summary(
+    days: int = Query(30, ge=1, le=366),
+    active_days: int = Query(7, ge=1, le=366),
+    db: Session = Depends(get_db)
+):
+    """Totals, per-day activity and farmers per region, read from pre-aggregated counters"""
+    return dashboard.summary(db, days=days, active_days=active_days)
+
+@router.post("/dashboard/rebuild", response_model=DashboardRebuildResponse)
+async def rebuild_dashboard(db: Session = Depends(get_db)):
+    """Recompute the dashboard counters from the base tables"""
+    return {"status": "success", "totals": dashboard.rebuild(db)}
+
+@router.get("/farmers", response_model=FarmerListResponse)
 async def list_farmers(db: Session = Depends(get_db)):
     """List all farmers"""
-    farmers = db.query(Farmer).all()
-    return {"farmers": [{
-        "id": f.id,
-        "name": f.name,
-        "phone_number": f.phone_number,
-        "region": f.region,
-        "district": f.district,
-        "pin": f.pin,
-        "created_at": f.created_at
-    } for f in farmers]}
-
-@router.delete("/farmers/{farmer_id}")
+    return {"farmers": db.query(Farmer).all()}
+
+@router.delete("/farmers/{farmer_id}", response_model=StatusResponse)
 async def delete_farmer(farmer_id: str, db: Session = Depends(get_db)):
     """Delete a farmer and related records"""
     farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found")
 
+    dashboard.record_farmer(db, farmer.region, -1)
+    if farmer.devices:
+        dashboard.record_devices(db, -len(farmer.devices))
     db.delete(farmer)
     db.commit()
 
     return {"status": "success", "message": "Farmer deleted"}
 
-@router.post("/devices")
+@router.post("/devices", response_model=DeviceRegisterResponse)
 async def register_device(device_data: DeviceCreate, db: Session = Depends(get_db)):
     """Register new device"""
 
@@ -90,77 +101,117 @@ async def register_device(device_data: DeviceCreate, db: Session = Depends(get_d
         api_token=api_token
     )
     db.add(device)
+    dashboard.record_devices(db)
+    bump_farmer_version(db, device.farmer_id)
     db.commit()
     db.refresh(device)
 
-    return {"status": "success", "device": {
-        "id": device.id,
-        "device_id": device.device_id,
-        "sim_number": device.sim_number,
-        "farmer_id": device.farmer_id,
-        "is_active": device.is_active,
-        "created_at": device.created_at
-    }, "api_token": api_token}
-
-@router.get("/devices/{farmer_id}")
-async def get_farmer_devices(farmer_id: str, db: Session = Depends(get_db)):
-    """Get all devices for a farmer"""
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    devices = db.query(Device).filter(Device.farmer_id == farmer_id).all()
-    return {"devices": [{
-        "id": d.id,
-        "device_id": d.device_id,
-        "sim_number": d.sim_number,
-        "farmer_id": d.farmer_id,
-        "is_active": d.is_active,
-        "created_at": d.created_at
-    } for d in devices]}
-
-@router.get("/soil-tests/{farmer_id}")
-async def get_farmer_tests(farmer_id: str, db: Session = Depends(get_db)):
-    """Get all soil tests for a farmer"""
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    tests = farmer.soil_tests
-    return {"tests": [{
-        "id": t.id,
-        "timestamp": t.timestamp,
-        "location": t.location_name,
-        "ph": t.ph,
-        "moisture": t.moisture,
-        "temperature": t.temperature,
-        "nitrogen": t.nitrogen,
-        "phosphorus": t.phosphorus,
-        "potassium": t.potassium,
-        "latitude": t.latitude,
-        "longitude": t.longitude,
-        "created_at": t.created_at,
-        "recommendations": [{
-            "id": r.id,
-            "recommendation_type": r.recommendation_type,
-            "content": r.content,
-            "crops_suggested": r.crops_suggested
-        } for r in t.recommendations]
-    } for t in sorted(tests, key=lambda x: x.created_at, reverse=True)]}
-
-@router.get("/sms-logs/{farmer_id}")
-async def get_sms_logs(farmer_id: str, db: Session = Depends(get_db)):
-    """Get SMS conversation history"""
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
-    if not farmer:
-        raise HTTPException(status_code=404, detail="Farmer not found")
-
-    logs = farmer.sms_logs
-    return {"logs": [{
-        "id": l.id,
-        "direction": l.direction,
-        "phone_number": l.phone_number,
-        "message": l.message,
-        "status": l.status,
-        "created_at": l.created_at
-    } for l in sorted(logs, key=lambda x: x.created_at, reverse=True)]}
+    return {"status": "success", "device": device, "api_token": api_token}
+
+# Bulk onboarding. Plain `def` so the import runs in the threadpool instead of blocking the event loop.
+
+@router.post("/import/farmers", response_model=ImportReportResponse)
+def import_farmers(
+    file: UploadFile = File(..., description="CSV or XLSX: name, phone_number, region, district[, device_id, sim_number]"),
+    dry_run: bool = Query(False, description="Validate and check duplicates without writing"),
+    db: Session = Depends(get_db)
+):
+    """Create farmers (and their devices, when device_id is set) from a spreadsheet; reports every row"""
+    try:
+        return bulk_import.import_farmers(db, bulk_import.read_rows(file.filename, file.file), dry_run=dry_run)
+    except bulk_import.ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/import/devices", response_model=ImportReportResponse)
+def import_devices(
+    file: UploadFile = File(..., description="CSV or XLSX: device_id, sim_number and farmer_id or phone_number"),
+    dry_run: bool = Query(False, description="Validate and check duplicates without writing"),
+    db: Session = Depends(get_db)
+):
+    """Register devices for existing farmers from a spreadsheet; reports every row"""
+    try:
+        return bulk_import.import_devices(db, bulk_import.read_rows(file.filename, file.file), dry_run=dry_run)
+    except bulk_import.ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/devices/{farmer_id}", response_model=DeviceListResponse)
+async def get_farmer_devices(farmer_id: str, request: Request, db: Session = Depends(get_db)):
+    """Get all devices for a farmer (conditional GET via ETag)"""
+    def build():
+        return {"devices": db.query(Device).filter(Device.farmer_id == farmer_id).all()}
+
+    return await farmer_response(request, db, "devices", farmer_id, DeviceListResponse, build)
+
+def _with_archived(table: str, farmer_id: str, rows: list) -> list:
+    """Append a farmer's archived rows (all older than the hot ones), newest first"""
+    archived = archive.read(table, farmer_id=farmer_id, exclude_ids=[row.id for row in rows])
+    return rows + sorted(archived, key=lambda row: row.get("created_at") or "", reverse=True)
+
+@router.get("/soil-tests/{farmer_id}", response_model=SoilTestListResponse)
+async def get_farmer_tests(
+    farmer_id: str,
+    request: Request,
+    include_archived: bool = Query(False, description="Also return tests moved to the archive by retention"),
+    db: Session = Depends(get_db)
+):
+    """Get all soil tests for a farmer (conditional GET via ETag)"""
+    async def build():
+        tests = db.query(SoilTest)\
+            .options(selectinload(SoilTest.recommendations))\
+            .filter(SoilTest.farmer_id == farmer_id)\
+            .order_by(SoilTest.created_at.desc())\
+            .all()
+        if include_archived:
+            tests = await run_in_threadpool(_with_archived, "soil_tests", farmer_id, tests)
+        return {"tests": tests}
+
+    kind = "soil-tests+archive" if include_archived else "soil-tests"
+    return await farmer_response(request, db, kind, farmer_id, SoilTestListResponse, build)
+
+@router.get("/sms-logs/{farmer_id}", response_model=SMSLogListResponse)
+async def get_sms_logs(
+    farmer_id: str,
+    request: Request,
+    include_archived: bool = Query(False, description="Also return logs moved to the archive by retention"),
+    db: Session = Depends(get_db)
+):
+    """Get SMS conversation history (conditional GET via ETag)"""
+    async def build():
+        logs = db.query(SMSLog)\
+            .filter(SMSLog.farmer_id == farmer_id)\
+            .order_by(SMSLog.created_at.desc())\
+            .all()
+        if include_archived:
+            logs = await run_in_threadpool(_with_archived, "sms_logs", farmer_id, logs)
+        return {"logs": logs}
+
+    kind = "sms-logs+archive" if include_archived else "sms-logs"
+    return await farmer_response(request, db, kind, farmer_id, SMSLogListResponse, build)
+
+@router.get("/field-sessions/{farmer_id}", response_model=FieldSessionListResponse)
+async def get_field_sessions(farmer_id: str, request: Request, db: Session = Depends(get_db)):
+    """Field sessions with their composite values, newest first (conditional GET via ETag)"""
+    def build():
+        return {"sessions": db.query(FieldSession)
+                .filter(FieldSession.farmer_id == farmer_id)
+                .order_by(FieldSession.started_at.desc())
+                .all()}
+
+    return await farmer_response(request, db, "field-sessions", farmer_id, FieldSessionListResponse, build)
+
+@router.get("/archive", response_model=ArchiveStatsResponse)
+async def archive_stats():
+    """Rows, parts and size per archived table"""
+    return {"archive_dir": archive.root, "tables": await run_in_threadpool(archive.stats)}
+
+@router.get("/sensor-quality", response_model=SensorQualityResponse)
+async def sensor_quality_report(db: Session = Depends(get_db)):
+    """Quarantine counts and drift per device"""
+    return sensor_quality.report(db)
+
+@router.get("/sensor-quality/{device_id}", response_model=DeviceQualityReport)
+async def device_sensor_quality(device_id: str, db: Session = Depends(get_db)):
+    """Running statistics and drift per field for one device (devices.id)"""
+    if db.query(Device.id).filter(Device.id == device_id).first() is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return sensor_quality.device_report(db, device_id)
@@ -0,0 +1,100 @@
+import os
+from typing import Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.profiling import ProfilerBusy, cpu_sampler, loop_lag_monitor, memory_tracker
+from app.core.security import get_current_admin
+from app.models.schemas import LoopLagResponse, MemorySnapshotResponse, MemoryStatusResponse
+
+
+def require_profiling():
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (PROFILING_ENABLED=false)")
+
+
+router = APIRouter(dependencies=[Depends(get_current_admin), Depends(require_profiling)])
+
+
+def _download(content: bytes, media_type: str, filename: str) -> Response:
+    return Response(content=content, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Profiled-Worker": str(os.getpid()),
+    })
+
+
+@router.get("/cpu", response_class=Response, responses={200: {
+    "content": {"application/json": {}, "application/octet-stream": {}},
+    "description": "speedscope JSON or a pstats file",
+}})
+async def cpu_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    format: str = Query("speedscope", pattern="^(speedscope|pstats)$"),
+    all_threads: bool = False
+):
+    """Sample this worker's stacks for `seconds` while it keeps serving; by default the event loop thread only"""
+    if seconds > settings.profiling_max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.profiling_max_seconds:g}")
+    try:
+        profile = await cpu_sampler.profile(
+            seconds, interval_ms or settings.profiling_sample_interval_ms, all_threads=all_threads
+        )
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A CPU profile is already running in this worker")
+
+    name = f"cpu-{os.getpid()}-{profile.started_at:%Y%m%dT%H%M%S}"
+    if format == "pstats":
+        return _download(await run_in_threadpool(profile.pstats), "application/octet-stream", f"{name}.pstats")
+    content = await run_in_threadpool(lambda: orjson.dumps(profile.speedscope()))
+    return _download(content, "application/json", f"{name}.speedscope.json")
+
+
+@router.get("/loop-lag", response_model=LoopLagResponse)
+async def loop_lag():
+    """Recent event loop stalls over LOOP_LAG_THRESHOLD_MS, with the stack that was running"""
+    return loop_lag_monitor.report()
+
+
+@router.get("/memory", response_model=MemoryStatusResponse)
+async def memory_status():
+    return memory_tracker.status()
+
+
+@router.post("/memory/start", response_model=MemoryStatusResponse)
+async def start_memory_tracing(
+    frames: int = Query(10, ge=1, le=50),
+    max_minutes: float = Query(30, gt=0, le=240)
+):
+    """Start tracemalloc in this worker; it stops itself after `max_minutes`"""
+    memory_tracker.start(frames, max_minutes)
+    return memory_tracker.status()
+
+
+@router.post("/memory/stop", response_model=MemoryStatusResponse)
+async def stop_memory_tracing():
+    memory_tracker.stop()
+    return memory_tracker.status()
+
+
+@router.post("/memory/snapshot", response_model=MemorySnapshotResponse)
+async def memory_snapshot(
+    limit: int = Query(20, ge=1, le=200),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Top allocation sites, with growth since the previous snapshot"""
+    if not memory_tracker.tracing:
+        raise HTTPException(status_code=409, detail="Memory tracing is not running; POST /memory/start first")
+    return await run_in_threadpool(memory_tracker.snapshot, limit, key_type)
+
+
+@router.get("/memory/snapshot/download", response_class=Response)
+async def download_memory_snapshot():
+    """The last snapshot, for tracemalloc.Snapshot.load() offline"""
+    content = await run_in_threadpool(memory_tracker.dump)
+    if content is None:
+        raise HTTPException(status_code=404, detail="No snapshot taken yet")
+    return _download(content, "application/octet-stream", f"memory-{os.getpid()}.tracemalloc")
@@ -1,13 +1,19 @@
+import logging
+from typing import Dict, Optional
 from fastapi import APIRouter, HTTPException, Request, Depends
 from sqlalchemy.orm import Session
 from app.models.database_models import Farmer, SMSLog, SMSSession
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.http_cache import bump_farmer_version
 from app.services.weather_service import weather_service
-from app.services.ai_agronomist import ai_agronomist
+from app.services import recommendations, soil_history
+from app.services.ai_agronomist import UNAVAILABLE_MESSAGE, ai_agronomist
+from app.services.dashboard import record_sms
 from app.services.sms_service import sms_service
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/receive")
 async def receive_sms(request: Request, db: Session = Depends(get_db)):
@@ -37,6 +43,7 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
 
     if not farmer:
         # Unknown number
+        logger.info("SMS from unregistered number")
         await sms_service.send_sms(
             from_number,
             "Phone number not registered. Contact B&J Agrotech support."
@@ -52,6 +59,10 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
         status="received"
     )
     db.add(sms_log)
+    record_sms(db, sms_log.status)
+    bump_farmer_version(db, farmer.id)
+    # Committed before any AI or weather call, so no row stays locked across them
+    db.commit()
 
     # Get active session
     session = db.query(SMSSession)\
@@ -60,14 +71,15 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
         .first()
 
     if not session:
-        db.commit()
+        logger.info("SMS received without an active session", extra={"farmer_id": farmer.id})
         await sms_service.send_sms(
             from_number,
             "No active session. Please run a soil test first."
         )
         return {"status": "no_session"}
 
-    soil_test = session.soil_test
+    # A completed field session answers with its composite values, otherwise the single sample
+    soil_test = session.field_session or session.soil_test
 
     # Prepare soil data
     soil_data = {
@@ -79,11 +91,34 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
         "potassium": soil_test.potassium
     }
 
-    # Get weather data
-    weather_data = await weather_service.get_weather_data(
-        soil_test.latitude,
-        soil_test.longitude
-    )
+    async def weather_data() -> Dict:
+        """Weather is only fetched by the branches that use it"""
+        return await weather_service.get_weather_data(
+            soil_test.latitude,
+            soil_test.longitude
+        )
+
+    async def live_answer(kind: str, crop: Optional[str]) -> Optional[str]:
+        history = soil_history.load_context(db, farmer.id, soil_test.latitude, soil_test.longitude)
+        if kind == recommendations.CROP_SUGGESTION:
+            return await ai_agronomist.get_crop_recommendations(soil_data, await weather_data(), history)
+        if kind == recommendations.FERTILIZER_ADVICE:
+            return await ai_agronomist.get_fertilizer_advice(soil_data, history=history)
+        return await ai_agronomist.check_specific_crop(crop, soil_data, await weather_data(), history)
+
+    async def answer(kind: str, crop: Optional[str] = None) -> str:
+        """Precomputed answer for the session's test (one indexed lookup), else a live call that is kept"""
+        if session.soil_test_id:
+            stored = recommendations.lookup(db, session.soil_test_id, kind, crop)
+            if stored is not None:
+                return stored
+        text = await live_answer(kind, crop)
+        if text is None:
+            # AI unavailable: nothing is kept, so the next reply tries again
+            return UNAVAILABLE_MESSAGE
+        if session.soil_test_id:
+            recommendations.store(db, session.soil_test_id, farmer.id, kind, text, crop)
+        return text
 
     # Handle user response
     response_message = ""
@@ -91,31 +126,24 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
 
     if content_upper in ["1", "ONE"]:
         # AI crop suggestions
-        response_message = await ai_agronomist.get_crop_recommendations(
-            soil_data,
-            weather_data
-        )
+        response_message = await answer(recommendations.CROP_SUGGESTION)
 
         # Update session
         session.state = "completed"
 
     elif content_upper in ["2", "TWO"]:
         # Ask for crop name
-        response_message = "Which crop? Reply: MAIZE, BEANS, COFFEE, CASSAVA, BANANAS, TOMATOES, etc."
+        response_message = recommendations.CROP_PROMPT
         session.state = "awaiting_crop"
 
     elif content_upper in ["3", "THREE"]:
         # Fertilizer advice
-        response_message = await ai_agronomist.get_fertilizer_advice(soil_data)
+        response_message = await answer(recommendations.FERTILIZER_ADVICE)
         session.state = "completed"
 
     elif session.state == "awaiting_crop":
         # User sent crop name - check it
-        response_message = await ai_agronomist.check_specific_crop(
-            content_upper,
-            soil_data,
-            weather_data
-        )
+        response_message = await answer(recommendations.CROP_SUITABILITY, content_upper[:50])
         session.state = "completed"
 
     else:
@@ -123,6 +151,7 @@ async def receive_sms(request: Request, db: Session = Depends(get_db)):
 
     # Commit session changes
     db.commit()
+    logger.info("SMS reply processed", extra={"farmer_id": farmer.id, "session_state": session.state})
 
     # Send response
     if response_message:
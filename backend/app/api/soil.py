@@ -1,21 +1,121 @@
-from fastapi import APIRouter, HTTPException, Header, Depends
+import logging
+import zlib
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Depends, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models.schemas import SoilDataUpload
-from app.models.database_models import Device, SoilTest, Recommendation, SMSSession
+from app.models.compact_upload import CONTENT_TYPE as COMPACT_CONTENT_TYPE, CompactDecodeError, decode_soil_upload
+from app.models.schemas import SoilDataUpload, SoilUploadResponse
+from app.models.database_models import Device, Farmer, SoilTest
+from app.core.cache import get_cache
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.http_cache import bump_farmer_version
 from app.services.weather_service import weather_service
-from app.services.ai_agronomist import ai_agronomist
-from app.services.sms_service import sms_service
+from app.services.dashboard import record_soil_test
+from app.services.sensor_quality import QUARANTINED, sensor_quality
+from app.services import field_sessions, soil_history
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/upload")
+# Responses of completed uploads, keyed by idempotency key, so device retries
+# get the original result without redoing weather, AI or SMS work (whichever worker they reach)
+upload_responses = get_cache("soil_upload", settings.idempotency_ttl_seconds)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Upper bound on a decompressed upload body; a real sample is well under 1 KB
+MAX_UPLOAD_BYTES = 64 * 1024
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        # zlib-wrapped per RFC 9110; some firmware sends raw deflate instead
+        zlib_wrapped = len(body) >= 2 and (body[0] & 0x0F) == 8 and (body[0] << 8 | body[1]) % 31 == 0
+        raw = not zlib_wrapped
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS if raw else zlib.MAX_WBITS)
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+    try:
+        decoded = decompressor.decompress(body, MAX_UPLOAD_BYTES + 1)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid compressed body")
+    if len(decoded) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    return decoded
+
+async def parse_soil_upload(request: Request) -> SoilDataUpload:
+    """Decode a JSON or compact binary upload, optionally gzip/deflate compressed"""
+    body = await request.body()
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding != "identity":
+        body = _decompress(body, encoding)
+    elif len(body) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    try:
+        if content_type == COMPACT_CONTENT_TYPE:
+            return decode_soil_upload(body)
+        if content_type in ("application/json", ""):
+            return SoilDataUpload.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+    except CompactDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Type: {content_type}")
+
+_UPLOAD_BODY_DOC = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": SoilDataUpload.model_json_schema()},
+            COMPACT_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+def _idempotency_key(device: Device, data: SoilDataUpload, header_key: Optional[str]) -> str:
+    """Client-supplied Idempotency-Key, else the natural key (device, timestamp, sample_number)"""
+    if header_key:
+        return f"soil-upload:{device.id}:key:{header_key}"
+    return f"soil-upload:{device.id}:{data.timestamp.isoformat()}:{data.sample_number}"
+
+def _find_existing_test(db: Session, device: Device, data: SoilDataUpload) -> Optional[SoilTest]:
+    return db.query(SoilTest).filter(
+        SoilTest.device_id == device.id,
+        SoilTest.timestamp == data.timestamp,
+        SoilTest.sample_number == data.sample_number
+    ).first()
+
+def _duplicate_response(soil_test: SoilTest) -> dict:
+    """Response for a retry whose original result is no longer cached"""
+    return {
+        "status": "success",
+        "soil_test_id": soil_test.id,
+        "location": soil_test.location_name,
+        "weather_summary": None,
+        "message": "Duplicate upload; data was already received",
+        "sms_result": None,
+        "duplicate": True
+    }
+
+@router.post("/upload", response_model=SoilUploadResponse, openapi_extra=_UPLOAD_BODY_DOC)
 async def upload_soil_data(
-    data: SoilDataUpload,
+    response: Response,
+    data: SoilDataUpload = Depends(parse_soil_upload),
     authorization: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Receive soil data from IoT device"""
+    """Receive soil data from IoT device (safe to retry)"""
 
     # Verify device token
     if not authorization or not authorization.startswith("Bearer "):
@@ -37,14 +137,37 @@ async def upload_soil_data(
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found for this device")
 
-    # Get weather data for location
-    weather_data = await weather_service.get_weather_data(
-        data.gps_latitude,
-        data.gps_longitude
-    )
+    key = _idempotency_key(device, data, idempotency_key)
 
-    # Create soil test data
-    soil_test = SoilTest(
+    cached = await upload_responses.aget(key)
+    if cached is not None:
+        response.headers[REPLAYED_HEADER] = "true"
+        return cached
+
+    existing = _find_existing_test(db, device, data)
+    if existing:
+        logger.info("Duplicate soil upload", extra={"soil_test_id": existing.id})
+        response.headers[REPLAYED_HEADER] = "true"
+        return _duplicate_response(existing)
+
+    # The unique index on (device, timestamp, sample_number) is the guard that holds across workers:
+    # the insert comes before any side effect, so a concurrent retry fails there and changes nothing
+    try:
+        result = await _process_upload(data, device, farmer, db)
+    except IntegrityError:
+        # Another request (any worker) stored the same sample between our check and insert
+        db.rollback()
+        existing = _find_existing_test(db, device, data)
+        if not existing:
+            raise
+        response.headers[REPLAYED_HEADER] = "true"
+        return _duplicate_response(existing)
+    await upload_responses.aset(key, result)
+
+    return result
+
+def _soil_test(data: SoilDataUpload, device: Device, farmer: Farmer, location: Optional[str]) -> SoilTest:
+    return SoilTest(
         device_id=device.id,
         farmer_id=farmer.id,
         timestamp=data.timestamp,
@@ -57,16 +180,46 @@ async def upload_soil_data(
         nitrogen=data.soil_nitrogen_mgkg,
         phosphorus=data.soil_phosphorus_mgkg,
         potassium=data.soil_potassium_mgkg,
-        location_name=weather_data["location"],
+        location_name=location,
         sample_number=data.sample_number,
         sample_depth_cm=data.sample_depth_cm
     )
+
+def _store_sample(data: SoilDataUpload, device: Device, farmer: Farmer, db: Session) -> SoilTest:
+    """Insert the sample, then check it against the device's statistics (caller's transaction).
+
+    A duplicate fails on the unique index at the flush, before the statistics or counters change.
+    """
+    soil_test = _soil_test(data, device, farmer, None)
     db.add(soil_test)
-    db.flush()  # Flush to get the ID without committing
+    db.flush()
+    # Impossible or anomalous readings never reach the agronomist or the farmer
+    flags = sensor_quality.check(db, soil_test)
+    if flags:
+        soil_test.quality_status = QUARANTINED
+        soil_test.quality_flags = flags
+    record_soil_test(db, device)
+    bump_farmer_version(db, farmer.id)
+    return soil_test
 
-    soil_test_id = soil_test.id
+def _quarantine_upload(soil_test: SoilTest, db: Session) -> dict:
+    """Keep a flagged reading for the admins, without weather, AI or SMS"""
+    flags = soil_test.quality_flags
+    db.commit()
+
+    return {
+        "status": QUARANTINED,
+        "soil_test_id": soil_test.id,
+        "location": None,
+        "weather_summary": None,
+        "message": "Reading failed sensor checks; no recommendation or SMS was sent",
+        "sms_result": None,
+        "quality_flags": flags
+    }
+
+async def _process_upload(data: SoilDataUpload, device: Device, farmer: Farmer, db: Session) -> dict:
+    """Store a new sample, fetch weather, run the agronomist and notify the farmer"""
 
-    # Prepare data for AI
     soil_data_dict = {
         "ph": data.soil_ph,
         "moisture": data.soil_moisture_percent,
@@ -76,65 +229,69 @@ async def upload_soil_data(
         "potassium": data.soil_potassium_mgkg
     }
 
-    # Generate AI recommendations
-    recommendations_text = "AI recommendations temporarily unavailable"
-    try:
-        print(f"\n[DEBUG] Starting AI analysis...")
-        print(f"[DEBUG] Soil data: {soil_data_dict}")
-        print(f"[DEBUG] Weather data keys: {weather_data.keys()}")
-        
-        recommendations_text = await ai_agronomist.get_crop_recommendations(
-            soil_data_dict,
-            weather_data
-        )
-        
-        print(f"[DEBUG] AI response received: {recommendations_text[:100]}...")
-
-        # Store recommendations
-        recommendation = Recommendation(
-            soil_test_id=soil_test_id,
-            recommendation_type="crop_suggestion",
-            content=recommendations_text,
-            crops_suggested={"ai_response": recommendations_text}
-        )
-        db.add(recommendation)
-        print(f"[DEBUG] Recommendation saved to DB")
-    except Exception as e:
-        import traceback
-        print(f"\n[ERROR] AI recommendation error: {e}")
-        print(f"[ERROR] Traceback: {traceback.format_exc()}")
-
-    # Create SMS session
-    sms_session = SMSSession(
-        farmer_id=farmer.id,
-        soil_test_id=soil_test_id,
-        state="awaiting_choice"
-    )
-    db.add(sms_session)
+    soil_test = _store_sample(data, device, farmer, db)
+    if soil_test.quality_status == QUARANTINED:
+        return _quarantine_upload(soil_test, db)
+
+    if settings.field_sessions_enabled:
+        return await _add_to_field_session(soil_test, data, device, farmer, db)
 
-    # Commit all changes
+    # The sample is stored before the weather call, so no lock is held across it
     db.commit()
 
-    # Send initial SMS
-    sms_message = sms_service.generate_initial_sms(
-        farmer.name,
-        farmer.pin,
-        weather_data["location"]
+    # Get weather data for location
+    weather_data = await weather_service.get_weather_data(
+        data.gps_latitude,
+        data.gps_longitude
     )
+    soil_test.location_name = weather_data["location"]
+    bump_farmer_version(db, farmer.id)
+    history = soil_history.record(db, soil_test)
 
-    sms_result = await sms_service.send_sms(
+    sms_result = await field_sessions.advise_farmer(
+        db, farmer, soil_test.id, soil_data_dict, weather_data,
         data.phone_number,  # Use phone from device data
-        sms_message,
-        farmer.id,
-        db
+        history=history
     )
 
     return {
         "status": "success",
-        "soil_test_id": soil_test_id,
+        "soil_test_id": soil_test.id,
         "location": weather_data["location"],
         "weather_summary": weather_data["forecast"]["summary"],
         "message": "Data received, weather fetched, AI analyzed, SMS attempted",
         "sms_result": sms_result
     }
 
+async def _add_to_field_session(soil_test: SoilTest, data: SoilDataUpload, device: Device, farmer: Farmer,
+                                db: Session) -> dict:
+    """Put the stored sample in its field session; the farmer is advised once the session completes"""
+    session, ready = field_sessions.add_sample(db, device, soil_test)
+    soil_history.record(db, soil_test)
+    soil_test_id, session_id, samples = soil_test.id, session.id, session.sample_count
+    db.commit()
+
+    completed = None
+    for finished in ready:
+        result = await field_sessions.complete(db, finished.id, data.phone_number)
+        if finished.id == session_id:
+            completed = result
+
+    if completed is None:
+        return {
+            "status": "success",
+            "soil_test_id": soil_test_id,
+            "message": f"Sample {samples} of field session stored; advice follows when the session completes",
+            "field_session_id": session_id,
+            "field_session_status": field_sessions.OPEN
+        }
+    return {
+        "status": "success",
+        "soil_test_id": soil_test_id,
+        "location": completed["location"],
+        "weather_summary": completed["weather_summary"],
+        "message": f"Field session complete ({samples} samples); AI analyzed, SMS attempted",
+        "sms_result": completed["sms_result"],
+        "field_session_id": session_id,
+        "field_session_status": field_sessions.COMPLETED
+    }
@@ -0,0 +1,473 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MEMORY = "memory"
+SQLITE = "sqlite"
+REDIS = "redis"
+
+# (to_json, from_json) for values that are not plain JSON, e.g. WeatherSnapshot
+Codec = Tuple[Callable[[Any], Any], Callable[[Any], Any]]
+
+# Type tags for stored values: raw bytes, or orjson
+_BYTES = b"b"
+_JSON = b"j"
+
+
+class CacheBackend:
+    """Key/value store with per-entry expiry, used for caches, counters and locks.
+
+    The in-process backend is per worker; the SQLite and Redis backends are
+    shared by every worker on the host (or cluster, for Redis), so rate limits
+    and locks hold across gunicorn workers.
+
+    Async code uses the `a*` methods: the shared backends do file or network
+    I/O, which runs in the threadpool instead of on the event loop.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+
+    def _ttl(self, ttl_seconds: Optional[float]) -> float:
+        return self.ttl_seconds if ttl_seconds is None else ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        """Set only if the key is absent or expired; True if it was set"""
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        """Add to an integer counter, creating it with the given expiry; returns the new value.
+
+        Counters are stored raw, not pickled: read them with incr(key, 0), not get().
+        """
+        raise NotImplementedError
+
+    def incr_many(self, amounts: Dict[str, int], ttl_seconds: Optional[float] = None) -> None:
+        """incr() several counters at once: either all of them are added to or none is"""
+        raise NotImplementedError
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until the entry expires, or None if absent/expired"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await run_in_threadpool(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        await run_in_threadpool(self.set, key, value, ttl_seconds)
+
+    async def aincr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        return await run_in_threadpool(self.incr, key, amount, ttl_seconds)
+
+
+class SharedCache(CacheBackend):
+    """Base for backends shared between processes: values are stored as JSON, never pickled.
+
+    A value read from a shared store is only decoded as data, so whoever can write
+    the SQLite file or the Redis server cannot run code in the workers.
+    """
+
+    def __init__(self, ttl_seconds: float, codec: Optional[Codec] = None):
+        super().__init__(ttl_seconds)
+        self.codec = codec
+
+    def _dumps(self, value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return _BYTES + value
+        return _JSON + orjson.dumps(self.codec[0](value) if self.codec else value)
+
+    def _loads(self, raw: bytes) -> Optional[Any]:
+        raw = bytes(raw)
+        if raw[:1] == _BYTES:
+            return raw[1:]
+        if raw[:1] == _JSON:
+            value = orjson.loads(raw[1:])
+            return self.codec[1](value) if self.codec else value
+        return None  # written by an older version (pickle): treated as a miss
+
+
+class TTLCache(CacheBackend):
+    """Small thread-safe in-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, self._ttl(ttl_seconds))
+
+    def add(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._store(key, value, self._ttl(ttl_seconds))
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                self._store(key, amount, self._ttl(ttl_seconds))
+                return amount
+            value = entry[1] + amount
+            self._data[key] = (entry[0], value)
+            return value
+
+    def incr_many(self, amounts: Dict[str, int], ttl_seconds: Optional[float] = None) -> None:
+        for key, amount in amounts.items():
+            self.incr(key, amount, ttl_seconds)  # cannot fail part way
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            remaining = entry[0] - time.monotonic()
+            return remaining if remaining > 0 else None
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    # No I/O, so no threadpool hop
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.set(key, value, ttl_seconds)
+
+    async def aincr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        return self.incr(key, amount, ttl_seconds)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache(SharedCache):
+    """Cache in a local SQLite file, shared by all worker processes on the host.
+
+    Values are stored as JSON (see SharedCache). Expiry uses wall-clock time since monotonic clocks are
+    not comparable between processes. Expired rows are purged every
+    `purge_every` writes.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: float, purge_every: int = 500,
+                 codec: Optional[Codec] = None):
+        super().__init__(ttl_seconds, codec)
+        self.path = path
+        self.namespace = namespace
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value BLOB, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One connection per thread; WAL lets readers run alongside a writer
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_write(self, conn: sqlite3.Connection) -> None:
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at >= ?",
+            (self.namespace, key, time.time())
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, time.time() + self._ttl(ttl_seconds), self._dumps(value))
+        )
+        self._after_write(conn)
+
+    def add(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        conn = self._connect()
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT INTO cache_entries (namespace, key, expires_at, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET expires_at = excluded.expires_at, value = excluded.value "
+            "WHERE cache_entries.expires_at < ?",
+            (self.namespace, key, now + self._ttl(ttl_seconds), self._dumps(value), now)
+        )
+        return cursor.rowcount > 0
+
+    # Counters are stored as plain integers so the upsert can add in place
+    _INCR = (
+        "INSERT INTO cache_entries (namespace, key, expires_at, value) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (namespace, key) DO UPDATE SET "
+        "value = CASE WHEN cache_entries.expires_at < ? THEN excluded.value ELSE cache_entries.value + excluded.value END, "
+        "expires_at = CASE WHEN cache_entries.expires_at < ? THEN excluded.expires_at ELSE cache_entries.expires_at END "
+        "RETURNING value"
+    )
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(self._INCR, (self.namespace, key, now + self._ttl(ttl_seconds), amount, now, now)).fetchone()
+        self._after_write(conn)
+        return int(row[0])
+
+    def incr_many(self, amounts: Dict[str, int], ttl_seconds: Optional[float] = None) -> None:
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + self._ttl(ttl_seconds)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, amount in amounts.items():
+                conn.execute(self._INCR, (self.namespace, key, expires_at, amount, now, now)).fetchall()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._after_write(conn)
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        row = self._connect().execute(
+            "SELECT expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        remaining = row[0] - time.time()
+        return remaining if remaining > 0 else None
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+
+class RedisCache(SharedCache):
+    """Cache in Redis (or any Redis-compatible server), shared across hosts"""
+
+    def __init__(self, url: str, namespace: str, ttl_seconds: float, codec: Optional[Codec] = None):
+        super().__init__(ttl_seconds, codec)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        self.namespace = namespace
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, key: str) -> str:
+        return f"bandj:{self.namespace}:{key}"
+
+    def _ms(self, ttl_seconds: Optional[float]) -> int:
+        return max(1, int(self._ttl(ttl_seconds) * 1000))
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._redis.get(self._key(key))
+        return self._loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self._redis.set(self._key(key), self._dumps(value), px=self._ms(ttl_seconds))
+
+    def add(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        return bool(self._redis.set(self._key(key), self._dumps(value), px=self._ms(ttl_seconds), nx=True))
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        full_key = self._key(key)
+        pipe = self._redis.pipeline()
+        # Create with the expiry first so INCRBY never leaves a counter without one
+        pipe.set(full_key, 0, px=self._ms(ttl_seconds), nx=True)
+        pipe.incrby(full_key, amount)
+        _, value = pipe.execute()
+        return int(value)
+
+    def incr_many(self, amounts: Dict[str, int], ttl_seconds: Optional[float] = None) -> None:
+        # MULTI/EXEC: applied together or not at all
+        pipe = self._redis.pipeline(transaction=True)
+        for key, amount in amounts.items():
+            pipe.set(self._key(key), 0, px=self._ms(ttl_seconds), nx=True)
+            pipe.incrby(self._key(key), amount)
+        pipe.execute()
+
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        ms = self._redis.pttl(self._key(key))
+        return ms / 1000 if ms > 0 else None
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(self._key(key))
+
+    def clear(self) -> None:
+        for key in self._redis.scan_iter(match=self._key("*")):
+            self._redis.delete(key)
+
+
+def get_cache(namespace: str, ttl_seconds: float, max_entries: int = 10000, codec: Optional[Codec] = None) -> CacheBackend:
+    """Cache for one namespace on the configured backend (CACHE_BACKEND).
+
+    Values must be JSON-serializable or bytes, or `codec` must convert them; the
+    in-process backend keeps the objects themselves.
+    """
+    backend = settings.cache_backend
+    if backend == SQLITE:
+        return SQLiteCache(settings.cache_sqlite_path, namespace, ttl_seconds, codec=codec)
+    if backend == REDIS:
+        return RedisCache(settings.redis_url, namespace, ttl_seconds, codec=codec)
+    if backend != MEMORY:
+        logger.warning("Unknown CACHE_BACKEND, using in-process cache", extra={"cache_backend": backend})
+    return TTLCache(ttl_seconds, max_entries)
+
+
+# Hit/miss counters live in a namespace of their own, so clearing or evicting the cache they
+# describe never resets them; they are reset if idle this long
+STATS_NAMESPACE = "cache_stats"
+STATS_TTL_SECONDS = 30 * 86400
+# How often each worker adds its new hits/misses to the backend's totals
+STATS_FLUSH_SECONDS = 10
+
+
+class HitCounter:
+    """Hit/miss counts kept in the worker; a background thread adds them to totals in the backend.
+
+    Counting is a plain integer increment, so a cache lookup never waits on the
+    backend. With a shared backend the totals cover every worker, up to
+    STATS_FLUSH_SECONDS behind. Totals are kept in STATS_NAMESPACE, apart from
+    the entries of the cache being counted.
+    """
+
+    _counters: List["HitCounter"] = []
+    _flusher: Optional[threading.Thread] = None
+    _flusher_lock = threading.Lock()
+    _stats: Optional[CacheBackend] = None
+
+    def __init__(self, name: str, backend: Optional[CacheBackend] = None):
+        self._backend = backend
+        self.name = name
+        self.local_hits = 0
+        self.local_misses = 0
+        self._flushed_hits = 0
+        self._flushed_misses = 0
+        self._lock = threading.Lock()
+        HitCounter._counters.append(self)
+
+    def hit(self) -> None:
+        self.local_hits += 1
+        if HitCounter._flusher is None:
+            self._start_flusher()
+
+    def miss(self) -> None:
+        self.local_misses += 1
+        if HitCounter._flusher is None:
+            self._start_flusher()
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            with HitCounter._flusher_lock:
+                # One store per process, so in-process totals are not split between instances
+                if HitCounter._stats is None:
+                    HitCounter._stats = get_cache(STATS_NAMESPACE, STATS_TTL_SECONDS)
+            self._backend = HitCounter._stats
+        return self._backend
+
+    @classmethod
+    def _start_flusher(cls) -> None:
+        with cls._flusher_lock:
+            if cls._flusher is None:
+                cls._flusher = threading.Thread(target=cls._flush_forever, name="cache-stats", daemon=True)
+                cls._flusher.start()
+
+    @classmethod
+    def _flush_forever(cls) -> None:
+        while True:
+            time.sleep(STATS_FLUSH_SECONDS)
+            for counter in list(cls._counters):
+                try:
+                    counter.flush()
+                except Exception:
+                    logger.warning("Could not flush cache stats", exc_info=True, extra={"cache": counter.name})
+
+    def flush(self) -> None:
+        """Add hits/misses since the last flush to the backend totals (blocking I/O)"""
+        with self._lock:
+            hits, misses = self.local_hits, self.local_misses
+            deltas = {f"{self.name}:hits": hits - self._flushed_hits, f"{self.name}:misses": misses - self._flushed_misses}
+            if any(deltas.values()):
+                # Both or neither: a failed flush is retried whole next time, never half of it twice
+                self.backend.incr_many(deltas, ttl_seconds=STATS_TTL_SECONDS)
+            self._flushed_hits, self._flushed_misses = hits, misses
+
+    def snapshot(self) -> Dict:
+        """Totals across workers (this worker's counts flushed first); blocking I/O, call off the loop"""
+        self.flush()
+        # incr by 0 reads a counter the same way on every backend
+        hits = self.backend.incr(f"{self.name}:hits", 0, ttl_seconds=STATS_TTL_SECONDS)
+        misses = self.backend.incr(f"{self.name}:misses", 0, ttl_seconds=STATS_TTL_SECONDS)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "worker": {"pid": os.getpid(), "hits": self.local_hits, "misses": self.local_misses},
+        }
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
+
+from app.core.config import on_reload, settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Fail fast when a provider keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected immediately. Once `recovery_seconds` have passed it goes
+    half-open and lets up to `half_open_max_calls` probe calls through: a
+    success closes it again, a failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.failures = 0
+        self.rejections = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._transition(HALF_OPEN)
+            self._half_open_in_flight = 0
+
+    def _transition(self, state: str) -> None:
+        if state != self._state:
+            logger.warning("Circuit state change", extra={"circuit": self.name, "from": self._state, "to": state})
+            self._state = state
+            if state == OPEN:
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def configure(self, failure_threshold: int, recovery_seconds: float, half_open_max_calls: int) -> None:
+        """Change limits in place; the current state and counters are kept"""
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.recovery_seconds = recovery_seconds
+            self.half_open_max_calls = half_open_max_calls
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self.rejections += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                self._transition(OPEN)
+            elif self._state == CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def release(self) -> None:
+        """Give back an admitted request that never ran: neither a success nor a failure"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Run `fn` through the breaker; raises CircuitOpenError without calling it when open"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        return await self.call_admitted(fn, *args, **kwargs)
+
+    async def call_admitted(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """`call` for a caller that already got True from allow_request()"""
+        self.calls += 1
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: neither a success nor a failure, just give back the probe slot
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict:
+        state = self.state
+        return {
+            "state": state,
+            "consecutive_failures": self._consecutive_failures,
+            "seconds_until_probe": (
+                round(max(0.0, self.recovery_seconds - (time.monotonic() - self._opened_at)), 1)
+                if state == OPEN else None
+            ),
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejections": self.rejections,
+            "times_opened": self.times_opened,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+        }
+
+
+def _parse_overrides(spec: Optional[str]) -> Dict[str, Tuple[int, float]]:
+    """Parse "weather=3:60,sms=5:30" (threshold:recovery_seconds) into a mapping"""
+    overrides = {}
+    for item in (spec or "").split(","):
+        if "=" not in item or ":" not in item:
+            continue
+        name, values = item.split("=", 1)
+        threshold, recovery = values.split(":", 1)
+        overrides[name.strip()] = (int(threshold), float(recovery))
+    return overrides
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def _configured(name: str) -> Tuple[int, float]:
+    return _parse_overrides(settings.circuit_breaker_overrides).get(
+        name, (settings.circuit_failure_threshold, settings.circuit_recovery_seconds)
+    )
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Shared breaker for a provider, configured from settings on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        threshold, recovery = _configured(name)
+        breaker = CircuitBreaker(name, threshold, recovery, settings.circuit_half_open_max_calls)
+        _breakers[name] = breaker
+    return breaker
+
+
+@on_reload
+def _reconfigure_breakers(changed: Set[str]) -> None:
+    """Settings reload hook: new thresholds apply to existing breakers, keeping their state"""
+    if not changed & {"circuit_failure_threshold", "circuit_recovery_seconds",
+                      "circuit_half_open_max_calls", "circuit_breaker_overrides"}:
+        return
+    for name, breaker in _breakers.items():
+        breaker.configure(*_configured(name), settings.circuit_half_open_max_calls)
+
+
+def breaker_states() -> Dict[str, Dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -1,35 +1,277 @@
+"""
+Typed settings, validated at startup and reloadable without a restart.
+
+Values come from, highest priority first: the process environment, the .env
+file (ENV_FILE, default the nearest .env) and, if SECRETS_DIR is set, one file
+per setting in that directory (e.g. /run/secrets/TELERIVET_API_KEY, as mounted
+by Docker or Kubernetes secrets). An invalid value stops the process at import.
+
+SIGHUP, or a change to the .env file or the secrets directory, re-reads every
+source in each worker. Changed values are written onto the existing `settings`
+object, so modules holding a reference see them, and the `on_reload` hooks let
+services rebind credentials and connection pools. A reload that does not
+validate is rejected and the running values are kept.
+"""
+
+import asyncio
+import inspect
+import logging
 import os
-from dotenv import load_dotenv
-from typing import Optional
+import tempfile
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple, Union
 
-load_dotenv()
+from dotenv import find_dotenv
+from pydantic import Field, ValidationError, field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-class Settings:
-    def __init__(self):
-        # Database (Supabase Postgres only)
-        self.database_url: str = os.getenv("SUPABASE_DB_URL")
+logger = logging.getLogger(__name__)
+
+ENV_FILE = os.getenv("ENV_FILE") or find_dotenv() or ".env"
+SECRETS_DIR = os.getenv("SECRETS_DIR") or None
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=ENV_FILE, env_file_encoding="utf-8", secrets_dir=SECRETS_DIR, extra="ignore",
+        protected_namespaces=("model_",),
+    )
+
+    # Database (Supabase Postgres only)
+    database_url: Optional[str] = Field(None, validation_alias="SUPABASE_DB_URL")
+
+    db_pool_size: int = Field(5, ge=1)
+    db_max_overflow: int = Field(10, ge=0)
+
+    # Supabase
+    supabase_url: Optional[str] = None
+    supabase_key: Optional[str] = None
+
+    # Telerivet
+    telerivet_api_key: Optional[str] = None
+    telerivet_project_id: Optional[str] = None
+    telerivet_webhook_secret: Optional[str] = None
+    telerivet_base_url: str = "https://api.telerivet.com/v1"
+
+    # Weather
+    openweather_api_key: Optional[str] = None
+    openweather_base_url: str = "https://api.openweathermap.org/data/2.5"
+    openweather_calls_per_minute: int = Field(60, ge=1)
+    weather_grid_degrees: float = Field(0.1, gt=0)  # ~11 km cells
+    weather_cache_ttl_seconds: float = Field(1800, gt=0)
+    weather_prefetch_enabled: bool = True
+    weather_prefetch_interval_seconds: float = Field(600, gt=0)
+    weather_prefetch_lookback_days: int = Field(30, ge=1)
+    # Fraction of the OpenWeather quota the prefetcher may use; the rest is left for cache misses
+    weather_prefetch_quota_share: float = Field(0.5, gt=0, le=1)
+
+    # AI (at least one required)
+    google_gemini_api_key: Optional[str] = None
+    openai_api_key: Optional[str] = None
+
+    # App
+    api_secret_key: Optional[str] = None
+    admin_registration_code: Optional[str] = None
+    access_token_expire_minutes: int = Field(60, ge=1)
+    backend_url: str = "http://localhost:8000"
+    frontend_url: str = "http://localhost:3000"
+    # Admin reads: how long a serialized per-farmer response is reused (until the farmer's data changes)
+    response_cache_ttl_seconds: float = Field(30, ge=0)
+    # Sensor quality: readings this many std devs from a device's running mean are quarantined
+    anomaly_z_threshold: float = Field(4, gt=0)
+    anomaly_min_samples: int = Field(10, ge=2)  # warm-up before z-scores
+    anomaly_window_size: int = Field(10, ge=2)  # recent values for stuck/drift
+    anomaly_drift_threshold: float = Field(3, gt=0)
+    # Field sessions: samples from one device within this time and radius are advised on together
+    field_sessions_enabled: bool = True
+    field_session_idle_seconds: float = Field(600, ge=0)
+    field_session_radius_m: float = Field(150, gt=0)
+    field_session_max_samples: int = Field(10, ge=1)
+    field_session_check_interval_seconds: float = Field(60, gt=0)
+    # Soil history for the agronomist: half-life of a sample's weight, and the grid that defines a field
+    soil_history_half_life_days: float = Field(90, gt=0)
+    soil_history_field_grid_degrees: float = Field(0.002, gt=0)  # ~220 m cells
+    # Bulk CSV/XLSX onboarding: rows validated, checked and inserted per transaction
+    import_chunk_size: int = Field(1000, ge=1)
+    # Soil uploads: how long a completed response is replayed to device retries
+    idempotency_ttl_seconds: float = Field(86400, gt=0)
+
+    # Cache / rate-limit backend: "memory" (per worker), "sqlite" (shared file) or "redis"
+    cache_backend: Literal["memory", "sqlite", "redis"] = "memory"
+    cache_sqlite_path: str = os.path.join(tempfile.gettempdir(), "bandj-cache.sqlite3")
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Retention: rows older than this are moved to the archive (0 keeps them forever)
+    archive_dir: str = "archive"
+    sms_log_retention_days: int = Field(180, ge=0)
+    soil_test_retention_days: int = Field(730, ge=0)
+    retention_batch_size: int = Field(5000, ge=1)
+
+    # Circuit breakers for OpenWeather, Telerivet and the AI provider
+    circuit_failure_threshold: int = Field(5, ge=1)
+    circuit_recovery_seconds: float = Field(30, gt=0)
+    circuit_half_open_max_calls: int = Field(1, ge=1)
+    circuit_breaker_overrides: Optional[str] = None  # e.g. "weather=3:60"
+    weather_last_known_ttl_seconds: float = Field(86400, gt=0)
+
+    # Health probes
+    health_cache_seconds: float = Field(2, ge=0)
+    health_check_timeout_seconds: float = Field(2, gt=0)  # DB probe; also its statement_timeout
+    pool_saturation_threshold: float = Field(0.9, gt=0, le=1)
+    queue_depth_threshold: int = Field(1000, ge=1)
+
+    auto_migrate: bool = False
+
+    # Profiling (admin only, per worker): CPU sampling window limits and the event loop stall watchdog
+    profiling_enabled: bool = False  # opt-in: the endpoints expose stacks and allocation sites
+    profiling_max_seconds: float = Field(60, gt=0)
+    profiling_sample_interval_ms: float = Field(10, ge=1)
+    loop_lag_monitor_enabled: bool = True
+    loop_lag_threshold_ms: float = Field(100, gt=0)
+
+    # Traffic capture for benchmarks/replay.py: sanitized upload and webhook bodies, gzip NDJSON
+    capture_enabled: bool = False
+    capture_dir: str = "captures"
+    capture_sample_rate: float = Field(1.0, ge=0, le=1)
+    capture_max_file_mb: float = Field(64, gt=0)
+    capture_key: Optional[str] = None  # HMAC key for pseudonyms; defaults to API_SECRET_KEY
 
-        # Supabase
-        self.supabase_url: Optional[str] = os.getenv("SUPABASE_URL")
-        self.supabase_key: Optional[str] = os.getenv("SUPABASE_KEY")
+    # Hot reload: how often each worker checks the .env file and secrets directory (0 disables)
+    settings_watch_interval_seconds: float = Field(5, ge=0)
 
-        # Telerivet
-        self.telerivet_api_key: str = os.getenv("TELERIVET_API_KEY")
-        self.telerivet_project_id: str = os.getenv("TELERIVET_PROJECT_ID")
-        self.telerivet_webhook_secret: Optional[str] = os.getenv("TELERIVET_WEBHOOK_SECRET")
+    # Logging
+    log_level: str = "INFO"
+    log_levels: Optional[str] = None  # e.g. "app.api.soil=DEBUG,httpx=WARNING"
+    log_json: bool = True
+    log_debug_sample_rate: float = Field(0.1, ge=0, le=1)
 
-        # Weather
-        self.openweather_api_key: str = os.getenv("OPENWEATHER_API_KEY")
+    @field_validator("cache_backend", mode="before")
+    @classmethod
+    def _lower(cls, value):
+        return value.lower() if isinstance(value, str) else value
 
-        # AI (at least one required)
-        self.google_gemini_api_key: Optional[str] = os.getenv("GOOGLE_GEMINI_API_KEY")
-        self.openai_api_key: Optional[str] = os.getenv("OPENAI_API_KEY")
+    @field_validator("log_level")
+    @classmethod
+    def _known_level(cls, value: str) -> str:
+        if value.upper() not in logging.getLevelNamesMapping():
+            raise ValueError(f"unknown log level {value!r}")
+        return value.upper()
+
+    @field_validator("circuit_breaker_overrides", "log_levels")
+    @classmethod
+    def _pairs(cls, value: Optional[str]) -> Optional[str]:
+        """Comma-separated name=value pairs; a typo here would otherwise be ignored silently"""
+        for item in (value or "").split(","):
+            if item.strip() and "=" not in item:
+                raise ValueError(f"expected name=value, got {item.strip()!r}")
+        return value
 
-        # App
-        self.api_secret_key: str = os.getenv("API_SECRET_KEY")
-        self.admin_registration_code: Optional[str] = os.getenv("ADMIN_REGISTRATION_CODE")
-        self.access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
-        self.backend_url: str = os.getenv("BACKEND_URL", "http://localhost:8000")
-        self.frontend_url: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 settings = Settings()
+
+# Read once by long-lived objects (cache connections and TTLs, log handlers, background tasks)
+RESTART_REQUIRED = {
+    "cache_backend", "cache_sqlite_path", "redis_url", "log_json",
+    "weather_cache_ttl_seconds", "weather_last_known_ttl_seconds",
+    "idempotency_ttl_seconds", "response_cache_ttl_seconds",
+    "weather_prefetch_enabled", "field_sessions_enabled", "loop_lag_monitor_enabled",
+}
+
+ReloadHook = Callable[[Set[str]], Union[None, Awaitable[None]]]
+_reload_hooks: List[ReloadHook] = []
+
+
+def on_reload(hook: ReloadHook) -> ReloadHook:
+    """Register `hook(changed_setting_names)`; it may be a coroutine function"""
+    _reload_hooks.append(hook)
+    return hook
+
+
+async def reload_settings() -> Set[str]:
+    """Re-read every source, apply what changed and run the hooks; returns the changed names"""
+    try:
+        fresh = Settings()
+    except ValidationError as e:
+        # Locations and messages only: the rejected input may be a secret
+        errors = [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()]
+        settings_watcher.last_reload = {"at": datetime.utcnow().isoformat(), "errors": errors}
+        logger.error("Settings reload rejected; keeping current values", extra={"errors": errors})
+        return set()
+
+    changed = {name for name in Settings.model_fields if getattr(fresh, name) != getattr(settings, name)}
+    for name in changed:
+        setattr(settings, name, getattr(fresh, name))
+    settings_watcher.last_reload = {"at": datetime.utcnow().isoformat(), "changed": sorted(changed)}
+    if not changed:
+        return changed
+
+    # Names only: most of what gets rotated is secret
+    logger.info("Settings reloaded", extra={"changed": sorted(changed)})
+    if changed & RESTART_REQUIRED:
+        logger.warning("Some changed settings only apply after a restart",
+                       extra={"settings": sorted(changed & RESTART_REQUIRED)})
+    for hook in _reload_hooks:
+        try:
+            result = hook(changed)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("Settings reload hook failed", extra={"hook": getattr(hook, "__qualname__", repr(hook))})
+    return changed
+
+
+class SettingsWatcher:
+    """Reloads settings when the .env file or a secret file changes (every worker watches for itself)"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._signature: Tuple = ()
+        self.last_reload: Dict = {}
+
+    @staticmethod
+    def _paths() -> List[str]:
+        paths = [ENV_FILE]
+        if SECRETS_DIR and os.path.isdir(SECRETS_DIR):
+            paths += sorted(os.path.join(SECRETS_DIR, name) for name in os.listdir(SECRETS_DIR))
+        return paths
+
+    def _current_signature(self) -> Tuple:
+        signature = []
+        for path in self._paths():
+            try:
+                # stat follows symlinks, so an atomically swapped Kubernetes secret mount counts as a change
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def start(self) -> None:
+        if self._task is None and settings.settings_watch_interval_seconds > 0:
+            self._signature = self._current_signature()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.settings_watch_interval_seconds or 5)
+            try:
+                signature = self._current_signature()
+                if signature != self._signature:
+                    self._signature = signature
+                    await reload_settings()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Settings watch failed")
+
+
+settings_watcher = SettingsWatcher()
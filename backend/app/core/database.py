@@ -1,22 +1,68 @@
+import logging
+import threading
+from typing import Set
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
+from app.core.config import on_reload, settings
 
-# Create database engine (Supabase Postgres)
-engine = create_engine(settings.database_url)
+logger = logging.getLogger(__name__)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine is created on first use so importing the app never touches the database
+_engine = None
+_engine_lock = threading.Lock()
+
+# Create SessionLocal class (bound to the engine in get_engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 # Create Base class for models
 Base = declarative_base()
 
+def get_engine() -> Engine:
+    """Return the shared engine, creating it on first call"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # Supabase Postgres; SQLite is accepted for local runs and benchmarks
+                connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+                _engine = create_engine(
+                    settings.database_url,
+                    connect_args=connect_args,
+                    pool_pre_ping=True,
+                    pool_size=settings.db_pool_size,
+                    max_overflow=settings.db_max_overflow,
+                )
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def dispose_engine() -> None:
+    """Close pooled connections (used on shutdown)"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+@on_reload
+def _rebind_engine(changed: Set[str]) -> None:
+    """Settings reload hook: sessions opened from now on use a pool built from the new URL"""
+    global _engine
+    if not changed & {"database_url", "db_pool_size", "db_max_overflow"}:
+        return
+    with _engine_lock:
+        old, _engine = _engine, None
+    if old is not None:
+        # Idle connections close now; checked-out ones close when their session returns them
+        old.dispose()
+        logger.info("Database engine rebuilt after settings reload")
+
 # Dependency to get database session
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# name -> callable returning the current depth of a background queue
+_queue_probes: Dict[str, Callable[[], int]] = {}
+
+# name -> callable returning the state of an outbound client ("open", "not_started", "closed")
+_client_probes: Dict[str, Callable[[], str]] = {}
+
+
+def register_queue(name: str, depth: Callable[[], int]) -> None:
+    """Report a background queue's depth in health checks"""
+    _queue_probes[name] = depth
+
+
+def register_client(name: str, state: Callable[[], str]) -> None:
+    """Report an outbound client's state in health checks"""
+    _client_probes[name] = state
+
+
+def _check_database() -> Dict:
+    engine = get_engine()
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                # Bounds the query server-side too, so a stuck probe does not hold a connection
+                timeout_ms = int(settings.health_check_timeout_seconds * 1000)
+                conn.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        # Details go to the log only: the endpoint is public and must not echo hosts or credentials
+        logger.warning("Database health check failed", exc_info=True)
+        return {"ok": False, "error": "database unavailable"}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+async def _check_database_within_timeout() -> Dict:
+    try:
+        return await asyncio.wait_for(run_in_threadpool(_check_database), settings.health_check_timeout_seconds)
+    except asyncio.TimeoutError:
+        logger.warning("Database health check timed out", extra={"timeout_seconds": settings.health_check_timeout_seconds})
+        return {"ok": False, "error": "database check timed out"}
+
+
+def _pool_stats() -> Dict:
+    pool = get_engine().pool
+    if not hasattr(pool, "checkedout") or not hasattr(pool, "size"):
+        return {"ok": True, "type": type(pool).__name__}
+
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    checked_out = pool.checkedout()
+    saturation = checked_out / capacity if capacity else 0.0
+    return {
+        "ok": saturation < settings.pool_saturation_threshold,
+        "type": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "capacity": capacity,
+        "saturation": round(saturation, 3),
+    }
+
+
+def _client_states() -> Dict:
+    clients = {name: probe() for name, probe in _client_probes.items()}
+    return {"ok": all(state != "closed" for state in clients.values()), "clients": clients}
+
+
+def _queue_depths() -> Dict:
+    depths = {name: probe() for name, probe in _queue_probes.items()}
+    return {
+        "ok": all(depth < settings.queue_depth_threshold for depth in depths.values()),
+        "depths": depths,
+    }
+
+
+class HealthChecker:
+    """Runs dependency checks at most once per cache interval.
+
+    Concurrent probes share one in-flight check, so probe traffic adds at most
+    one `SELECT 1` per interval per worker regardless of how often it polls.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._result: Optional[Dict] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> Dict:
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return self._result
+
+        async with self._lock:
+            # Another probe may have refreshed the result while we waited
+            if self._result is not None and time.monotonic() - self._checked_at < self.ttl_seconds:
+                return self._result
+
+            checks = {
+                "database": await _check_database_within_timeout(),
+                "pool": _pool_stats(),
+                "outbound_clients": _client_states(),
+                "queues": _queue_depths(),
+            }
+            healthy = all(check["ok"] for check in checks.values())
+            if not healthy:
+                logger.warning("Health check failed", extra={"checks": checks})
+
+            self._result = {
+                "status": "healthy" if healthy else "unhealthy",
+                "checked_at": time.time(),
+                "cache_ttl_seconds": self.ttl_seconds,
+                "checks": checks,
+            }
+            self._checked_at = time.monotonic()
+            return self._result
+
+
+health_checker = HealthChecker(settings.health_cache_seconds)
@@ -0,0 +1,126 @@
+"""
+Conditional GET and a short server-side response cache for per-farmer reads.
+
+Every write that changes what the admin sees for a farmer (soil upload,
+recommendation, SMS log, device change) bumps `farmers.data_version` in the
+same transaction. The bump is applied just before the session commits, so the
+farmer row is not locked across the awaits (SMS sends, AI calls) in between. Read endpoints derive a weak ETag from (kind, farmer,
+version): a poll with a matching If-None-Match gets a 304 after one primary
+key lookup, and a miss reuses the serialized body from the response cache
+while the version is unchanged. There is no Last-Modified: at one-second
+resolution, a poll in the same second as a write would get a wrong 304.
+"""
+
+import inspect
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, Type
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.cache import HitCounter, get_cache
+from app.core.config import settings
+from app.models.database_models import Farmer
+
+# Bump when a cached payload's shape changes, so old ETags stop matching
+PAYLOAD_VERSION = 3
+
+response_cache = get_cache("responses", settings.response_cache_ttl_seconds, max_entries=2000)
+response_stats = HitCounter("responses")
+not_modified_count = 0
+
+# Session.info key for farmer IDs whose version bump waits for the commit
+PENDING = "farmer_versions"
+
+
+def bump_farmer_version(db: Session, farmer_id: Optional[str]) -> None:
+    """Invalidate cached reads for a farmer when the caller's transaction commits"""
+    if farmer_id:
+        if not db.in_transaction():
+            db.begin()
+        db.info.setdefault(PENDING, set()).add(farmer_id)
+
+
+def bump_farmer_versions(db: Session, farmer_ids: Iterable[str]) -> None:
+    """Set-based bump_farmer_version for bulk writes"""
+    farmer_ids = sorted(set(farmer_ids))
+    if not farmer_ids:
+        return
+    db.query(Farmer)\
+        .filter(Farmer.id.in_(farmer_ids))\
+        .update({Farmer.data_version: Farmer.data_version + 1, Farmer.updated_at: datetime.utcnow()},
+                synchronize_session=False)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_pending(db: Session) -> None:
+    farmer_ids = db.info.pop(PENDING, None)
+    if farmer_ids:
+        bump_farmer_versions(db, farmer_ids)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(db: Session, transaction) -> None:
+    # Rolled back or closed without a commit; a commit has already applied them
+    if transaction.parent is None:
+        db.info.pop(PENDING, None)
+
+
+def _etag(kind: str, farmer_id: str, version: int) -> str:
+    return f'W/"{kind}-{farmer_id}-{version}-{PAYLOAD_VERSION}"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    # Weak comparison
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def farmer_response(
+    request: Request,
+    db: Session,
+    kind: str,
+    farmer_id: str,
+    model: Type[BaseModel],
+    build: Callable[[], Any],
+) -> Response:
+    """Serve `build()` (validated as `model`) for a farmer with an ETag, 304s and the response cache.
+
+    `build` may be a coroutine function, for content that needs blocking I/O off the event loop.
+    """
+    global not_modified_count
+
+    row = db.query(Farmer.data_version).filter(Farmer.id == farmer_id).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Farmer not found")
+
+    version = row.data_version or 0
+    etag = _etag(kind, farmer_id, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _is_not_modified(request, etag):
+        not_modified_count += 1
+        return Response(status_code=304, headers=headers)
+
+    key = f"{kind}:{farmer_id}:{version}"
+    body = await response_cache.aget(key)
+    if body is None:
+        response_stats.miss()
+        # pydantic-core reads the ORM rows and writes JSON in one native pass
+        content = build()
+        if inspect.isawaitable(content):
+            content = await content
+        body = model.model_validate(content, from_attributes=True).model_dump_json().encode("utf-8")
+        await response_cache.aset(key, body)
+    else:
+        response_stats.hit()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cache_stats() -> dict:
+    return {**response_stats.snapshot(), "not_modified": not_modified_count}
@@ -0,0 +1,180 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from app.core.config import on_reload, settings
+
+# Correlation ID for the request currently being handled. Async tasks spawned
+# from a request inherit it automatically through contextvars.
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue: Optional[queue.Queue] = None
+_module_levels: Set[str] = set()
+
+# Attributes present on every LogRecord; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current correlation ID to every record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields flattened in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Formatted by StructuredQueueHandler on the logging thread
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps the traceback out of the message.
+
+    The stdlib prepare() formats the record, so the traceback lands in
+    `message`, and then clears exc_info. Here the message is merged with its
+    args and the traceback goes to exc_text, which the listener's formatter
+    emits separately (the JSON `exc_info` field, or after the text line).
+    """
+
+    _traceback_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            # Traceback objects keep frames alive; only their text crosses the queue
+            record.exc_text = record.exc_text or self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_module_levels(spec: Optional[str]) -> Dict[str, str]:
+    """Parse "app.api.soil=DEBUG,httpx=WARNING" into a mapping."""
+    levels = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """Route all logging through a queue so request handlers never block on stdout."""
+    global _listener, _log_queue
+
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.log_json:
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s"
+        ))
+
+    _log_queue = queue.Queue(-1)
+    queue_handler = StructuredQueueHandler(_log_queue)
+    # Filters run on the calling thread so the request ID is captured before
+    # the record crosses into the listener thread
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter(settings.log_debug_sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    apply_log_levels()
+
+    _listener = logging.handlers.QueueListener(_log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def apply_log_levels() -> None:
+    """Set root and per-module levels from LOG_LEVEL / LOG_LEVELS."""
+    global _module_levels
+    logging.getLogger().setLevel(settings.log_level.upper())
+    levels = _parse_module_levels(settings.log_levels)
+    # A module dropped from LOG_LEVELS on reload goes back to inheriting the root level
+    for name in _module_levels - levels.keys():
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+    _module_levels = set(levels)
+
+
+@on_reload
+def _reload_logging(changed: Set[str]) -> None:
+    """Settings reload hook: levels and the DEBUG sample rate change in place."""
+    if changed & {"log_level", "log_levels"}:
+        apply_log_levels()
+    if "log_debug_sample_rate" in changed and _log_queue is not None:
+        for handler in logging.getLogger().handlers:
+            for log_filter in handler.filters:
+                if isinstance(log_filter, DebugSamplingFilter):
+                    log_filter.rate = settings.log_debug_sample_rate
+
+
+def log_queue_depth() -> int:
+    """Records waiting to be written by the listener thread."""
+    return _log_queue.qsize() if _log_queue is not None else 0
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
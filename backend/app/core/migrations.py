@@ -0,0 +1,144 @@
+"""
+Explicit schema management.
+
+Run once per deploy (Procfile `release` phase, container entrypoint, or by hand):
+    python -m app.core.migrations
+"""
+
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+
+from app.core.database import Base, SessionLocal, get_engine
+from app.models import database_models  # noqa: F401  (registers models on Base.metadata)
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(engine) -> List[Tuple[str, str]]:
+    """create_all never alters existing tables, so add new nullable columns here"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.error("Cannot add NOT NULL column without a server default",
+                             extra={"table": table.name, "column": column.name})
+                continue
+            ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}"
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+            logger.info("Added column", extra={"table": table.name, "column": column.name})
+            added.append((table.name, column.name))
+    return added
+
+
+def _backfill_device_last_seen(engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE devices SET last_seen_at = "
+            "(SELECT MAX(created_at) FROM soil_tests WHERE soil_tests.device_id = devices.id) "
+            "WHERE last_seen_at IS NULL"
+        ))
+
+
+# Run once, right after the column is added to an existing table
+COLUMN_BACKFILLS = {
+    ("devices", "last_seen_at"): _backfill_device_last_seen,
+}
+
+
+def _backfill_dashboard_counters() -> None:
+    """Seed the dashboard counters from existing data the first time they are deployed"""
+    from app.models.database_models import DashboardCounter
+    from app.services.dashboard import rebuild
+
+    db = SessionLocal()
+    try:
+        if db.query(DashboardCounter.metric).first() is None:
+            rebuild(db)
+    finally:
+        db.close()
+
+
+def _backfill_soil_history() -> None:
+    """Build the soil history summaries from existing tests the first time they are deployed"""
+    from app.models.database_models import SoilHistory, SoilTest
+    from app.services.soil_history import rebuild
+
+    db = SessionLocal()
+    try:
+        if db.query(SoilHistory.farmer_id).first() is None and db.query(SoilTest.id).first() is not None:
+            rebuild(db)
+    finally:
+        db.close()
+
+
+def _ensure_sms_log_partitions(engine) -> None:
+    """Keep monthly partitions a few months ahead once sms_logs is partitioned (Postgres)"""
+    from app.services.retention import ensure_partitions, is_partitioned
+
+    if is_partitioned(engine):
+        ensure_partitions(engine)
+
+
+def _duplicate_groups(engine, index) -> int:
+    """Number of key values that occur more than once in a unique index's columns"""
+    columns = list(index.columns)
+    repeated = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(repeated)).scalar() or 0
+
+
+def _create_missing_indexes(engine) -> None:
+    """create_all skips tables that already exist, so add their new indexes here.
+
+    A unique index is a correctness guarantee (upload deduplication relies on one), so failing to
+    build it stops the migration instead of letting the app start without it.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                if not index.unique:
+                    logger.error("Could not create index", extra={"index": index.name, "error": str(e)})
+                    continue
+                duplicates = _duplicate_groups(engine, index)
+                logger.error("Could not create unique index", extra={
+                    "index": index.name, "duplicate_keys": duplicates, "error": str(e),
+                })
+                raise RuntimeError(
+                    f"Unique index {index.name} could not be created on {table.name} "
+                    f"({duplicates} duplicated keys); remove the duplicate rows and migrate again"
+                ) from e
+
+
+def run_migrations() -> None:
+    """Create any missing tables, columns and indexes, then run pending backfills"""
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    added = _add_missing_columns(engine)
+    _create_missing_indexes(engine)
+    for column in added:
+        backfill = COLUMN_BACKFILLS.get(column)
+        if backfill is not None:
+            backfill(engine)
+    _backfill_dashboard_counters()
+    _backfill_soil_history()
+    _ensure_sms_log_partitions(engine)
+    logger.info("Database schema is up to date", extra={"dialect": engine.dialect.name})
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
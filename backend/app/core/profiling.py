@@ -0,0 +1,378 @@
+"""
+Low-overhead profiling for a running worker.
+
+- CPU: a statistical sampler. A background thread reads every thread's stack
+  (sys._current_frames) PROFILING_SAMPLE_INTERVAL_MS apart for a bounded
+  window; nothing is traced in between, so the app runs at normal speed.
+  Results export as speedscope JSON (https://www.speedscope.app) or as a
+  pstats file for `python -m pstats`/snakeviz, with sample time as cost.
+- Event loop lag: a heartbeat task on the loop and a watchdog thread. When
+  the heartbeat is LOOP_LAG_THRESHOLD_MS late, the watchdog records the loop
+  thread's stack while it is still blocked, so the offending call is named.
+- Memory: tracemalloc, started on demand (it slows allocations while on).
+  Each snapshot is compared with the previous one to show what grew.
+
+All of it is per worker: under gunicorn each request profiles whichever
+worker handles it (the responses name the pid).
+"""
+
+import asyncio
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Deeper stacks are cut at the outermost end; the innermost frames are what matter
+MAX_STACK_DEPTH = 128
+STALL_STACK_DEPTH = 40
+KEPT_STALLS = 50
+
+
+class ProfilerBusy(Exception):
+    """Raised when a CPU profile is already running in this worker"""
+
+
+def _label(code: CodeType) -> Tuple[str, int, str]:
+    return code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name)
+
+
+def _frame_lines(frame: Optional[FrameType], depth: int) -> List[str]:
+    """Outermost call first, like a traceback"""
+    lines = []
+    while frame is not None and len(lines) < depth:
+        code = frame.f_code
+        lines.append(f"{code.co_filename}:{frame.f_lineno} {getattr(code, 'co_qualname', code.co_name)}")
+        frame = frame.f_back
+    return lines[::-1]
+
+
+class CPUProfile:
+    """Samples from one profiling window: (thread id, stack of code objects outermost first, seconds)"""
+    __slots__ = ("started_at", "duration", "interval", "samples", "thread_names")
+
+    def __init__(self, interval: float):
+        self.started_at = datetime.utcnow()
+        self.duration = 0.0
+        self.interval = interval
+        self.samples: List[Tuple[int, Tuple[CodeType, ...], float]] = []
+        self.thread_names: Dict[int, str] = {}
+
+    def speedscope(self) -> Dict:
+        frames: List[Dict] = []
+        index: Dict[CodeType, int] = {}
+        per_thread: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+        for thread_id, stack, weight in self.samples:
+            ids = []
+            for code in stack:
+                if code not in index:
+                    filename, line, name = _label(code)
+                    index[code] = len(frames)
+                    frames.append({"name": name, "file": filename, "line": line})
+                ids.append(index[code])
+            stacks, weights = per_thread.setdefault(thread_id, ([], []))
+            stacks.append(ids)
+            weights.append(round(weight, 6))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"worker {os.getpid()} {self.started_at.isoformat()}",
+            "exporter": "smart-soil-platform",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.thread_names.get(thread_id, str(thread_id)),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": stacks,
+                "weights": weights,
+            } for thread_id, (stacks, weights) in per_thread.items()],
+        }
+
+    def pstats(self) -> bytes:
+        """marshal'd stats dict as written by cProfile, so pstats.Stats() can load it.
+
+        Call counts are sample counts; tottime is time at the top of the stack,
+        cumtime is time anywhere on it (counted once per sample under recursion).
+        """
+        stats: Dict[Tuple, List] = {}
+        edges: Dict[Tuple, Dict[Tuple, List]] = {}
+        for _, stack, weight in self.samples:
+            funcs = [_label(code) for code in stack]
+            seen = set()
+            seen_edges = set()
+            for i, func in enumerate(funcs):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0])
+                leaf = i == len(funcs) - 1
+                if leaf:
+                    entry[2] += weight
+                if func not in seen:
+                    seen.add(func)
+                    entry[0] += 1
+                    entry[1] += 1
+                    entry[3] += weight
+                if i and (funcs[i - 1], func) not in seen_edges:
+                    seen_edges.add((funcs[i - 1], func))
+                    edge = edges.setdefault(func, {}).setdefault(funcs[i - 1], [0, 0, 0.0, 0.0])
+                    edge[0] += 1
+                    edge[1] += 1
+                    edge[2] += weight if leaf else 0.0
+                    edge[3] += weight
+        return marshal.dumps({
+            func: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in edges.get(func, {}).items()})
+            for func, (cc, nc, tt, ct) in stats.items()
+        })
+
+
+class CPUSampler:
+    """Statistical CPU profiler; one window at a time per worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running_since: Optional[datetime] = None
+
+    def _sample(self, profile: CPUProfile, thread_ids: Optional[set], stop: threading.Event) -> None:
+        me = threading.get_ident()
+        profile.thread_names = {t.ident: t.name for t in threading.enumerate()}
+        last = time.perf_counter()
+        while not stop.wait(profile.interval):
+            now = time.perf_counter()
+            # Weight by the real gap, so a late sample (GIL held elsewhere) still counts its time
+            weight, last = now - last, now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                profile.samples.append((thread_id, tuple(reversed(stack)), weight))
+
+    async def profile(self, seconds: float, interval_ms: float, all_threads: bool = False) -> CPUProfile:
+        """Sample for `seconds` without blocking the loop; by default only the loop's own thread"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            self.running_since = datetime.utcnow()
+            profile = CPUProfile(interval_ms / 1000)
+            thread_ids = None if all_threads else {threading.get_ident()}
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample, args=(profile, thread_ids, stop), name="cpu-profiler", daemon=True
+            )
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                sampler.join()
+            profile.duration = time.perf_counter() - started
+            logger.info("CPU profile taken", extra={
+                "seconds": round(profile.duration, 2), "samples": len(profile.samples), "all_threads": all_threads
+            })
+            return profile
+        finally:
+            self.running_since = None
+            self._lock.release()
+
+
+class LoopLagMonitor:
+    """Reports event loop stalls over LOOP_LAG_THRESHOLD_MS with the stack that caused them"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._loop_thread: Optional[int] = None
+        self._heartbeat = 0.0
+        self._open: Optional[Dict] = None  # stall the watchdog caught and the loop has not yet recovered from
+        self.stalls: Deque[Dict] = deque(maxlen=KEPT_STALLS)
+        self.total_stalls = 0
+        self.max_lag_ms = 0.0
+
+    @staticmethod
+    def _interval() -> float:
+        return max(settings.loop_lag_threshold_ms / 4000, 0.005)
+
+    def start(self) -> None:
+        """Call from the event loop thread"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _beat(self) -> None:
+        while True:
+            interval = self._interval()
+            before = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag_ms = (now - before - interval) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            with self._lock:
+                stall, self._open = self._open, None
+            if stall is not None:
+                stall["lag_ms"] = round(lag_ms, 1)
+                logger.warning("Event loop blocked", extra={
+                    "lag_ms": stall["lag_ms"], "stack": stall["stack"][-5:]
+                })
+            elif lag_ms > settings.loop_lag_threshold_ms:
+                # Blocked between two watchdog checks: the stack is already gone
+                self._record({"at": datetime.utcnow(), "blocked_ms": round(lag_ms, 1), "lag_ms": round(lag_ms, 1), "stack": []})
+
+    def _record(self, stall: Dict) -> None:
+        self.stalls.append(stall)
+        self.total_stalls += 1
+
+    def _watch(self) -> None:
+        caught_beat = None
+        while not self._stop.wait(self._interval()):
+            beat = self._heartbeat
+            blocked_ms = (time.monotonic() - beat) * 1000
+            if blocked_ms <= settings.loop_lag_threshold_ms or beat == caught_beat:
+                continue
+            caught_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stall = {
+                "at": datetime.utcnow(),
+                "blocked_ms": round(blocked_ms, 1),
+                "lag_ms": None,
+                "stack": _frame_lines(frame, STALL_STACK_DEPTH),
+            }
+            with self._lock:
+                self._open = stall
+                self._record(stall)
+
+    def summary(self) -> Dict:
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            "enabled": self._task is not None,
+            "threshold_ms": settings.loop_lag_threshold_ms,
+            "stalls": self.total_stalls,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "last_stall_at": last["at"].isoformat() if last else None,
+        }
+
+    def report(self) -> Dict:
+        return {**self.summary(), "worker": os.getpid(), "recent": list(reversed(self.stalls))}
+
+
+class MemoryTracker:
+    """tracemalloc on demand; each snapshot is diffed against the previous one"""
+
+    def __init__(self):
+        self.started_at: Optional[datetime] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_at: Optional[datetime] = None
+        self._stop_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int, max_minutes: float) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.started_at = datetime.utcnow()
+            self._previous = self._previous_at = None
+            logger.info("tracemalloc started", extra={"frames": frames, "max_minutes": max_minutes})
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+        # Never left on by accident: it costs memory and slows every allocation
+        self._stop_handle = asyncio.get_running_loop().call_later(max_minutes * 60, self.stop)
+
+    def stop(self) -> None:
+        """Stop tracing; the last snapshot stays downloadable"""
+        if self._stop_handle is not None:
+            self._stop_handle.cancel()
+            self._stop_handle = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        self.started_at = None
+
+    def status(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+        return {
+            "worker": os.getpid(),
+            "tracing": tracing,
+            "started_at": self.started_at,
+            "traced_kb": round(current / 1024, 1) if tracing else None,
+            "peak_kb": round(peak / 1024, 1) if tracing else None,
+        }
+
+    def snapshot(self, limit: int, key_type: str) -> Dict:
+        """Top allocation sites now, and how they changed since the previous snapshot (blocking)"""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        if self._previous is not None:
+            stats = snapshot.compare_to(self._previous, key_type)
+        else:
+            stats = snapshot.statistics(key_type)
+        result = {
+            **self.status(),
+            "compared_to": self._previous_at,
+            "top": [{
+                "location": [str(frame) for frame in stat.traceback],  # oldest call first
+                "size_kb": round(stat.size / 1024, 1),
+                "size_diff_kb": round(getattr(stat, "size_diff", 0) / 1024, 1),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", 0),
+            } for stat in stats[:limit]],
+        }
+        self._previous, self._previous_at = snapshot, datetime.utcnow()
+        return result
+
+    def dump(self) -> Optional[bytes]:
+        """The last snapshot in tracemalloc's own format (tracemalloc.Snapshot.load)"""
+        if self._previous is None:
+            return None
+        fd, path = tempfile.mkstemp(suffix=".tracemalloc")
+        os.close(fd)
+        try:
+            self._previous.dump(path)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+cpu_sampler = CPUSampler()
+loop_lag_monitor = LoopLagMonitor()
+memory_tracker = MemoryTracker()
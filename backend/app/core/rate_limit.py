@@ -0,0 +1,86 @@
+import time
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import CacheBackend, get_cache
+
+
+class RateLimitExceeded(Exception):
+    """Raised instead of calling a provider whose quota for the window is used up"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Rate limit '{name}' exceeded, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Fixed-window limiter whose counters live in a cache backend.
+
+    With a shared backend (CACHE_BACKEND=sqlite or redis) every worker draws
+    from the same budget, so the provider quota holds however many workers run.
+    """
+
+    def __init__(self, name: str, limit: int, window_seconds: float = 60, backend: Optional[CacheBackend] = None):
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.backend = backend or get_cache("rate_limit", window_seconds * 2)
+        self.rejections = 0
+
+    def _window(self) -> int:
+        return int(time.time() // self.window_seconds)
+
+    def _key(self, window: int) -> str:
+        return f"{self.name}:{window}"
+
+    def retry_after(self) -> float:
+        return self.window_seconds - (time.time() % self.window_seconds)
+
+    def try_acquire(self, cost: int = 1) -> bool:
+        """Take `cost` units from the current window; False (and nothing taken) if that would exceed the limit"""
+        key = self._key(self._window())
+        used = self.backend.incr(key, cost, ttl_seconds=self.window_seconds * 2)
+        if used > self.limit:
+            self.backend.incr(key, -cost, ttl_seconds=self.window_seconds * 2)
+            self.rejections += 1
+            return False
+        return True
+
+    def acquire(self, cost: int = 1) -> None:
+        if not self.try_acquire(cost):
+            raise RateLimitExceeded(self.name, self.retry_after())
+
+    async def aacquire(self, cost: int = 1) -> None:
+        """acquire() for async code: the counter round trips run in the threadpool"""
+        if not await run_in_threadpool(self.try_acquire, cost):
+            raise RateLimitExceeded(self.name, self.retry_after())
+
+    def remaining(self) -> int:
+        used = self.backend.incr(self._key(self._window()), 0, ttl_seconds=self.window_seconds * 2)
+        return max(0, self.limit - used)
+
+    def snapshot(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "window_seconds": self.window_seconds,
+            "remaining": self.remaining(),
+            "rejections": self.rejections,
+        }
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_rate_limiter(name: str, limit: int, window_seconds: float = 60) -> RateLimiter:
+    """Shared limiter for a provider, created on first use"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = RateLimiter(name, limit, window_seconds)
+        _limiters[name] = limiter
+    return limiter
+
+
+def rate_limit_states() -> Dict[str, Dict]:
+    return {name: limiter.snapshot() for name, limiter in _limiters.items()}
@@ -0,0 +1,310 @@
+"""
+Capture of real device uploads and Telerivet webhooks for replay.
+
+With CAPTURE_ENABLED, a CAPTURE_SAMPLE_RATE share of `POST /api/soil/upload`
+and `POST /api/sms/receive` requests is recorded to gzip NDJSON files under
+CAPTURE_DIR (one file per worker, rotated at CAPTURE_MAX_FILE_MB), for
+`python -m benchmarks.replay`. The middleware only tees the raw body and notes
+status and latency; decoding, sanitizing and writing happen on a background
+thread, and records are dropped rather than queued without bound.
+
+Nothing that identifies a farmer or authenticates a caller is written:
+
+- phone numbers and device IDs become stable HMAC pseudonyms (keyed by
+  CAPTURE_KEY, else API_SECRET_KEY), so one farmer's uploads and replies still
+  line up across files and workers
+- GPS positions are moved by a fixed per-farmer offset (up to ~50 km), which
+  keeps distances within a field but hides where the field is
+- soil records keep only SoilDataUpload fields (farmer IDs excepted), so an
+  unexpected key in a device body never reaches disk
+- SMS content is kept only when it is a menu reply (a short number or a
+  COMMON_CROPS name); any other text is replaced by OTHER_REPLY
+- device tokens, webhook secrets and farmer IDs are dropped; idempotency keys
+  are hashed
+
+One record per line, short keys to keep files small:
+
+    {"t": 1760000000.123, "k": "soil", "s": 200, "ms": 84.2, "ct": "compact",
+     "ce": "gzip", "ik": "3f2a...", "b": {...sanitized SoilDataUpload...}}
+    {"t": 1760000042.5, "k": "sms", "s": 200, "ms": 31.0, "form": true,
+     "b": {"from_number": "256412345678", "content": "1"}}
+"""
+
+import gzip
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import orjson
+
+from app.core.config import settings
+from app.models.compact_upload import CONTENT_TYPE as COMPACT_CONTENT_TYPE, decode_soil_upload
+from app.models.schemas import SoilDataUpload
+from app.services.recommendations import COMMON_CROPS
+
+logger = logging.getLogger(__name__)
+
+CAPTURED_PATHS = {"/api/soil/upload": "soil", "/api/sms/receive": "sms"}
+
+# Bodies larger than any valid upload or webhook are not worth keeping
+MAX_BODY_BYTES = 64 * 1024
+QUEUE_SIZE = 10000
+# Farmer IDs are dropped; replay fills them in from the device it seeds
+SOIL_FIELDS = tuple(name for name in SoilDataUpload.model_fields if name != "farmer_id")
+# Replies the SMS menu acts on; anything else a farmer types may be personal
+MENU_REPLIES = frozenset({"ONE", "TWO", "THREE", *COMMON_CROPS})
+MAX_MENU_DIGITS = 2
+# Stands in for free text: still an invalid option, or an uncommon crop when one was asked for
+OTHER_REPLY = "OTHER"
+MAX_LOCATION_SHIFT_DEGREES = 0.5
+
+
+def _digest(kind: str, value: str) -> str:
+    key = (settings.capture_key or settings.api_secret_key or "").encode()
+    return hmac.new(key, f"{kind}:{value}".encode(), hashlib.sha256).hexdigest()
+
+
+def _normalize_phone(phone: str) -> str:
+    """Same person, same pseudonym: +256..., 256... and 07... all hash alike"""
+    digits = "".join(c for c in phone if c.isdigit())
+    if digits.startswith("0"):
+        digits = "256" + digits[1:]
+    return digits
+
+
+def pseudonymize_phone(phone: str) -> str:
+    """A phone-shaped pseudonym (256 + 9 digits) so replayed numbers pass the same code paths"""
+    if not phone:
+        return phone
+    return "256" + str(int(_digest("phone", _normalize_phone(phone))[:15], 16) % 10**9).zfill(9)
+
+
+def pseudonymize_device(device_id: str) -> str:
+    return "dev-" + _digest("device", device_id)[:12]
+
+
+def _location_shift(phone: str) -> Tuple[float, float]:
+    digest = _digest("location", _normalize_phone(phone or ""))
+    return tuple(
+        (int(digest[i:i + 8], 16) / 0xFFFFFFFF * 2 - 1) * MAX_LOCATION_SHIFT_DEGREES for i in (0, 8)
+    )
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def sanitize_soil(body: Dict) -> Dict:
+    phone = str(body.get("phone_number") or "")
+    clean = {key: body[key] for key in SOIL_FIELDS
+             if key in body and (body[key] is None or isinstance(body[key], (str, int, float)))}
+    clean["phone_number"] = pseudonymize_phone(phone)
+    if "device_id" in clean:
+        clean["device_id"] = pseudonymize_device(str(clean["device_id"]))
+    d_lat, d_lon = _location_shift(phone)
+    if isinstance(body.get("gps_latitude"), (int, float)):
+        clean["gps_latitude"] = round(max(-89.0, min(89.0, body["gps_latitude"] + d_lat)), 6)
+    if isinstance(body.get("gps_longitude"), (int, float)):
+        clean["gps_longitude"] = round((body["gps_longitude"] + d_lon + 180) % 360 - 180, 6)
+    return clean
+
+
+def menu_reply(content: str) -> str:
+    """The reply as the menu reads it, or OTHER_REPLY for free text"""
+    reply = content.strip().upper()
+    if (reply.isdigit() and len(reply) <= MAX_MENU_DIGITS) or reply in MENU_REPLIES:
+        return reply
+    return OTHER_REPLY if reply else ""
+
+
+def sanitize_sms(body: Dict) -> Dict:
+    # Only what the handler reads; Telerivet also sends the webhook secret, contact names and IDs
+    return {
+        "from_number": pseudonymize_phone(str(body.get("from_number", ""))),
+        "content": menu_reply(str(body.get("content", ""))),
+    }
+
+
+class TrafficCapture:
+    """Background writer for captured requests; one rotating file per worker"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_bytes = 0
+        self.path: Optional[str] = None
+        self.captured = 0
+        self.dropped = 0
+        self.skipped = 0  # bodies that could not be decoded, so nothing could be sanitized
+
+    def submit(self, raw: Dict) -> None:
+        """Called on the event loop; never blocks"""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(raw)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Write what is queued and close the file"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                raw = self._queue.get(timeout=1)
+            except queue.Empty:
+                if self._file is not None:
+                    self._file.flush()  # readable up to here even if the worker dies
+                continue
+            if raw is None:
+                break
+            try:
+                record = self._record(raw)
+                if record is None:
+                    self.skipped += 1
+                else:
+                    self._write(orjson.dumps(record) + b"\n")
+                    self.captured += 1
+            except (ValueError, zlib.error):
+                # Malformed body (the app answered 4xx): nothing can be sanitized, so nothing is kept
+                self.skipped += 1
+            except Exception:
+                self.skipped += 1
+                logger.exception("Could not capture request", extra={"kind": raw.get("k")})
+        self._close()
+
+    def _record(self, raw: Dict) -> Optional[Dict]:
+        body = _decompress(raw.pop("body"), raw.get("ce", ""))
+        content_type = raw.pop("content_type")
+        if raw["k"] == "soil":
+            if content_type == COMPACT_CONTENT_TYPE:
+                raw["ct"] = "compact"
+                parsed = decode_soil_upload(body).model_dump(mode="json")
+            else:
+                parsed = orjson.loads(body)
+            if not isinstance(parsed, dict):
+                return None
+            raw["b"] = sanitize_soil(parsed)
+            if raw.get("ik"):
+                raw["ik"] = _digest("idempotency", raw["ik"])[:32]
+        else:
+            if content_type == "application/json":
+                parsed = orjson.loads(body)
+            else:
+                raw["form"] = True
+                parsed = dict(parse_qsl(body.decode("utf-8", "replace")))
+            if not isinstance(parsed, dict):
+                return None
+            raw["b"] = sanitize_sms(parsed)
+        return {key: value for key, value in raw.items() if value not in (None, "")}
+
+    def _write(self, line: bytes) -> None:
+        if self._file is None or self._file_bytes >= settings.capture_max_file_mb * 1024 * 1024:
+            self._close()
+            os.makedirs(settings.capture_dir, exist_ok=True)
+            self.path = os.path.join(
+                settings.capture_dir, f"capture-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}.ndjson.gz"
+            )
+            self._file = gzip.open(self.path, "ab")
+            self._file_bytes = 0
+        self._file.write(line)
+        self._file_bytes += len(line)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": settings.capture_enabled,
+            "file": self.path,
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "queued": self._queue.qsize(),
+        }
+
+
+traffic_capture = TrafficCapture()
+
+
+class CaptureMiddleware:
+    """ASGI middleware: tees the body of sampled upload/webhook requests to traffic_capture"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        kind = CAPTURED_PATHS.get(scope.get("path")) if scope["type"] == "http" and scope.get("method") == "POST" else None
+        if kind is None or not settings.capture_enabled or random.random() >= settings.capture_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        chunks: List[bytes] = []
+        size = 0
+        status = 0
+
+        async def tee_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size <= MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            return message
+
+        async def capture_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, tee_receive, capture_status)
+        finally:
+            if status and size <= MAX_BODY_BYTES:
+                headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+                encoding = headers.get("content-encoding", "identity").strip().lower()
+                traffic_capture.submit({
+                    "t": round(at, 3),
+                    "k": kind,
+                    "s": status,
+                    "ms": round((time.perf_counter() - started) * 1000, 1),
+                    "content_type": headers.get("content-type", "application/json").split(";")[0].strip().lower(),
+                    "ce": "" if encoding == "identity" else encoding,
+                    "ik": headers.get("idempotency-key"),
+                    "body": b"".join(chunks),
+                })
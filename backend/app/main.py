@@ -1,16 +1,79 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import signal
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import soil, sms, admin, auth
-from app.core.database import engine, Base
-from app.core.config import settings
-from app.models.database_models import (
-    Farmer, Device, SoilTest, Recommendation, SMSLog, SMSSession, AdminUser
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.api import soil, sms, admin, auth, profiling
+from app.core.circuit_breaker import breaker_states
+from app.core.database import dispose_engine
+from app.core.config import reload_settings, settings, settings_watcher
+from app.core.health import health_checker, register_client, register_queue
+from app.core.http_cache import cache_stats as response_cache_stats
+from app.core.logging_config import (
+    REQUEST_ID_HEADER, log_queue_depth, new_request_id, request_id_var, setup_logging
 )
+from app.core.profiling import loop_lag_monitor
+from app.core.rate_limit import rate_limit_states
+from app.core.traffic_capture import CaptureMiddleware, traffic_capture
+from app.services.field_sessions import field_session_finalizer
+from app.services.sms_service import sms_service
+from app.services.weather_prefetch import weather_prefetcher
+from app.services.weather_service import weather_service
+
+logger = logging.getLogger(__name__)
 
-# Create database tables on startup
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Smart Soil Platform API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start quickly: the DB engine and HTTP client pools are created on first use"""
+    started = time.perf_counter()
+    setup_logging()
+    if settings.auto_migrate:
+        # Local development convenience; deploys run `python -m app.core.migrations`
+        from app.core.migrations import run_migrations
+        await run_in_threadpool(run_migrations)
+    register_client("openweather", lambda: weather_service.client_state)
+    register_client("telerivet", lambda: sms_service.client_state)
+    register_queue("logging", log_queue_depth)
+    register_queue("weather_prefetch", lambda: weather_prefetcher.pending)
+    if settings.weather_prefetch_enabled:
+        weather_prefetcher.start()
+    if settings.field_sessions_enabled:
+        field_session_finalizer.start()
+    settings_watcher.start()
+    if settings.loop_lag_monitor_enabled:
+        loop_lag_monitor.start()
+    loop = asyncio.get_running_loop()
+    try:
+        # `kill -HUP <pid>` re-reads settings in this process (gunicorn's master treats HUP as a worker restart)
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.create_task(reload_settings()))
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        pass  # no SIGHUP (Windows) or not the main thread; the file watch still works
+    logger.info("Startup complete", extra={"startup_ms": round((time.perf_counter() - started) * 1000, 2)})
+    yield
+    if hasattr(signal, "SIGHUP"):
+        try:
+            loop.remove_signal_handler(signal.SIGHUP)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+    await settings_watcher.stop()
+    await loop_lag_monitor.stop()
+    await run_in_threadpool(traffic_capture.stop)
+    await field_session_finalizer.stop()
+    await weather_prefetcher.stop()
+    await weather_service.aclose()
+    await sms_service.aclose()
+    dispose_engine()
+
+
+# orjson for every response; routes with a response_model also skip jsonable_encoder
+app = FastAPI(title="Smart Soil Platform API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -21,11 +84,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Records sampled uploads and SMS webhooks when CAPTURE_ENABLED (see benchmarks/replay.py)
+app.add_middleware(CaptureMiddleware)
+
+@app.middleware("http")
+async def correlation_id_middleware(request: Request, call_next):
+    """Bind a correlation ID to the request so every log line can be tied back to it"""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
 # Include routers
 app.include_router(soil.router, prefix="/api/soil", tags=["soil"])
 app.include_router(sms.router, prefix="/api/sms", tags=["sms"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
+app.include_router(profiling.router, prefix="/api/admin/profiling", tags=["profiling"])
 
 @app.get("/")
 async def root():
@@ -33,4 +112,44 @@ async def root():
 
 @app.get("/health")
 async def health():
+    """Liveness: the process is up and serving requests (no dependency checks)"""
     return {"status": "healthy", "database": "PostgreSQL", "db_url_set": bool(settings.database_url)}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: DB reachable, pool not saturated, queues draining (cached briefly)"""
+    result = await health_checker.check()
+    status_code = 200 if result["status"] == "healthy" else 503
+    return ORJSONResponse(status_code=status_code, content={
+        "status": "ready" if status_code == 200 else "unavailable",
+        "checked_at": result["checked_at"],
+        "failing": [name for name, check in result["checks"].items() if not check["ok"]],
+    })
+
+@app.get("/health/deep")
+async def health_deep():
+    """Full dependency report: DB, pool saturation, outbound clients, queue depths"""
+    result = await health_checker.check()
+    return ORJSONResponse(status_code=200 if result["status"] == "healthy" else 503, content=result)
+
+def _backend_metrics() -> dict:
+    """Metrics read from the cache backend (blocking I/O for the shared backends)"""
+    return {
+        "weather_cache": weather_service.stats.snapshot(),
+        "rate_limits": rate_limit_states(),
+        "admin_response_cache": response_cache_stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Provider circuit breakers (per worker), cache hit ratios and rate limits (per backend)"""
+    return {
+        "circuit_breakers": breaker_states(),
+        "cache_backend": settings.cache_backend,
+        **await run_in_threadpool(_backend_metrics),
+        "weather_prefetch": weather_prefetcher.last_run,
+        "field_session_finalizer": field_session_finalizer.last_run,
+        "settings_reload": settings_watcher.last_reload,
+        "event_loop_lag": loop_lag_monitor.summary(),
+        "traffic_capture": traffic_capture.stats(),
+    }
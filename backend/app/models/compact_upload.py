@@ -0,0 +1,113 @@
+"""
+Compact binary encoding of SoilDataUpload for devices on metered 2G links.
+
+Sent with `Content-Type: application/vnd.bandj.soil+struct` (optionally with
+`Content-Encoding: gzip` or `deflate`). All integers are little-endian.
+
+    offset  type     field                  encoding
+    0       uint8    version                always 1
+    1       uint32   timestamp              unix seconds, UTC
+    5       int32    gps_latitude           degrees * 1e6
+    9       int32    gps_longitude          degrees * 1e6
+    13      uint8    sample_number
+    14      uint8    sample_depth_cm
+    15      int16    soil_temperature_c     * 100
+    17      uint16   soil_moisture_percent  * 100
+    19      uint16   soil_nitrogen_mgkg     * 10
+    21      uint16   soil_phosphorus_mgkg   * 10
+    23      uint16   soil_potassium_mgkg    * 10
+    25      uint16   soil_ph                * 100
+    27      16 bytes farmer_id              UUID bytes
+    43      uint8 n  + n bytes device_id    UTF-8
+    ...     uint8 n  + n bytes phone_number ASCII
+
+A typical sample is ~70 bytes against ~420 bytes of JSON.
+"""
+
+import struct
+import uuid
+from datetime import datetime, timezone
+
+from app.models.schemas import SoilDataUpload
+
+CONTENT_TYPE = "application/vnd.bandj.soil+struct"
+VERSION = 1
+
+_FIXED = struct.Struct("<BIiiBBhHHHHH16s")
+
+
+class CompactDecodeError(ValueError):
+    pass
+
+
+def _read_string(body: bytes, offset: int, encoding: str):
+    if offset >= len(body):
+        raise CompactDecodeError("Truncated payload")
+    length = body[offset]
+    end = offset + 1 + length
+    if end > len(body):
+        raise CompactDecodeError("Truncated payload")
+    return body[offset + 1:end].decode(encoding), end
+
+
+def decode_soil_upload(body: bytes) -> SoilDataUpload:
+    """Decode a compact payload and validate it exactly like a JSON upload"""
+    if len(body) < _FIXED.size:
+        raise CompactDecodeError("Truncated payload")
+
+    (version, timestamp, lat, lon, sample_number, depth, temperature, moisture,
+     nitrogen, phosphorus, potassium, ph, farmer_id) = _FIXED.unpack_from(body)
+    if version != VERSION:
+        raise CompactDecodeError(f"Unsupported compact upload version {version}")
+
+    try:
+        device_id, offset = _read_string(body, _FIXED.size, "utf-8")
+        phone_number, offset = _read_string(body, offset, "ascii")
+    except UnicodeDecodeError as e:
+        raise CompactDecodeError("Invalid string field") from e
+
+    return SoilDataUpload.model_validate({
+        "device_id": device_id,
+        "farmer_id": str(uuid.UUID(bytes=farmer_id)),
+        "phone_number": phone_number,
+        # Naive UTC, matching what JSON devices send
+        "timestamp": datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None),
+        "gps_latitude": lat / 1e6,
+        "gps_longitude": lon / 1e6,
+        "sample_number": sample_number,
+        "sample_depth_cm": depth,
+        "soil_temperature_c": temperature / 100,
+        "soil_moisture_percent": moisture / 100,
+        "soil_nitrogen_mgkg": nitrogen / 10,
+        "soil_phosphorus_mgkg": phosphorus / 10,
+        "soil_potassium_mgkg": potassium / 10,
+        "soil_ph": ph / 100,
+    })
+
+
+def encode_soil_upload(data: SoilDataUpload) -> bytes:
+    """Reference encoder (device firmware, tests and benchmarks)"""
+    timestamp = data.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    device_id = data.device_id.encode("utf-8")
+    phone_number = data.phone_number.encode("ascii")
+    if len(device_id) > 255 or len(phone_number) > 255:
+        raise ValueError("device_id and phone_number must be at most 255 bytes")
+
+    fixed = _FIXED.pack(
+        VERSION,
+        int(timestamp.timestamp()),
+        round(data.gps_latitude * 1e6),
+        round(data.gps_longitude * 1e6),
+        data.sample_number,
+        data.sample_depth_cm,
+        round(data.soil_temperature_c * 100),
+        round(data.soil_moisture_percent * 100),
+        round(data.soil_nitrogen_mgkg * 10),
+        round(data.soil_phosphorus_mgkg * 10),
+        round(data.soil_potassium_mgkg * 10),
+        round(data.soil_ph * 100),
+        uuid.UUID(data.farmer_id).bytes,
+    )
+    return fixed + bytes([len(device_id)]) + device_id + bytes([len(phone_number)]) + phone_number
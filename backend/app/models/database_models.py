@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, String, Float, Integer, Boolean, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -9,6 +9,9 @@ def generate_uuid():
 
 class Farmer(Base):
     __tablename__ = "farmers"
+    __table_args__ = (
+        Index("ix_farmers_created_at", "created_at"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     name = Column(String(255), nullable=False)
@@ -16,6 +19,8 @@ class Farmer(Base):
     region = Column(String(100))
     district = Column(String(100))
     pin = Column(String(6), nullable=False)
+    # Bumped whenever the farmer's tests, recommendations, SMS logs or devices change (ETags)
+    data_version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -24,6 +29,8 @@ class Farmer(Base):
     soil_tests = relationship("SoilTest", back_populates="farmer", cascade="all, delete-orphan")
     sms_logs = relationship("SMSLog", back_populates="farmer", cascade="all, delete-orphan")
     sms_sessions = relationship("SMSSession", back_populates="farmer", cascade="all, delete-orphan")
+    field_sessions = relationship("FieldSession", cascade="all, delete-orphan")
+    soil_histories = relationship("SoilHistory", cascade="all, delete-orphan")
 
 class Device(Base):
     __tablename__ = "devices"
@@ -34,6 +41,8 @@ class Device(Base):
     farmer_id = Column(String, ForeignKey("farmers.id", ondelete="CASCADE"))
     api_token = Column(String(255), unique=True, nullable=False)
     is_active = Column(Boolean, default=True)
+    last_seen_at = Column(DateTime, index=True)  # last soil upload
+    quality_stats = Column(JSON)  # sensor_quality running statistics, shared by all workers
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -42,6 +51,12 @@ class Device(Base):
 
 class SoilTest(Base):
     __tablename__ = "soil_tests"
+    __table_args__ = (
+        # Natural key of a sample; device retries must not create duplicates
+        Index("ix_soil_tests_device_sample", "device_id", "timestamp", "sample_number", unique=True),
+        Index("ix_soil_tests_created_at", "created_at"),
+        Index("ix_soil_tests_farmer_created", "farmer_id", "created_at"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     device_id = Column(String, ForeignKey("devices.id", ondelete="CASCADE"))
@@ -59,6 +74,11 @@ class SoilTest(Base):
     phosphorus = Column(Float)  # mg/kg
     potassium = Column(Float)  # mg/kg
     location_name = Column(String(255))
+    # "ok", or "quarantined" when sensor_quality flagged the reading (no recommendation or SMS)
+    quality_status = Column(String(20), nullable=False, default="ok", server_default="ok")
+    quality_flags = Column(JSON)  # e.g. ["bounds:ph", "outlier:moisture"]
+    # Field session this sample was aggregated into (see app/services/field_sessions.py)
+    field_session_id = Column(String, ForeignKey("field_sessions.id", ondelete="SET NULL"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -70,10 +90,15 @@ class SoilTest(Base):
 
 class Recommendation(Base):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        # SMS replies read precomputed answers by (test, type, crop)
+        Index("ix_recommendations_lookup", "soil_test_id", "recommendation_type", "crop"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     soil_test_id = Column(String, ForeignKey("soil_tests.id", ondelete="CASCADE"))
-    recommendation_type = Column(String(50))  # crop_suggestion, fertilizer_advice, etc.
+    recommendation_type = Column(String(50))  # crop_suggestion, fertilizer_advice, crop_suitability
+    crop = Column(String(50))  # set for crop_suitability
     content = Column(Text)
     crops_suggested = Column(JSON)  # Store as JSON for flexibility
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -83,6 +108,9 @@ class Recommendation(Base):
 
 class SMSLog(Base):
     __tablename__ = "sms_logs"
+    __table_args__ = (
+        Index("ix_sms_logs_farmer_created", "farmer_id", "created_at"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     farmer_id = Column(String, ForeignKey("farmers.id", ondelete="CASCADE"))
@@ -102,6 +130,8 @@ class SMSSession(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     farmer_id = Column(String, ForeignKey("farmers.id", ondelete="CASCADE"))
     soil_test_id = Column(String, ForeignKey("soil_tests.id", ondelete="CASCADE"))
+    # Set when the session answers for a completed field session (composite values) instead of one sample
+    field_session_id = Column(String, ForeignKey("field_sessions.id", ondelete="CASCADE"))
     state = Column(String(50))  # awaiting_choice, awaiting_crop, completed
     user_response = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -110,6 +140,65 @@ class SMSSession(Base):
     # Relationships
     farmer = relationship("Farmer", back_populates="sms_sessions")
     soil_test = relationship("SoilTest", back_populates="sms_sessions")
+    field_session = relationship("FieldSession")
+
+class FieldSession(Base):
+    """Samples one device took in one field, aggregated into composite values"""
+    __tablename__ = "field_sessions"
+    __table_args__ = (
+        # The finalizer looks up open sessions that went idle
+        Index("ix_field_sessions_status_last_sample", "status", "last_sample_at"),
+        Index("ix_field_sessions_device_status", "device_id", "status"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    device_id = Column(String, ForeignKey("devices.id", ondelete="CASCADE"))
+    farmer_id = Column(String, ForeignKey("farmers.id", ondelete="CASCADE"))
+    status = Column(String(20), nullable=False, default="open")  # open, advising, completed
+    sample_count = Column(Integer, nullable=False, default=0)
+    latitude = Column(Float)  # running centroid of the samples
+    longitude = Column(Float)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    last_sample_at = Column(DateTime, default=datetime.utcnow)  # arrival, for the idle finalizer
+    last_sample_taken_at = Column(DateTime)  # the latest sample's own timestamp, for grouping
+    claimed_at = Column(DateTime)  # when completion was claimed; a stale advising claim is retried
+    completed_at = Column(DateTime)
+    # Composite values (depth-weighted median of the accepted samples), set on completion
+    temperature = Column(Float)
+    moisture = Column(Float)
+    ph = Column(Float)
+    nitrogen = Column(Float)
+    phosphorus = Column(Float)
+    potassium = Column(Float)
+    spread = Column(JSON)  # per field {"min", "max", "median"} across the samples
+    location_name = Column(String(255))
+
+    samples = relationship("SoilTest", foreign_keys="SoilTest.field_session_id")
+
+class SoilHistory(Base):
+    """Running summary of a farmer's accepted samples, farm-wide and per field, updated at ingestion"""
+    __tablename__ = "soil_history"
+
+    farmer_id = Column(String, ForeignKey("farmers.id", ondelete="CASCADE"), primary_key=True)
+    field_key = Column(String(40), primary_key=True)  # "" for the whole farm, else a grid cell "lat:lon"
+    sample_count = Column(Integer, nullable=False, default=0)
+    first_at = Column(DateTime)  # time origin of the decayed sums
+    last_at = Column(DateTime)
+    stats = Column(JSON)  # per field [w, sum_t, sum_y, sum_tt, sum_ty], decayed with age
+    season = Column(String(5))  # e.g. "2026B"
+    season_sums = Column(JSON)  # per field [count, sum] in `season`
+    last_season = Column(String(5))
+    last_season_values = Column(JSON)  # per field mean over `last_season`, plus "samples"
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DashboardCounter(Base):
+    """Incrementally maintained counts behind the admin dashboard summary"""
+    __tablename__ = "dashboard_counters"
+
+    metric = Column(String(50), primary_key=True)  # soil_tests, sms_sent, farmers_by_region, ...
+    bucket = Column(String(100), primary_key=True)  # day (YYYY-MM-DD), region, or "all"
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class AdminUser(Base):
     __tablename__ = "admin_users"
@@ -1,8 +1,14 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional, List
-from datetime import datetime
+from pydantic import AliasChoices, BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing import Any, Dict, Optional, List
+from datetime import datetime, timezone
 from uuid import UUID
 
+def naive_utc(value: datetime) -> datetime:
+    """Naive UTC, as the DB returns it; an aware timestamp ("...Z", "+03:00") is converted first"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 class SoilDataUpload(BaseModel):
     device_id: str
     farmer_id: str
@@ -19,6 +25,11 @@ class SoilDataUpload(BaseModel):
     soil_potassium_mgkg: float
     soil_ph: float
 
+    @field_validator("timestamp")
+    @classmethod
+    def _naive_utc(cls, value: datetime) -> datetime:
+        return naive_utc(value)
+
 class DeviceAuth(BaseModel):
     api_token: str
 
@@ -81,3 +92,260 @@ class AuthResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
     user: AdminUserResponse
+
+
+# Response models. Routes declare these so FastAPI validates and serializes
+# through pydantic-core (and orjson) instead of walking dicts with jsonable_encoder.
+# from_attributes lets endpoints hand over ORM rows directly.
+
+class ORMModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class StatusResponse(BaseModel):
+    status: str
+    message: Optional[str] = None
+
+class FarmerOut(ORMModel):
+    id: str
+    name: str
+    phone_number: str
+    region: Optional[str] = None
+    district: Optional[str] = None
+    pin: str
+    created_at: Optional[datetime] = None
+
+class FarmerCreateResponse(BaseModel):
+    status: str
+    farmer: FarmerOut
+
+class FarmerListResponse(BaseModel):
+    farmers: List[FarmerOut]
+
+class DeviceOut(ORMModel):
+    id: str
+    device_id: str
+    sim_number: Optional[str] = None
+    farmer_id: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+class DeviceRegisterResponse(BaseModel):
+    status: str
+    device: DeviceOut
+    api_token: str
+
+class DeviceListResponse(BaseModel):
+    devices: List[DeviceOut]
+
+class RecommendationOut(ORMModel):
+    id: str
+    recommendation_type: Optional[str] = None
+    crop: Optional[str] = None
+    content: Optional[str] = None
+    crops_suggested: Optional[Any] = None
+
+class SoilTestOut(ORMModel):
+    id: str
+    timestamp: datetime
+    location: Optional[str] = Field(None, validation_alias=AliasChoices("location", "location_name"))
+    ph: Optional[float] = None
+    moisture: Optional[float] = None
+    temperature: Optional[float] = None
+    nitrogen: Optional[float] = None
+    phosphorus: Optional[float] = None
+    potassium: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    quality_status: str = "ok"
+    quality_flags: Optional[List[str]] = None
+    field_session_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    recommendations: List[RecommendationOut] = []
+
+class SoilTestListResponse(BaseModel):
+    tests: List[SoilTestOut]
+
+class FieldSessionOut(ORMModel):
+    id: str
+    device_id: Optional[str] = None
+    status: str
+    sample_count: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    location: Optional[str] = Field(None, validation_alias=AliasChoices("location", "location_name"))
+    started_at: Optional[datetime] = None
+    last_sample_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    ph: Optional[float] = None
+    moisture: Optional[float] = None
+    temperature: Optional[float] = None
+    nitrogen: Optional[float] = None
+    phosphorus: Optional[float] = None
+    potassium: Optional[float] = None
+    spread: Optional[Dict[str, Dict[str, float]]] = None
+
+class FieldSessionListResponse(BaseModel):
+    sessions: List[FieldSessionOut]
+
+class SMSLogOut(ORMModel):
+    id: str
+    direction: Optional[str] = None
+    phone_number: Optional[str] = None
+    message: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class SMSLogListResponse(BaseModel):
+    logs: List[SMSLogOut]
+
+class RegionCount(BaseModel):
+    region: str
+    count: int
+
+class NewestFarmer(BaseModel):
+    id: str
+    name: str
+    created_at: Optional[datetime] = None
+
+class FarmerTotals(BaseModel):
+    total: int
+    regions: int
+    by_region: List[RegionCount]
+    newest: Optional[NewestFarmer] = None
+
+class DeviceTotals(BaseModel):
+    total: int
+    active: int
+    active_window_days: int
+
+class SoilTestTotals(BaseModel):
+    total: int
+    today: int
+
+class SMSTotals(BaseModel):
+    sent: int
+    failed: int
+    received: int
+
+class DailyActivity(BaseModel):
+    date: str
+    soil_tests: int
+    sms_sent: int
+    sms_failed: int
+    sms_received: int
+
+class DashboardSummaryResponse(BaseModel):
+    generated_at: datetime
+    farmers: FarmerTotals
+    devices: DeviceTotals
+    soil_tests: SoilTestTotals
+    sms: SMSTotals
+    per_day: List[DailyActivity]
+
+class DashboardRebuildResponse(BaseModel):
+    status: str
+    totals: Dict[str, int]
+
+class ArchivedTable(BaseModel):
+    parts: int
+    rows: int
+    bytes: int
+    oldest: Optional[str] = None
+    newest: Optional[str] = None
+
+class ArchiveStatsResponse(BaseModel):
+    archive_dir: str
+    tables: Dict[str, ArchivedTable]
+
+class ImportRowResult(BaseModel):
+    row: int
+    status: str  # created, valid (dry run), duplicate, invalid or failed
+    errors: List[str] = []
+    farmer_id: Optional[str] = None
+    phone_number: Optional[str] = None
+    pin: Optional[str] = None
+    device_id: Optional[str] = None
+    api_token: Optional[str] = None
+
+class ImportReportResponse(BaseModel):
+    status: str
+    dry_run: bool
+    total: int
+    created: int
+    valid: int
+    duplicates: int
+    invalid: int
+    failed: int
+    elapsed_ms: float
+    rows: List[ImportRowResult]
+
+class FieldQuality(BaseModel):
+    samples: int
+    mean: float
+    std: float
+    window_mean: Optional[float] = None
+    last: Optional[float] = None
+    drift_z: Optional[float] = None
+
+class DeviceQualityReport(BaseModel):
+    device_id: str
+    checked: int
+    quarantined: int
+    last_flags: List[str]
+    last_seen: Optional[datetime] = None
+    last_quarantined_at: Optional[datetime] = None
+    drifting: List[str]
+    fields: Dict[str, FieldQuality]
+
+class QualityBounds(BaseModel):
+    min: float
+    max: float
+
+class SensorQualityResponse(BaseModel):
+    devices: List[DeviceQualityReport]
+    bounds: Dict[str, QualityBounds]
+
+class LoopStall(BaseModel):
+    at: datetime
+    blocked_ms: float  # when the stack was captured
+    lag_ms: Optional[float] = None  # total, once the loop ran again
+    stack: List[str]
+
+class LoopLagResponse(BaseModel):
+    worker: int
+    enabled: bool
+    threshold_ms: float
+    stalls: int
+    max_lag_ms: float
+    last_stall_at: Optional[datetime] = None
+    recent: List[LoopStall]
+
+class MemoryStatusResponse(BaseModel):
+    worker: int
+    tracing: bool
+    started_at: Optional[datetime] = None
+    traced_kb: Optional[float] = None
+    peak_kb: Optional[float] = None
+
+class MemoryGrowth(BaseModel):
+    location: List[str]
+    size_kb: float
+    size_diff_kb: float
+    count: int
+    count_diff: int
+
+class MemorySnapshotResponse(MemoryStatusResponse):
+    compared_to: Optional[datetime] = None
+    top: List[MemoryGrowth]
+
+class SoilUploadResponse(BaseModel):
+    status: str
+    soil_test_id: str
+    location: Optional[str] = None
+    weather_summary: Optional[str] = None
+    message: str
+    sms_result: Optional[Dict[str, Any]] = None
+    duplicate: bool = False
+    quality_flags: List[str] = []
+    field_session_id: Optional[str] = None
+    field_session_status: Optional[str] = None  # open: advice follows when the session completes
@@ -1,28 +1,77 @@
-from typing import Dict, Optional
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.core.circuit_breaker import CircuitOpenError, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# SMS reply when an answer is None: the AI provider is failing or its circuit is open
+UNAVAILABLE_MESSAGE = "AI advice is temporarily unavailable. Please reply again in a few minutes."
 
 class AIAgronomist:
-    """Demo agronomist with static responses (no external AI calls)."""
+    """Demo agronomist with static responses (no external AI calls).
+
+    `history` is the farmer's soil history from app.services.soil_history:
+    {"farm": {...}, "field": {...}}, each with "samples", "since", "avg",
+    optionally "trend_per_month" and "last_season". It is None for a farmer's
+    first sample.
+
+    Every answer is None in degraded mode (provider failing or circuit open),
+    so callers never store or compare a placeholder text.
+    """
+
+    def __init__(self):
+        self.breaker = get_breaker("ai")
+
+    async def _guarded(self, fn: Callable[..., Awaitable[str]], *args) -> Optional[str]:
+        """Call the provider through the circuit breaker; None when it is unavailable"""
+        try:
+            return await self.breaker.call(fn, *args)
+        except CircuitOpenError:
+            return None
+        except Exception:
+            logger.exception("AI provider error")
+            return None
 
     async def get_crop_recommendations(
         self,
         soil_data: Dict,
-        weather_data: Dict
-    ) -> str:
+        weather_data: Dict,
+        history: Optional[Dict] = None
+    ) -> Optional[str]:
         """Get top 3 crop recommendations with brief reasoning (demo)."""
-        return (
-            "1. MAIZE (90/100): good N, warm\n"
-            "2. BEANS (86/100): soil ok, low cost\n"
-            "3. CASSAVA (83/100): drought-tolerant"
-        )
+        return await self._guarded(self._crop_recommendations, soil_data, weather_data, history)
 
     async def check_specific_crop(
         self,
         crop_name: str,
         soil_data: Dict,
-        weather_data: Dict
-    ) -> str:
+        weather_data: Dict,
+        history: Optional[Dict] = None
+    ) -> Optional[str]:
         """Check if specific crop is suitable and give advice (demo)."""
+        return await self._guarded(self._check_crop, crop_name, soil_data, weather_data, history)
+
+    async def get_fertilizer_advice(
+        self,
+        soil_data: Dict,
+        target_crop: Optional[str] = None,
+        history: Optional[Dict] = None
+    ) -> Optional[str]:
+        """Get fertilizer/soil treatment recommendations (demo)."""
+        return await self._guarded(self._fertilizer_advice, soil_data, target_crop, history)
+
+    async def _crop_recommendations(self, soil_data: Dict, weather_data: Dict, history: Optional[Dict]) -> str:
+        logger.debug("Crop recommendations requested", extra={"soil_data": soil_data, "history": history})
+        return (
+            "1. MAIZE (90/100): good N, warm\n"
+            "2. BEANS (86/100): soil ok, low cost\n"
+            "3. CASSAVA (83/100): drought-tolerant"
+        )
+
+    async def _check_crop(self, crop_name: str, soil_data: Dict, weather_data: Dict, history: Optional[Dict]) -> str:
         crop = crop_name.upper()
+        logger.debug("Crop check requested", extra={"crop": crop})
         return (
             f"✓ {crop} is SUITABLE (82/100)\n"
             "ADVICE:\n"
@@ -31,17 +80,21 @@ class AIAgronomist:
             "- Keep soil moist, avoid waterlogging"
         )
 
-    async def get_fertilizer_advice(
-        self,
-        soil_data: Dict,
-        target_crop: Optional[str] = None
-    ) -> str:
-        """Get fertilizer/soil treatment recommendations (demo)."""
+    async def _fertilizer_advice(self, soil_data: Dict, target_crop: Optional[str], history: Optional[Dict]) -> str:
+        logger.debug("Fertilizer advice requested", extra={"target_crop": target_crop, "history": history})
         return (
             "FERTILIZER NEEDED:\n"
             "- NPK 17:17:17\n"
             "- 50 kg per acre\n"
             "- Mix with soil at planting"
-        )
+        ) + _nitrogen_note(history)
+
+def _nitrogen_note(history: Optional[Dict]) -> str:
+    """One line when the field's nitrogen has been falling, for the demo fertilizer advice"""
+    summary = (history or {}).get("field") or (history or {}).get("farm") or {}
+    trend = summary.get("trend_per_month", {}).get("nitrogen")
+    if trend is None or trend >= 0:
+        return ""
+    return f"\n- N falling {abs(trend):g} mg/kg a month: top-dress"
 
 ai_agronomist = AIAgronomist()
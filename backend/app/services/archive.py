@@ -0,0 +1,220 @@
+"""
+Compressed archive of rows moved out of the hot tables.
+
+Rows are written as gzip NDJSON, one part file per table, month and run:
+
+    {ARCHIVE_DIR}/{table}/{YYYY-MM}/part-{run}.ndjson.gz
+
+`manifest.json` lists every part with its row count, created_at range and
+checksum. Readers use it to open only the parts that overlap the requested
+range. `{table}/farmers.json` maps each farmer to the parts holding their
+rows, so a farmer's history opens only those parts. A part is added to the
+manifest before its rows are deleted, so a crash in between can leave a row
+both archived and hot (and archived again by the next run); readers skip ids
+they have already seen.
+
+The retention job and the API workers are separate processes: the index and
+manifest are updated under a file lock and replaced by atomic renames, and
+readers keep the parsed files until they change on disk.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+FARMER_INDEX = "farmers.json"
+LOCK_FILE = ".manifest.lock"
+
+_lock = threading.Lock()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot archive {type(value).__name__}")
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class Archive:
+    def __init__(self, root: str):
+        self.root = root
+        # path -> ((mtime_ns, size), parsed JSON)
+        self._loaded: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST)
+
+    def _index_path(self, table: str) -> str:
+        return os.path.join(self.root, table, FARMER_INDEX)
+
+    def _load(self, path: str) -> Optional[Dict]:
+        """Parsed JSON file, re-read only when the file has been replaced since the last read"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        loaded = self._loaded.get(path)
+        if loaded is None or loaded[0] != key:
+            with open(path, encoding="utf-8") as f:
+                loaded = (key, json.load(f))
+            self._loaded[path] = loaded
+        return loaded[1]
+
+    def manifest(self) -> List[Dict]:
+        data = self._load(self.manifest_path)
+        return list(data["parts"]) if data else []
+
+    def farmer_index(self, table: str) -> Dict[str, List[str]]:
+        """farmer_id -> paths of the table's parts that hold their rows"""
+        return self._load(self._index_path(table)) or {}
+
+    @staticmethod
+    def _save(path: str, data: Dict, indent: Optional[int] = None) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @contextmanager
+    def _locked(self):
+        """Serialize manifest/index updates across threads and processes"""
+        os.makedirs(self.root, exist_ok=True)
+        with _lock, open(os.path.join(self.root, LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write_part(self, table: str, month: str, rows: Iterable[Dict], run_id: str) -> Dict:
+        """Stream rows into one gzip NDJSON part and register it in the manifest; returns the manifest entry"""
+        relative = os.path.join(table, month, f"part-{run_id}.ndjson.gz")
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        digest = hashlib.sha256()
+        count = 0
+        oldest = newest = None
+        farmers = set()
+        with gzip.open(path, "wb", compresslevel=6) as f:
+            for row in rows:
+                line = json.dumps(row, default=_json_default, separators=(",", ":")).encode("utf-8") + b"\n"
+                digest.update(line)
+                f.write(line)
+                count += 1
+                if row.get("farmer_id") is not None:
+                    farmers.add(row["farmer_id"])
+                created_at = row.get("created_at")
+                if created_at is not None:
+                    oldest = created_at if oldest is None or created_at < oldest else oldest
+                    newest = created_at if newest is None or created_at > newest else newest
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+
+        entry = {
+            "table": table,
+            "month": month,
+            "path": relative,
+            "rows": count,
+            "min_created_at": _json_default(oldest) if oldest else None,
+            "max_created_at": _json_default(newest) if newest else None,
+            "bytes": os.path.getsize(path),
+            "sha256": digest.hexdigest(),
+            "archived_at": datetime.utcnow().isoformat(),
+            "indexed": True,  # listed in the farmer index; older parts are not
+        }
+        with self._locked():
+            # Index first: a part in the manifest is always findable by farmer
+            index = {farmer: list(paths) for farmer, paths in self.farmer_index(table).items()}
+            for farmer in farmers:
+                index.setdefault(farmer, []).append(relative)
+            self._save(self._index_path(table), index)
+            self._save(self.manifest_path, {"version": 1, "parts": self.manifest() + [entry]}, indent=1)
+        logger.info("Archive part written", extra={"table": table, "month": month, "rows": count})
+        return entry
+
+    def parts(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict]:
+        """Manifest entries for a table whose created_at range overlaps [start, end)"""
+        selected = []
+        for part in self.manifest():
+            if part["table"] != table:
+                continue
+            if start is not None and part["max_created_at"] and _parse_datetime(part["max_created_at"]) < start:
+                continue
+            if end is not None and part["min_created_at"] and _parse_datetime(part["min_created_at"]) >= end:
+                continue
+            selected.append(part)
+        return selected
+
+    def read(
+        self,
+        table: str,
+        farmer_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        exclude_ids: Iterable[str] = (),
+    ) -> Iterator[Dict]:
+        """Archived rows of a table, optionally for one farmer and a created_at range (blocking file I/O)"""
+        seen = set(exclude_ids)
+        parts = self.parts(table, start, end)
+        if farmer_id is not None:
+            holding = set(self.farmer_index(table).get(farmer_id, ()))
+            parts = [part for part in parts if part["path"] in holding or not part.get("indexed")]
+        for part in parts:
+            with gzip.open(os.path.join(self.root, part["path"]), "rb") as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row["id"] in seen:
+                        continue
+                    if farmer_id is not None and row.get("farmer_id") != farmer_id:
+                        continue
+                    created_at = _parse_datetime(row.get("created_at"))
+                    if start is not None and (created_at is None or created_at < start):
+                        continue
+                    if end is not None and created_at is not None and created_at >= end:
+                        continue
+                    seen.add(row["id"])
+                    yield row
+
+    def stats(self) -> Dict[str, Dict]:
+        totals: Dict[str, Dict] = {}
+        for part in self.manifest():
+            table = totals.setdefault(part["table"], {"parts": 0, "rows": 0, "bytes": 0, "oldest": None, "newest": None})
+            table["parts"] += 1
+            table["rows"] += part["rows"]
+            table["bytes"] += part.get("bytes", 0)
+            if part["min_created_at"] and (table["oldest"] is None or part["min_created_at"] < table["oldest"]):
+                table["oldest"] = part["min_created_at"]
+            if part["max_created_at"] and (table["newest"] is None or part["max_created_at"] > table["newest"]):
+                table["newest"] = part["max_created_at"]
+        return totals
+
+
+archive = Archive(settings.archive_dir)
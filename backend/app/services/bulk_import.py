@@ -0,0 +1,380 @@
+"""
+Bulk onboarding of farmers and devices from CSV or XLSX uploads.
+
+Rows are read as a stream and handled in chunks of IMPORT_CHUNK_SIZE. Each
+chunk is validated in Python, checked for duplicates with one IN query per
+unique column, inserted with one executemany per table and committed, so a
+20k-row file takes a few dozen statements instead of 40k requests. Every
+row gets an entry in the report; generated PINs and device API tokens are
+returned there, exactly once, as the single-record endpoints do.
+"""
+
+import csv
+import io
+import logging
+import secrets
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.http_cache import bump_farmer_versions
+from app.models.database_models import Device, Farmer
+from app.models.schemas import FarmerCreate
+from app.services import dashboard
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+VALID = "valid"  # dry run: would be created
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+FAILED = "failed"
+
+Row = Tuple[int, Dict[str, str]]  # (line number in the file, cells by header)
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read as a table (bad encoding, missing headers, no openpyxl)"""
+
+
+def _header(name) -> str:
+    return str(name or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def _cell(value) -> str:
+    # Spreadsheets store phone numbers and SIMs as numbers
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value).strip()
+
+
+def _csv_rows(stream) -> Iterator[Row]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        headers = [_header(h) for h in next(reader, [])]
+        for values in reader:
+            if any(v.strip() for v in values):
+                yield reader.line_num, {h: _cell(v) for h, v in zip(headers, values) if h}
+    except UnicodeDecodeError as e:
+        raise ImportFileError("CSV must be UTF-8 encoded") from e
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(stream) -> Iterator[Row]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportFileError("XLSX import requires the 'openpyxl' package (pip install openpyxl); upload CSV instead") from e
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Could not open workbook: {e}") from e
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        headers = [_header(h) for h in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(v is not None and str(v).strip() for v in values):
+                yield line, {h: _cell(v) for h, v in zip(headers, values) if h}
+    finally:
+        workbook.close()
+
+
+def read_rows(filename: Optional[str], stream) -> Iterator[Row]:
+    """Stream data rows from an uploaded .csv or .xlsx file"""
+    if (filename or "").lower().endswith((".xlsx", ".xlsm")):
+        return _xlsx_rows(stream)
+    return _csv_rows(stream)
+
+
+def _chunks(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validate(model, values: Dict[str, str]) -> Tuple[Optional[object], List[str]]:
+    try:
+        return model.model_validate(values), []
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+
+
+def _length_errors(table_model, values: Dict[str, Optional[str]]) -> List[str]:
+    errors = []
+    for field, value in values.items():
+        limit = getattr(table_model.__table__.c[field].type, "length", None)
+        if value and limit and len(value) > limit:
+            errors.append(f"{field}: at most {limit} characters")
+    return errors
+
+
+def _required(values: Dict[str, str], fields: Iterable[str]) -> List[str]:
+    return [f"{field}: required" for field in fields if not values.get(field)]
+
+
+def _new_pin() -> str:
+    return str(secrets.randbelow(900000) + 100000)  # 6 digits
+
+
+def _new_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class ImportReport:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.rows: List[Dict] = []
+        self.started = time.perf_counter()
+
+    def add(self, line: int, status: str, errors: Optional[List[str]] = None, **fields) -> None:
+        self.rows.append({"row": line, "status": status, "errors": errors or [], **fields})
+
+    def as_dict(self) -> Dict:
+        counts = Counter(row["status"] for row in self.rows)
+        self.rows.sort(key=lambda row: row["row"])
+        return {
+            "status": "success" if not counts[INVALID] + counts[DUPLICATE] + counts[FAILED] else "partial",
+            "dry_run": self.dry_run,
+            "total": len(self.rows),
+            "created": counts[CREATED],
+            "valid": counts[VALID],
+            "duplicates": counts[DUPLICATE],
+            "invalid": counts[INVALID],
+            "failed": counts[FAILED],
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "rows": self.rows,
+        }
+
+
+def _existing(db: Session, column, values: Iterable[str]) -> set:
+    values = list(set(values))
+    if not values:
+        return set()
+    return {value for (value,) in db.query(column).filter(column.in_(values))}
+
+
+def _commit_chunk(db: Session, report: ImportReport, pending: List[Tuple[int, Dict]], write, retry) -> None:
+    """Run one chunk's inserts in a transaction; on a unique violation (a concurrent insert) re-check once"""
+    try:
+        write()
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if retry is not None:
+            logger.warning("Import chunk conflicted, re-checking duplicates", extra={"rows": len(pending)})
+            retry()
+            return
+        for line, fields in pending:
+            kept = {k: v for k, v in fields.items() if k not in ("pin", "api_token")}
+            report.add(line, FAILED, [f"Conflicting write: {e.orig}"], **kept)
+        return
+    for line, fields in pending:
+        report.add(line, CREATED, **fields)
+
+
+# Farmers (optionally with their device)
+
+FARMER_FIELDS = ("name", "phone_number", "region", "district")
+DEVICE_FIELDS = ("device_id", "sim_number")
+
+
+def _farmer_chunk(db: Session, chunk: List[Row], seen: Dict[str, Dict[str, int]], report: ImportReport,
+                  retry: bool = True) -> None:
+    candidates = []
+    for line, values in chunk:
+        farmer, errors = _validate(FarmerCreate, {f: values.get(f, "") for f in FARMER_FIELDS})
+        errors += _required(values, ("name", "phone_number"))
+        device_id = values.get("device_id")
+        if device_id:
+            errors += _required(values, ("sim_number",))
+        errors += _length_errors(Farmer, {f: values.get(f) for f in FARMER_FIELDS})
+        errors += _length_errors(Device, {f: values.get(f) for f in DEVICE_FIELDS})
+        phone = values.get("phone_number")
+        if errors:
+            report.add(line, INVALID, errors, phone_number=phone)
+            continue
+
+        repeated = []
+        if phone in seen["phone_number"]:
+            repeated.append(f"phone_number repeats row {seen['phone_number'][phone]}")
+        if device_id and device_id in seen["device_id"]:
+            repeated.append(f"device_id repeats row {seen['device_id'][device_id]}")
+        if repeated:
+            report.add(line, DUPLICATE, repeated, phone_number=phone)
+            continue
+        seen["phone_number"][phone] = line
+        if device_id:
+            seen["device_id"][device_id] = line
+        candidates.append((line, farmer, values if device_id else None))
+
+    registered_phones = _existing(db, Farmer.phone_number, (f.phone_number for _, f, _ in candidates))
+    registered_devices = _existing(db, Device.device_id, (d["device_id"] for _, _, d in candidates if d))
+
+    now = datetime.utcnow()
+    farmers, devices, pending, regions = [], [], [], Counter()
+    for line, farmer, device in candidates:
+        errors = []
+        if farmer.phone_number in registered_phones:
+            errors.append("Phone number already registered")
+        if device and device["device_id"] in registered_devices:
+            errors.append("Device already registered")
+        if errors:
+            report.add(line, DUPLICATE, errors, phone_number=farmer.phone_number)
+            continue
+
+        farmer_id = str(uuid.uuid4())
+        pin = _new_pin()
+        farmers.append({
+            "id": farmer_id, "name": farmer.name, "phone_number": farmer.phone_number,
+            "region": farmer.region or None, "district": farmer.district or None,
+            "pin": pin, "created_at": now, "updated_at": now,
+        })
+        regions[farmer.region] += 1
+        fields = {"farmer_id": farmer_id, "phone_number": farmer.phone_number, "pin": pin}
+        if device:
+            token = _new_token()
+            devices.append({
+                "id": str(uuid.uuid4()), "device_id": device["device_id"], "sim_number": device["sim_number"],
+                "farmer_id": farmer_id, "api_token": token, "is_active": True, "created_at": now,
+            })
+            fields.update(device_id=device["device_id"], api_token=token)
+        pending.append((line, fields))
+
+    if report.dry_run or not pending:
+        for line, fields in pending:
+            report.add(line, VALID, phone_number=fields["phone_number"], device_id=fields.get("device_id"))
+        return
+
+    def write():
+        db.execute(insert(Farmer), farmers)
+        if devices:
+            db.execute(insert(Device), devices)
+        for region, count in regions.items():
+            dashboard.record_farmer(db, region, count)
+        if devices:
+            dashboard.record_devices(db, len(devices))
+
+    def again():
+        for line, fields in pending:
+            seen["phone_number"].pop(fields["phone_number"], None)
+            seen["device_id"].pop(fields.get("device_id"), None)
+        _farmer_chunk(db, [row for row in chunk if row[0] in {line for line, _ in pending}], seen, report, retry=False)
+
+    _commit_chunk(db, report, pending, write, again if retry else None)
+
+
+def import_farmers(db: Session, rows: Iterable[Row], dry_run: bool = False) -> Dict:
+    """Create a farmer (and a device, when device_id is set) per row"""
+    report = ImportReport(dry_run)
+    seen = {"phone_number": {}, "device_id": {}}
+    for chunk in _chunks(rows, settings.import_chunk_size):
+        _farmer_chunk(db, chunk, seen, report)
+    result = report.as_dict()
+    logger.info("Farmer import finished", extra={k: v for k, v in result.items() if k != "rows"})
+    return result
+
+
+# Devices for farmers that already exist
+
+def _device_chunk(db: Session, chunk: List[Row], seen: Dict[str, Dict[str, int]], report: ImportReport,
+                  retry: bool = True) -> None:
+    candidates = []
+    for line, values in chunk:
+        errors = _required(values, DEVICE_FIELDS)
+        if not values.get("farmer_id") and not values.get("phone_number"):
+            errors.append("farmer_id or phone_number: required")
+        errors += _length_errors(Device, {f: values.get(f) for f in DEVICE_FIELDS})
+        if errors:
+            report.add(line, INVALID, errors, device_id=values.get("device_id"))
+            continue
+        if values["device_id"] in seen["device_id"]:
+            report.add(line, DUPLICATE, [f"device_id repeats row {seen['device_id'][values['device_id']]}"],
+                       device_id=values["device_id"])
+            continue
+        seen["device_id"][values["device_id"]] = line
+        candidates.append((line, values))
+
+    by_phone = dict(
+        db.query(Farmer.phone_number, Farmer.id)
+        .filter(Farmer.phone_number.in_({v["phone_number"] for _, v in candidates if v.get("phone_number")}))
+    ) if candidates else {}
+    farmer_ids = _existing(db, Farmer.id, (v["farmer_id"] for _, v in candidates if v.get("farmer_id")))
+
+    resolved = []
+    for line, values in candidates:
+        farmer_id = values.get("farmer_id") or by_phone.get(values.get("phone_number"))
+        if not farmer_id or (values.get("farmer_id") and farmer_id not in farmer_ids):
+            report.add(line, INVALID, ["Farmer not found"], device_id=values["device_id"])
+            continue
+        resolved.append((line, values, farmer_id))
+
+    with_device = _existing(db, Device.farmer_id, (farmer_id for _, _, farmer_id in resolved))
+    registered_devices = _existing(db, Device.device_id, (v["device_id"] for _, v, _ in resolved))
+
+    now = datetime.utcnow()
+    devices, pending = [], []
+    for line, values, farmer_id in resolved:
+        errors = []
+        if farmer_id in with_device:
+            errors.append("Farmer already has a registered device")
+        elif farmer_id in seen["farmer_id"]:
+            errors.append(f"farmer repeats row {seen['farmer_id'][farmer_id]}")
+        if values["device_id"] in registered_devices:
+            errors.append("Device already registered")
+        if errors:
+            report.add(line, DUPLICATE, errors, device_id=values["device_id"], farmer_id=farmer_id)
+            continue
+        seen["farmer_id"][farmer_id] = line
+
+        token = _new_token()
+        devices.append({
+            "id": str(uuid.uuid4()), "device_id": values["device_id"], "sim_number": values["sim_number"],
+            "farmer_id": farmer_id, "api_token": token, "is_active": True, "created_at": now,
+        })
+        pending.append((line, {"farmer_id": farmer_id, "device_id": values["device_id"], "api_token": token}))
+
+    if report.dry_run or not pending:
+        for line, fields in pending:
+            report.add(line, VALID, farmer_id=fields["farmer_id"], device_id=fields["device_id"])
+        return
+
+    def write():
+        db.execute(insert(Device), devices)
+        dashboard.record_devices(db, len(devices))
+        bump_farmer_versions(db, [fields["farmer_id"] for _, fields in pending])
+
+    def again():
+        for line, fields in pending:
+            seen["device_id"].pop(fields["device_id"], None)
+            seen["farmer_id"].pop(fields["farmer_id"], None)
+        _device_chunk(db, [row for row in chunk if row[0] in {line for line, _ in pending}], seen, report, retry=False)
+
+    _commit_chunk(db, report, pending, write, again if retry else None)
+
+
+def import_devices(db: Session, rows: Iterable[Row], dry_run: bool = False) -> Dict:
+    """Register a device per row for a farmer given by farmer_id or phone_number"""
+    report = ImportReport(dry_run)
+    seen = {"device_id": {}, "farmer_id": {}}
+    for chunk in _chunks(rows, settings.import_chunk_size):
+        _device_chunk(db, chunk, seen, report)
+    result = report.as_dict()
+    logger.info("Device import finished", extra={k: v for k, v in result.items() if k != "rows"})
+    return result
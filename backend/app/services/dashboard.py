@@ -0,0 +1,230 @@
+"""
+Counters behind the admin dashboard summary.
+
+Every write that the dashboard reports on bumps a row in `dashboard_counters`
+in the same transaction, so the summary is a read of a few hundred small rows
+instead of a scan of soil_tests / sms_logs. Today's row is shared by every
+write, so bumps are only collected on the session and applied as one upsert
+per row just before it commits: the row lock is taken after the caller's last
+await (an SMS send, an AI call) and released by the commit straight after. Activity counters (tests, SMS) are
+a history and are not rewound when a farmer is deleted; farmer and device
+counts track the current roster.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.database_models import DashboardCounter, Device, Farmer, SMSLog, SoilTest
+
+logger = logging.getLogger(__name__)
+
+# Daily metrics (bucket = YYYY-MM-DD)
+SOIL_TESTS = "soil_tests"
+SMS_SENT = "sms_sent"
+SMS_FAILED = "sms_failed"
+SMS_RECEIVED = "sms_received"
+DAILY_METRICS = (SOIL_TESTS, SMS_SENT, SMS_FAILED, SMS_RECEIVED)
+
+# Roster metrics
+FARMERS_BY_REGION = "farmers_by_region"  # bucket = region
+DEVICES = "devices"  # bucket = TOTAL
+
+TOTAL = "all"
+UNKNOWN_REGION = "Unknown"
+
+# Session.info key for counter deltas waiting for the commit
+PENDING = "dashboard_counters"
+
+
+def _day(at: Optional[datetime] = None) -> str:
+    return (at or datetime.utcnow()).date().isoformat()
+
+
+def _region(region: Optional[str]) -> str:
+    return (region or "").strip() or UNKNOWN_REGION
+
+
+def bump(db: Session, metric: str, bucket: str = TOTAL, amount: int = 1) -> None:
+    """Add to a counter when the caller's transaction commits (no statement until then)"""
+    if not db.in_transaction():
+        db.begin()  # so a rollback before any query still discards it
+    pending = db.info.setdefault(PENDING, {})
+    pending[(metric, bucket)] = pending.get((metric, bucket), 0) + amount
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_pending(db: Session) -> None:
+    pending = db.info.pop(PENDING, None)
+    if not pending:
+        return
+    now = datetime.utcnow()
+    # Sorted, so two transactions lock shared rows in the same order
+    for (metric, bucket), amount in sorted(pending.items()):
+        if amount:
+            _upsert(db, metric, bucket, amount, now)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(db: Session, transaction) -> None:
+    # Rolled back or closed without a commit; a commit has already applied them
+    if transaction.parent is None:
+        db.info.pop(PENDING, None)
+
+
+def _upsert(db: Session, metric: str, bucket: str, amount: int, now: datetime) -> None:
+    """One upsert, no read"""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(DashboardCounter).values(metric=metric, bucket=bucket, value=amount, updated_at=now)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["metric", "bucket"],
+            set_={"value": DashboardCounter.value + amount, "updated_at": now}
+        ))
+        return
+
+    updated = db.query(DashboardCounter)\
+        .filter(DashboardCounter.metric == metric, DashboardCounter.bucket == bucket)\
+        .update({"value": DashboardCounter.value + amount, "updated_at": now}, synchronize_session=False)
+    if not updated:
+        db.add(DashboardCounter(metric=metric, bucket=bucket, value=amount, updated_at=now))
+
+
+def record_soil_test(db: Session, device: Device, at: Optional[datetime] = None) -> None:
+    at = at or datetime.utcnow()
+    bump(db, SOIL_TESTS, _day(at))
+    device.last_seen_at = at
+
+
+def record_sms(db: Session, status: Optional[str], at: Optional[datetime] = None) -> None:
+    if status == "received":
+        metric = SMS_RECEIVED
+    elif status == "failed":
+        metric = SMS_FAILED
+    else:
+        metric = SMS_SENT
+    bump(db, metric, _day(at))
+
+
+def record_farmer(db: Session, region: Optional[str], amount: int = 1) -> None:
+    bump(db, FARMERS_BY_REGION, _region(region), amount)
+
+
+def record_devices(db: Session, amount: int = 1) -> None:
+    bump(db, DEVICES, TOTAL, amount)
+
+
+def _per_day(rows: Dict[str, Dict[str, int]], start: date, days: int) -> List[Dict]:
+    series = []
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        counts = rows.get(day, {})
+        series.append({
+            "date": day,
+            "soil_tests": counts.get(SOIL_TESTS, 0),
+            "sms_sent": counts.get(SMS_SENT, 0),
+            "sms_failed": counts.get(SMS_FAILED, 0),
+            "sms_received": counts.get(SMS_RECEIVED, 0),
+        })
+    return series
+
+
+def summary(db: Session, days: int = 30, active_days: int = 7) -> Dict:
+    """Dashboard totals, per-day activity for the last `days` days and farmers per region"""
+    now = datetime.utcnow()
+    start = now.date() - timedelta(days=days - 1)
+
+    totals = dict(
+        db.query(DashboardCounter.metric, func.sum(DashboardCounter.value))
+        .group_by(DashboardCounter.metric)
+    )
+
+    daily: Dict[str, Dict[str, int]] = {}
+    recent = db.query(DashboardCounter.metric, DashboardCounter.bucket, DashboardCounter.value)\
+        .filter(DashboardCounter.metric.in_(DAILY_METRICS), DashboardCounter.bucket >= start.isoformat())
+    for metric, bucket, value in recent:
+        daily.setdefault(bucket, {})[metric] = value
+
+    regions = db.query(DashboardCounter.bucket, DashboardCounter.value)\
+        .filter(DashboardCounter.metric == FARMERS_BY_REGION, DashboardCounter.value > 0)\
+        .order_by(DashboardCounter.value.desc(), DashboardCounter.bucket)\
+        .all()
+
+    # Both use an index: devices.last_seen_at and farmers.created_at
+    active_devices = db.query(func.count(Device.id))\
+        .filter(Device.last_seen_at >= now - timedelta(days=active_days))\
+        .scalar()
+    newest = db.query(Farmer.id, Farmer.name, Farmer.created_at)\
+        .order_by(Farmer.created_at.desc())\
+        .first()
+
+    per_day = _per_day(daily, start, days)
+    return {
+        "generated_at": now,
+        "farmers": {
+            "total": int(totals.get(FARMERS_BY_REGION) or 0),
+            "regions": len(regions),
+            "by_region": [{"region": region, "count": count} for region, count in regions],
+            "newest": {"id": newest.id, "name": newest.name, "created_at": newest.created_at} if newest else None,
+        },
+        "devices": {
+            "total": int(totals.get(DEVICES) or 0),
+            "active": active_devices,
+            "active_window_days": active_days,
+        },
+        "soil_tests": {
+            "total": int(totals.get(SOIL_TESTS) or 0),
+            "today": per_day[-1]["soil_tests"],
+        },
+        "sms": {
+            "sent": int(totals.get(SMS_SENT) or 0),
+            "failed": int(totals.get(SMS_FAILED) or 0),
+            "received": int(totals.get(SMS_RECEIVED) or 0),
+        },
+        "per_day": per_day,
+    }
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Recompute every counter from the base tables (backfill or repair); commits"""
+    db.query(DashboardCounter).delete(synchronize_session=False)
+    counters: Dict[tuple, int] = {}
+
+    def add(metric: str, bucket: str, value: int) -> None:
+        counters[(metric, bucket)] = counters.get((metric, bucket), 0) + int(value)
+
+    for day, count in db.query(func.date(SoilTest.created_at), func.count(SoilTest.id))\
+            .group_by(func.date(SoilTest.created_at)):
+        if day is not None:
+            add(SOIL_TESTS, str(day)[:10], count)
+
+    sms_rows = db.query(func.date(SMSLog.created_at), SMSLog.status, func.count(SMSLog.id))\
+        .group_by(func.date(SMSLog.created_at), SMSLog.status)
+    for day, status, count in sms_rows:
+        if day is None:
+            continue
+        metric = SMS_RECEIVED if status == "received" else SMS_FAILED if status == "failed" else SMS_SENT
+        add(metric, str(day)[:10], count)
+
+    for region, count in db.query(Farmer.region, func.count(Farmer.id)).group_by(Farmer.region):
+        add(FARMERS_BY_REGION, _region(region), count)
+
+    add(DEVICES, TOTAL, db.query(func.count(Device.id)).scalar() or 0)
+
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(DashboardCounter, [
+        {"metric": metric, "bucket": bucket, "value": value, "updated_at": now}
+        for (metric, bucket), value in counters.items()
+    ])
+    db.commit()
+    logger.info("Dashboard counters rebuilt", extra={"counters": len(counters)})
+
+    metrics: Dict[str, int] = {}
+    for (metric, _), value in counters.items():
+        metrics[metric] = metrics.get(metric, 0) + value
+    return metrics
@@ -0,0 +1,382 @@
+"""
+Field sessions: the samples one device takes in one field, advised on once.
+
+A farmer usually probes several spots and depths in a field within a few
+minutes. Each accepted sample joins its device's open session if it was taken
+(by its own timestamp, so buffered uploads group correctly) within
+FIELD_SESSION_IDLE_SECONDS of the previous one and within
+FIELD_SESSION_RADIUS_M of the session's running centroid. Otherwise the open
+session is completed and a new one starts. A session also completes when it
+reaches FIELD_SESSION_MAX_SAMPLES. Sessions that simply go quiet are
+completed by the background finalizer.
+
+Completing is claimed first (status ADVISING, committed, so only one upload
+or finalizer in any worker does it) and the session becomes COMPLETED in the
+same commit that opens the farmer's SMS session. If anything fails in between
+(the weather fetch, say), the claim is left behind and the finalizer claims
+the session again once it is ADVISE_RETRY_SECONDS old, so no field's result is
+dropped.
+
+Completing a session computes a composite per nutrient: the depth-weighted
+median of its samples. Each depth stands for the soil layer around it, so
+three topsoil probes and one deep probe do not count as four equal votes, and
+one bad probe cannot drag the result the way a mean would. The farmer then
+gets one SMS, and the agronomist one request, per field instead of per sample.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.models.schemas import naive_utc
+from app.core.http_cache import bump_farmer_version
+from app.models.database_models import Device, Farmer, FieldSession, SMSSession, SoilTest
+from app.services import recommendations, soil_history
+from app.services.sensor_quality import FIELDS, OK
+from app.services.sms_service import sms_service
+from app.services.weather_service import weather_service
+
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+ADVISING = "advising"
+COMPLETED = "completed"
+
+# An advising claim older than this was abandoned (its worker failed or died) and is retried
+ADVISE_RETRY_SECONDS = 300
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance (haversine)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _depth_weights(depths: Sequence[Optional[int]]) -> List[float]:
+    """Weight of each sample: the thickness of the soil layer its depth stands for, shared by samples at that depth"""
+    levels = sorted({d for d in depths if d is not None})
+    if len(levels) < 2:
+        return [1.0] * len(depths)
+
+    thickness = {}
+    for i, level in enumerate(levels):
+        top = (levels[i - 1] + level) / 2 if i > 0 else 0.0
+        bottom = (level + levels[i + 1]) / 2 if i < len(levels) - 1 else level + (level - levels[i - 1]) / 2
+        thickness[level] = max(bottom - top, 1.0)
+    per_level = {level: sum(1 for d in depths if d == level) for level in levels}
+    unknown = sum(thickness.values()) / len(thickness)  # a sample without a depth gets an average layer
+    return [thickness[d] / per_level[d] if d is not None else unknown for d in depths]
+
+
+def _weighted_median(values: Sequence[float], weights: Sequence[float]) -> float:
+    pairs = sorted(zip(values, weights))
+    half = sum(weights) / 2
+    running = 0.0
+    for i, (value, weight) in enumerate(pairs):
+        running += weight
+        if running > half:
+            return value
+        if running == half:
+            # Exactly between two values: average them, as an ordinary median would
+            return (value + pairs[i + 1][0]) / 2
+    return pairs[-1][0]
+
+
+def _median(values: Sequence[float]) -> float:
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def _taken_at(soil_test: SoilTest, now: datetime) -> datetime:
+    return naive_utc(soil_test.timestamp) if soil_test.timestamp else now
+
+
+def _fits(session: FieldSession, soil_test: SoilTest, now: datetime) -> bool:
+    # Sessions opened before last_sample_taken_at existed fall back to arrival time
+    previous = session.last_sample_taken_at or session.last_sample_at
+    if abs(_taken_at(soil_test, now) - previous) > timedelta(seconds=settings.field_session_idle_seconds):
+        return False
+    if session.sample_count >= settings.field_session_max_samples:
+        return False
+    return _distance_m(session.latitude, session.longitude, soil_test.latitude, soil_test.longitude) \
+        <= settings.field_session_radius_m
+
+
+def add_sample(db: Session, device: Device, soil_test: SoilTest) -> Tuple[FieldSession, List[FieldSession]]:
+    """Put a stored, accepted sample into its device's open session (caller's transaction).
+
+    Returns the session and the sessions that are now ready to complete: a previous session
+    the device moved away from, and this one if the sample filled it.
+    """
+    now = datetime.utcnow()
+    ready = []
+    # Serializes a device's uploads (Postgres row lock; SQLite already holds its write lock from
+    # the sample insert), so two first samples cannot each open a session
+    db.query(Device.id).filter(Device.id == device.id).with_for_update().first()
+    session = db.query(FieldSession)\
+        .filter(FieldSession.device_id == device.id, FieldSession.status == OPEN)\
+        .order_by(FieldSession.started_at.desc())\
+        .first()
+    if session is not None and not _fits(session, soil_test, now):
+        ready.append(session)
+        session = None
+
+    if session is None:
+        session = FieldSession(
+            device_id=device.id,
+            farmer_id=soil_test.farmer_id,
+            status=OPEN,
+            sample_count=0,
+            latitude=soil_test.latitude,
+            longitude=soil_test.longitude,
+            started_at=now,
+        )
+        db.add(session)
+        db.flush()
+
+    # Running centroid, so the radius check stays O(1) per sample
+    count = session.sample_count + 1
+    session.latitude += (soil_test.latitude - session.latitude) / count
+    session.longitude += (soil_test.longitude - session.longitude) / count
+    session.sample_count = count
+    session.last_sample_at = now
+    taken_at = _taken_at(soil_test, now)
+    session.last_sample_taken_at = max(session.last_sample_taken_at or taken_at, taken_at)
+    soil_test.field_session_id = session.id
+
+    if count >= settings.field_session_max_samples:
+        ready.append(session)
+    return session, ready
+
+
+def _abandoned(now: datetime):
+    return and_(FieldSession.status == ADVISING,
+                FieldSession.claimed_at < now - timedelta(seconds=ADVISE_RETRY_SECONDS))
+
+
+def _claim(db: Session, session_id: str) -> bool:
+    """Claim a session for completion; only one caller (upload or finalizer, any worker) wins"""
+    now = datetime.utcnow()
+    claimed = db.query(FieldSession)\
+        .filter(FieldSession.id == session_id, or_(FieldSession.status == OPEN, _abandoned(now)))\
+        .update({"status": ADVISING, "claimed_at": now}, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def _mark_completed(session: FieldSession) -> None:
+    session.status = COMPLETED
+    session.completed_at = datetime.utcnow()
+
+
+def _composite(db: Session, session: FieldSession) -> Optional[SoilTest]:
+    """Store the depth-weighted medians on the session; returns its latest sample"""
+    samples = db.query(SoilTest)\
+        .filter(SoilTest.field_session_id == session.id, SoilTest.quality_status == OK)\
+        .order_by(SoilTest.timestamp)\
+        .all()
+    if not samples:
+        return None
+
+    spread = {}
+    for name in FIELDS:
+        present = [(getattr(s, name), s.sample_depth_cm) for s in samples if getattr(s, name) is not None]
+        if not present:
+            continue
+        values = [value for value, _ in present]
+        weights = _depth_weights([depth for _, depth in present])
+        setattr(session, name, round(_weighted_median(values, weights), 3))
+        spread[name] = {"min": min(values), "max": max(values), "median": _median(values)}
+    session.spread = spread
+    return samples[-1]
+
+
+async def advise_farmer(
+    db: Session,
+    farmer: Farmer,
+    soil_test_id: str,
+    soil_data: Dict,
+    weather_data: Dict,
+    phone_number: str,
+    field_session: Optional[FieldSession] = None,
+    history: Optional[Dict] = None,
+) -> dict:
+    """Open the SMS session, send the initial SMS and precompute the menu answers; returns the SMS result"""
+    sms_session = SMSSession(
+        farmer_id=farmer.id,
+        soil_test_id=soil_test_id,
+        field_session_id=field_session.id if field_session is not None else None,
+        state="awaiting_choice"
+    )
+    db.add(sms_session)
+    if field_session is not None:
+        # Completed in the same commit as the advice it leads to
+        _mark_completed(field_session)
+
+    # Commit the sample and session before the farmer can receive the SMS and reply
+    db.commit()
+
+    sms_message = sms_service.generate_initial_sms(
+        farmer.name,
+        farmer.pin,
+        weather_data["location"]
+    )
+
+    # The menu answers and the initial SMS only depend on the weather, so run them together.
+    # Both write and commit, so the answers get their own session: a Session is not safe to share
+    # between concurrent coroutines.
+    _, sms_result = await asyncio.gather(
+        _precompute(soil_test_id, farmer.id, soil_data, weather_data, history),
+        sms_service.send_sms(phone_number, sms_message, farmer.id, db)
+    )
+    return sms_result
+
+
+async def _precompute(soil_test_id: str, farmer_id: str, soil_data: Dict, weather_data: Dict,
+                      history: Optional[Dict]) -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        return await recommendations.precompute(db, soil_test_id, farmer_id, soil_data, weather_data, history)
+    finally:
+        db.close()
+
+
+async def complete(db: Session, session_id: str, phone_number: Optional[str] = None) -> Optional[Dict]:
+    """Compute a session's composite and advise the farmer once; None if someone else completed it.
+
+    An exception leaves the session ADVISING, for the finalizer to retry.
+    """
+    if not _claim(db, session_id):
+        return None
+
+    session = db.get(FieldSession, session_id)
+    latest = _composite(db, session)
+    farmer = db.get(Farmer, session.farmer_id) if latest is not None else None
+    if farmer is None:
+        # Nothing accepted to advise on
+        _mark_completed(session)
+        db.commit()
+        return None
+
+    weather_data = await weather_service.get_weather_data(session.latitude, session.longitude)
+    session.location_name = weather_data["location"]
+    db.query(SoilTest)\
+        .filter(SoilTest.field_session_id == session.id, SoilTest.location_name.is_(None))\
+        .update({"location_name": weather_data["location"]}, synchronize_session=False)
+    bump_farmer_version(db, farmer.id)
+
+    soil_data = {name: getattr(session, name) for name in FIELDS}
+    history = soil_history.load_context(db, farmer.id, session.latitude, session.longitude)
+    sms_result = await advise_farmer(
+        db, farmer, latest.id, soil_data, weather_data,
+        phone_number or farmer.phone_number, field_session=session, history=history
+    )
+    logger.info("Field session completed", extra={
+        "field_session_id": session.id, "samples": session.sample_count, "farmer_id": farmer.id
+    })
+    return {
+        "field_session_id": session.id,
+        "samples": session.sample_count,
+        "location": weather_data["location"],
+        "weather_summary": weather_data["forecast"]["summary"],
+        "sms_result": sms_result,
+    }
+
+
+class FieldSessionFinalizer:
+    """Completes field sessions whose device has gone quiet, and retries abandoned completions"""
+
+    LEADER_KEY = "field_sessions:leader"
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        # With several workers only the lease holder scans; completing is claimed per session anyway
+        self._locks = get_cache("locks", settings.field_session_check_interval_seconds)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_run: Dict = {}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Field session finalizer failed")
+            await asyncio.sleep(settings.field_session_check_interval_seconds)
+
+    def _is_leader(self) -> bool:
+        """One atomic set-if-absent: the lease covers a single run and expires before the next tick"""
+        return self._locks.add(self.LEADER_KEY, self.worker_id, settings.field_session_check_interval_seconds * 0.9)
+
+    def _idle_sessions(self) -> List[str]:
+        get_engine()
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            cutoff = now - timedelta(seconds=settings.field_session_idle_seconds)
+            return [session_id for (session_id,) in db.query(FieldSession.id)
+                    .filter(or_(and_(FieldSession.status == OPEN, FieldSession.last_sample_at < cutoff),
+                                _abandoned(now)))
+                    .order_by(FieldSession.last_sample_at)]
+        finally:
+            db.close()
+
+    async def run_once(self) -> Dict:
+        if not await run_in_threadpool(self._is_leader):
+            self.last_run = {"at": datetime.utcnow().isoformat(), "skipped": "not_leader"}
+            return self.last_run
+
+        completed = failed = 0
+        for session_id in await run_in_threadpool(self._idle_sessions):
+            db = SessionLocal()
+            try:
+                if await complete(db, session_id):
+                    completed += 1
+            except Exception:
+                failed += 1
+                logger.exception("Could not complete field session", extra={"field_session_id": session_id})
+            finally:
+                db.close()
+
+        self.last_run = {
+            "at": datetime.utcnow().isoformat(),
+            "completed": completed,
+            "failed": failed,
+            "worker": self.worker_id,
+        }
+        if completed or failed:
+            logger.info("Idle field sessions completed", extra=self.last_run)
+        return self.last_run
+
+
+field_session_finalizer = FieldSessionFinalizer()
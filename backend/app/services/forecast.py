@@ -0,0 +1,279 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+# Growing degree days: daily mean temperature above the base, capped at the upper threshold
+GDD_BASE_C = 10.0
+GDD_UPPER_C = 30.0
+
+# A day with less rain than this counts as dry
+DRY_DAY_MM = 1.0
+
+
+class ForecastSeries:
+    """Columnar 5-day / 3-hour forecast.
+
+    Holds four small arrays instead of the 40 nested dicts OpenWeather returns,
+    so a cached grid cell's forecast is under a kilobyte of arrays, and every
+    aggregate is a vectorized pass over the columns.
+    """
+
+    __slots__ = ("timestamps", "temperature", "humidity", "rain_mm", "utc_offset")
+
+    def __init__(self, timestamps: np.ndarray, temperature: np.ndarray, humidity: np.ndarray,
+                 rain_mm: np.ndarray, utc_offset: int = 0):
+        self.timestamps = timestamps
+        self.temperature = temperature
+        self.humidity = humidity
+        self.rain_mm = rain_mm
+        self.utc_offset = utc_offset
+
+    @classmethod
+    def from_openweather(cls, forecast_data: Dict) -> "ForecastSeries":
+        items = forecast_data.get("list") or []
+        # Filled in place in their final dtypes: no per-item tuples, no float64 staging copy
+        count = len(items)
+        timestamps = np.empty(count, dtype=np.int64)
+        temperature = np.empty(count, dtype=np.float32)
+        humidity = np.empty(count, dtype=np.float32)
+        rain_mm = np.empty(count, dtype=np.float32)
+        for i, item in enumerate(items):
+            main = item["main"]
+            timestamps[i] = item["dt"]
+            temperature[i] = main["temp"]
+            humidity[i] = main.get("humidity", np.nan)
+            rain_mm[i] = (item.get("rain") or {}).get("3h", 0.0)
+        return cls(
+            timestamps=timestamps,
+            temperature=temperature,
+            humidity=humidity,
+            rain_mm=rain_mm,
+            # Seconds east of UTC for the location, so days split at local midnight
+            utc_offset=int((forecast_data.get("city") or {}).get("timezone", 0)),
+        )
+
+    def to_cache(self) -> Dict:
+        return {
+            "timestamps": self.timestamps.tolist(),
+            "temperature": self.temperature.tolist(),
+            "humidity": self.humidity.tolist(),
+            "rain_mm": self.rain_mm.tolist(),
+            "utc_offset": self.utc_offset,
+        }
+
+    @classmethod
+    def from_cache(cls, data: Dict) -> "ForecastSeries":
+        return cls(
+            timestamps=np.array(data["timestamps"], dtype=np.int64),
+            temperature=np.array(data["temperature"], dtype=np.float32),
+            humidity=np.array(data["humidity"], dtype=np.float32),
+            rain_mm=np.array(data["rain_mm"], dtype=np.float32),
+            utc_offset=data["utc_offset"],
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def daily(self) -> Dict[str, np.ndarray]:
+        """Per local calendar day: min/max/mean temperature, mean humidity and total rain"""
+        if not len(self):
+            empty = np.array([], dtype=np.float32)
+            return {"day": np.array([], dtype=np.int64), "temp_min": empty, "temp_max": empty,
+                    "temp_mean": empty, "humidity_mean": empty, "rain_mm": empty}
+
+        day_index = (self.timestamps + self.utc_offset) // SECONDS_PER_DAY
+        days, inverse, counts = np.unique(day_index, return_inverse=True, return_counts=True)
+        # Forecast entries are in time order, so each day is a contiguous run
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        return {
+            "day": days,
+            "temp_min": np.minimum.reduceat(self.temperature, starts),
+            "temp_max": np.maximum.reduceat(self.temperature, starts),
+            "temp_mean": np.bincount(inverse, weights=self.temperature) / counts,
+            "humidity_mean": np.bincount(inverse, weights=np.nan_to_num(self.humidity)) / counts,
+            "rain_mm": np.bincount(inverse, weights=self.rain_mm),
+        }
+
+    @staticmethod
+    def growing_degree_days(daily: Dict[str, np.ndarray], base: float = GDD_BASE_C, upper: float = GDD_UPPER_C) -> float:
+        tmax = np.minimum(daily["temp_max"], upper)
+        tmin = np.maximum(daily["temp_min"], base)
+        return float(np.clip((tmax + tmin) / 2 - base, 0, None).sum())
+
+    @staticmethod
+    def dry_spells(daily: Dict[str, np.ndarray], threshold_mm: float = DRY_DAY_MM) -> Dict:
+        """Longest run of dry days and days until the first wet day (None if none forecast)"""
+        dry = daily["rain_mm"] < threshold_mm
+        if not dry.size:
+            return {"longest_dry_spell_days": 0, "days_until_rain": None}
+        # Run lengths of consecutive dry days via the positions of wet days
+        wet_positions = np.flatnonzero(~dry)
+        bounds = np.concatenate(([-1], wet_positions, [dry.size]))
+        longest = int((np.diff(bounds) - 1).max())
+        return {
+            "longest_dry_spell_days": longest,
+            "days_until_rain": int(wet_positions[0]) if wet_positions.size else None,
+        }
+
+    def summary(self) -> Dict:
+        """Compact forecast summary used by the agronomist and API responses"""
+        return ForecastDays.from_series(self).summary()
+
+
+class ForecastDays:
+    """Per-day aggregates of a forecast, kept as columns like the series itself.
+
+    Computed once per fetch and cached with the snapshot; summary() builds a
+    fresh response dict from them on every read, so callers may change it.
+    """
+
+    __slots__ = ("day", "temp_min", "temp_max", "rain_mm", "avg_temperature", "total_rainfall_mm",
+                 "growing_degree_days", "longest_dry_spell_days", "days_until_rain")
+
+    def __init__(self, day: np.ndarray, temp_min: np.ndarray, temp_max: np.ndarray, rain_mm: np.ndarray,
+                 avg_temperature: float, total_rainfall_mm: float, growing_degree_days: float,
+                 longest_dry_spell_days: int, days_until_rain: Optional[int]):
+        self.day = day
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.rain_mm = rain_mm
+        self.avg_temperature = avg_temperature
+        self.total_rainfall_mm = total_rainfall_mm
+        self.growing_degree_days = growing_degree_days
+        self.longest_dry_spell_days = longest_dry_spell_days
+        self.days_until_rain = days_until_rain
+
+    @classmethod
+    def from_series(cls, series: ForecastSeries) -> "ForecastDays":
+        daily = series.daily()
+        return cls(
+            day=daily["day"],
+            temp_min=daily["temp_min"],
+            temp_max=daily["temp_max"],
+            rain_mm=daily["rain_mm"],
+            avg_temperature=float(series.temperature.mean()) if len(series) else 0.0,
+            total_rainfall_mm=float(series.rain_mm.sum()),
+            growing_degree_days=series.growing_degree_days(daily),
+            **series.dry_spells(daily),
+        )
+
+    def to_cache(self) -> Dict:
+        return {name: getattr(self, name).tolist() if isinstance(getattr(self, name), np.ndarray) else getattr(self, name)
+                for name in self.__slots__}
+
+    @classmethod
+    def from_cache(cls, data: Dict) -> "ForecastDays":
+        return cls(**{
+            **data,
+            "day": np.array(data["day"], dtype=np.int64),
+            **{name: np.array(data[name], dtype=np.float64) for name in ("temp_min", "temp_max", "rain_mm")},
+        })
+
+    def summary(self) -> Dict:
+        if not self.day.size:
+            return {
+                "avg_temperature": 0,
+                "total_rainfall_mm": 0,
+                "rainy_days": 0,
+                "summary": "No forecast available"
+            }
+
+        avg_temp = self.avg_temperature
+        total_rain = self.total_rainfall_mm
+        if total_rain > 100:
+            rain_summary = "Heavy rainfall expected"
+        elif total_rain > 50:
+            rain_summary = "Moderate rainfall expected"
+        elif total_rain > 10:
+            rain_summary = "Light rainfall expected"
+        else:
+            rain_summary = "Little to no rainfall expected"
+
+        return {
+            "avg_temperature": round(avg_temp, 1),
+            "total_rainfall_mm": round(total_rain, 1),
+            "rainy_days": int((self.rain_mm > 0).sum()),
+            "summary": f"{rain_summary} over next 5 days. Avg temp: {avg_temp:.1f}°C",
+            "growing_degree_days": round(self.growing_degree_days, 1),
+            "longest_dry_spell_days": self.longest_dry_spell_days,
+            "days_until_rain": self.days_until_rain,
+            "daily": [
+                {
+                    "date": np.datetime64(int(day), "D").item().isoformat(),
+                    "temp_min": round(float(tmin), 1),
+                    "temp_max": round(float(tmax), 1),
+                    "rain_mm": round(float(rain), 1),
+                }
+                for day, tmin, tmax, rain in zip(self.day, self.temp_min, self.temp_max, self.rain_mm)
+            ],
+        }
+
+
+class WeatherSnapshot:
+    """Current conditions plus forecast for one grid cell, as held in the weather caches.
+
+    The per-day aggregates are computed once, when the snapshot is built from a
+    fetch, and cached with it as columns: a cache hit only assembles the
+    response dict from them, a new one each time.
+    """
+
+    __slots__ = ("location", "temperature", "humidity", "pressure", "description", "rainfall_1h", "forecast",
+                 "forecast_days")
+
+    def __init__(self, location: str, temperature: float, humidity: float, pressure: Optional[float],
+                 description: str, rainfall_1h: float, forecast: ForecastSeries,
+                 forecast_days: Optional[ForecastDays] = None):
+        self.location = location
+        self.temperature = temperature
+        self.humidity = humidity
+        self.pressure = pressure
+        self.description = description
+        self.rainfall_1h = rainfall_1h
+        self.forecast = forecast
+        self.forecast_days = forecast_days if forecast_days is not None else ForecastDays.from_series(forecast)
+
+    @classmethod
+    def from_openweather(cls, current_data: Dict, forecast_data: Dict) -> "WeatherSnapshot":
+        return cls(
+            location=current_data.get("name", "Unknown"),
+            temperature=current_data["main"]["temp"],
+            humidity=current_data["main"]["humidity"],
+            pressure=current_data["main"].get("pressure"),
+            description=current_data["weather"][0]["description"],
+            rainfall_1h=(current_data.get("rain") or {}).get("1h", 0),
+            forecast=ForecastSeries.from_openweather(forecast_data),
+        )
+
+    def to_cache(self) -> Dict:
+        """Plain JSON form for the shared cache backends (see app.core.cache.SharedCache)"""
+        return {
+            **{name: getattr(self, name) for name in self.__slots__ if name not in ("forecast", "forecast_days")},
+            "forecast": self.forecast.to_cache(),
+            "forecast_days": self.forecast_days.to_cache(),
+        }
+
+    @classmethod
+    def from_cache(cls, data: Dict) -> "WeatherSnapshot":
+        # Entries cached before forecast_days existed are re-derived from the forecast columns
+        days = data.get("forecast_days")
+        return cls(**{
+            **{name: value for name, value in data.items() if name != "forecast_summary"},
+            "forecast": ForecastSeries.from_cache(data["forecast"]),
+            "forecast_days": ForecastDays.from_cache(days) if days is not None else None,
+        })
+
+    def to_dict(self) -> Dict:
+        return {
+            "location": self.location,
+            "current": {
+                "temperature": self.temperature,
+                "humidity": self.humidity,
+                "pressure": self.pressure,
+                "description": self.description,
+                "rainfall_1h": self.rainfall_1h
+            },
+            "forecast": self.forecast_days.summary()
+        }
+
@@ -0,0 +1,121 @@
+"""
+Answers to the SMS menu, computed when a soil test is enriched.
+
+Right after a test (or a field session's composite) gets its weather, every
+answer the farmer can ask for is generated at once and stored as
+Recommendation rows:
+
+    crop_suggestion     reply 1
+    fertilizer_advice   reply 3
+    crop_suitability    reply 2 + crop name, one row per COMMON_CROPS entry (crop column set)
+
+A reply is then one indexed lookup on (soil_test_id, recommendation_type,
+crop), with no weather or AI call. Crops outside COMMON_CROPS, tests stored
+before this existed, and answers the AI could not produce at enrichment fall
+back to a live call, whose result is stored for the next reply.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.http_cache import bump_farmer_version
+from app.models.database_models import Recommendation
+from app.services.ai_agronomist import ai_agronomist
+
+logger = logging.getLogger(__name__)
+
+CROP_SUGGESTION = "crop_suggestion"
+FERTILIZER_ADVICE = "fertilizer_advice"
+CROP_SUITABILITY = "crop_suitability"
+
+# Offered in the option-2 prompt, so precomputed for every test
+COMMON_CROPS = ("MAIZE", "BEANS", "COFFEE", "CASSAVA", "BANANAS", "TOMATOES")
+
+CROP_PROMPT = f"Which crop? Reply: {', '.join(COMMON_CROPS)}, etc."
+
+_SCORE = re.compile(r"([A-Z][A-Z ]*?)\s+(?:is\s+\w+\s+)?\((\d+)/100\)")
+
+
+def _scores(text: str) -> List[Dict]:
+    """Crops and scores mentioned in an answer, e.g. "1. MAIZE (90/100)" or "MAIZE is SUITABLE (82/100)" """
+    return [{"crop": crop.strip(), "score": int(score)} for crop, score in _SCORE.findall(text)]
+
+
+def _row(soil_test_id: str, kind: str, text: str, crop: Optional[str] = None) -> Recommendation:
+    structured: Dict = {"ai_response": text}
+    scores = _scores(text)
+    if kind == CROP_SUGGESTION:
+        structured["ranking"] = scores
+    elif kind == CROP_SUITABILITY:
+        structured["score"] = scores[0]["score"] if scores else None
+    return Recommendation(
+        soil_test_id=soil_test_id,
+        recommendation_type=kind,
+        crop=crop,
+        content=text,
+        crops_suggested=structured
+    )
+
+
+async def _answer(kind: str, coro) -> Optional[str]:
+    try:
+        text = await coro
+    except Exception:
+        logger.exception("AI answer failed", extra={"recommendation_type": kind})
+        return None
+    # None in degraded mode: nothing is stored and the reply path retries live
+    return text or None
+
+
+async def precompute(
+    db: Session,
+    soil_test_id: str,
+    farmer_id: str,
+    soil_data: Dict,
+    weather_data: Dict,
+    history: Optional[Dict] = None,
+) -> Dict[str, int]:
+    """Generate and store every menu answer for a test; returns rows stored per type"""
+    jobs = [(CROP_SUGGESTION, None, ai_agronomist.get_crop_recommendations(soil_data, weather_data, history)),
+            (FERTILIZER_ADVICE, None, ai_agronomist.get_fertilizer_advice(soil_data, history=history))]
+    jobs += [(CROP_SUITABILITY, crop, ai_agronomist.check_specific_crop(crop, soil_data, weather_data, history))
+             for crop in COMMON_CROPS]
+
+    answers = await asyncio.gather(*(_answer(kind, coro) for kind, _, coro in jobs))
+
+    stored: Dict[str, int] = {}
+    for (kind, crop, _), text in zip(jobs, answers):
+        if text is None:
+            continue
+        db.add(_row(soil_test_id, kind, text, crop))
+        stored[kind] = stored.get(kind, 0) + 1
+    if stored:
+        bump_farmer_version(db, farmer_id)
+        db.commit()
+    logger.debug("Menu answers precomputed", extra={"soil_test_id": soil_test_id, "stored": stored})
+    return stored
+
+
+def lookup(db: Session, soil_test_id: str, kind: str, crop: Optional[str] = None) -> Optional[str]:
+    """A stored answer (ix_recommendations_lookup)"""
+    row = db.query(Recommendation.content)\
+        .filter(
+            Recommendation.soil_test_id == soil_test_id,
+            Recommendation.recommendation_type == kind,
+            Recommendation.crop == crop if crop is not None else Recommendation.crop.is_(None)
+        )\
+        .order_by(Recommendation.created_at.desc())\
+        .first()
+    return row.content if row else None
+
+
+def store(db: Session, soil_test_id: str, farmer_id: str, kind: str, text: Optional[str],
+          crop: Optional[str] = None) -> None:
+    """Keep a live answer for the next reply (caller commits); None (AI unavailable) is not kept"""
+    if text:
+        db.add(_row(soil_test_id, kind, text, crop))
+        bump_farmer_version(db, farmer_id)
@@ -0,0 +1,279 @@
+"""
+Retention job: move old sms_logs and soil_tests rows into the compressed archive.
+
+    python -m app.services.retention                    # archive rows past their retention window
+    python -m app.services.retention --dry-run          # only count them
+    python -m app.services.retention --partition-sms-logs   # one-off, Postgres only
+
+Run it on a schedule (e.g. a daily cron job). When sms_logs is a native
+Postgres partitioned table (monthly RANGE partitions on created_at), whole
+months past the window are archived and their partition dropped, which
+costs no DELETE or vacuum. Otherwise rows are archived and deleted in
+batches; this is also the fallback on SQLite.
+
+soil_tests stays a regular table because recommendations and sms_sessions
+reference it by id, and a partitioned table's keys must include the
+partition column.
+"""
+
+import argparse
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.core.http_cache import bump_farmer_version
+from app.models.database_models import Recommendation, SMSLog, SMSSession, SoilTest
+from app.services.archive import archive
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "sms_logs"
+PARTITION_MONTHS_AHEAD = 3
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _columns(row) -> Dict:
+    return {column.name: getattr(row, column.key) for column in row.__table__.columns}
+
+
+# Postgres partitioning
+
+def is_partitioned(engine: Engine, table: str = PARTITIONED_TABLE) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+        ), {"table": table}).first() is not None
+
+
+def partitions(engine: Engine, table: str = PARTITIONED_TABLE) -> List[Tuple[str, datetime, datetime]]:
+    """(name, lower, upper) of each range partition, oldest first; the default partition is skipped"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = :table"
+        ), {"table": table}).all()
+    ranges = []
+    for name, bound in rows:
+        match = _BOUND.search(bound or "")
+        if match:
+            ranges.append((name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+    return sorted(ranges, key=lambda r: r[1])
+
+
+def ensure_partitions(engine: Engine, table: str = PARTITIONED_TABLE, months_ahead: int = PARTITION_MONTHS_AHEAD,
+                      since: Optional[datetime] = None) -> int:
+    """Create monthly partitions from `since` (default: this month) to `months_ahead` months out"""
+    existing = {name for name, _, _ in partitions(engine, table)}
+    with engine.begin() as conn:
+        created = _create_partitions(conn, table, months_ahead, since, existing)
+    if created:
+        logger.info("Partitions created", extra={"table": table, "created": created})
+    return created
+
+
+def _create_partitions(conn: Connection, table: str, months_ahead: int, since: Optional[datetime],
+                       existing: set) -> int:
+    month = _month_start(since or datetime.utcnow())
+    last = _month_start(datetime.utcnow())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    created = 0
+    while month <= last:
+        name = _partition_name(table, month)
+        if name not in existing:
+            conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            ))
+            created += 1
+        month = _next_month(month)
+    return created
+
+
+def partition_sms_logs(engine: Engine) -> None:
+    """Convert sms_logs to a table partitioned by month on created_at (copies every row once).
+
+    One transaction: a failure at any step leaves sms_logs as it was.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Native partitioning needs Postgres; SQLite uses batched retention only")
+    if is_partitioned(engine):
+        logger.info("sms_logs is already partitioned")
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE sms_logs IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text("UPDATE sms_logs SET created_at = now() WHERE created_at IS NULL"))
+        oldest = conn.execute(text("SELECT MIN(created_at) FROM sms_logs")).scalar()
+        conn.execute(text("ALTER TABLE sms_logs RENAME TO sms_logs_legacy"))
+        conn.execute(text("ALTER INDEX IF EXISTS ix_sms_logs_farmer_created RENAME TO ix_sms_logs_farmer_created_legacy"))
+        conn.execute(text(
+            "CREATE TABLE sms_logs (LIKE sms_logs_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        ))
+        # The partition column has to be part of the primary key
+        conn.execute(text("ALTER TABLE sms_logs ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text(
+            "ALTER TABLE sms_logs ADD FOREIGN KEY (farmer_id) REFERENCES farmers (id) ON DELETE CASCADE"
+        ))
+        conn.execute(text("CREATE INDEX ix_sms_logs_farmer_created ON sms_logs (farmer_id, created_at)"))
+        conn.execute(text("CREATE TABLE sms_logs_default PARTITION OF sms_logs DEFAULT"))
+        _create_partitions(conn, PARTITIONED_TABLE, PARTITION_MONTHS_AHEAD, oldest, set())
+        conn.execute(text("INSERT INTO sms_logs SELECT * FROM sms_logs_legacy"))
+        conn.execute(text("DROP TABLE sms_logs_legacy"))
+    logger.info("sms_logs converted to monthly partitions")
+
+
+# Archiving
+
+def _archive_partitions(engine: Engine, cutoff: datetime, run_id: str, dry_run: bool) -> int:
+    """Archive and drop whole monthly partitions that end before the cutoff"""
+    archived = 0
+    for name, lower, upper in partitions(engine):
+        if upper > cutoff:
+            break
+        if dry_run:
+            with engine.connect() as conn:
+                archived += conn.execute(text(f'SELECT COUNT(*) FROM "{name}"')).scalar()
+            continue
+
+        farmers = set()
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(f'SELECT * FROM "{name}"'))
+
+            def rows():
+                for row in result.mappings():
+                    farmers.add(row["farmer_id"])
+                    yield dict(row)
+
+            entry = archive.write_part(PARTITIONED_TABLE, lower.strftime("%Y-%m"), rows(), run_id)
+
+        db = SessionLocal()
+        try:
+            for farmer_id in farmers:
+                bump_farmer_version(db, farmer_id)
+            db.execute(text(f'DROP TABLE "{name}"'))
+            db.commit()
+        finally:
+            db.close()
+        archived += entry["rows"]
+    return archived
+
+
+def _soil_test_record(test: SoilTest) -> Dict:
+    record = _columns(test)
+    record["recommendations"] = [_columns(r) for r in test.recommendations]
+    return record
+
+
+def _delete_soil_test_children(db: Session, ids: List[str]) -> None:
+    db.query(Recommendation).filter(Recommendation.soil_test_id.in_(ids)).delete(synchronize_session=False)
+    db.query(SMSSession).filter(SMSSession.soil_test_id.in_(ids)).delete(synchronize_session=False)
+
+
+def _archive_rows(model, table: str, cutoff: datetime, run_id: str, dry_run: bool,
+                  serialize=_columns, delete_children=None, load=()) -> int:
+    """Archive and delete rows older than the cutoff, oldest first, one batch per transaction.
+
+    `load` is loader options for what `serialize` reads, so a batch is not one query per row.
+    """
+    db = SessionLocal()
+    archived = 0
+    batch = 0
+    try:
+        if dry_run:
+            return db.query(model).filter(model.created_at < cutoff).count()
+        while True:
+            rows = db.query(model)\
+                .options(*load)\
+                .filter(model.created_at < cutoff)\
+                .order_by(model.created_at)\
+                .limit(settings.retention_batch_size)\
+                .all()
+            if not rows:
+                break
+            batch += 1
+
+            by_month = defaultdict(list)
+            for row in rows:
+                by_month[row.created_at.strftime("%Y-%m")].append(serialize(row))
+            for month, records in by_month.items():
+                archive.write_part(table, month, records, f"{run_id}-{batch}")
+
+            ids = [row.id for row in rows]
+            if delete_children is not None:
+                delete_children(db, ids)
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            for farmer_id in {row.farmer_id for row in rows}:
+                bump_farmer_version(db, farmer_id)
+            db.commit()
+            db.expunge_all()
+            archived += len(rows)
+        return archived
+    finally:
+        db.close()
+
+
+def run_retention(dry_run: bool = False) -> Dict[str, int]:
+    """Archive sms_logs and soil_tests rows past their retention windows; returns rows per table"""
+    engine = get_engine()
+    now = datetime.utcnow()
+    run_id = now.strftime("%Y%m%dT%H%M%S")
+    results = {}
+
+    if settings.sms_log_retention_days > 0:
+        cutoff = now - timedelta(days=settings.sms_log_retention_days)
+        if is_partitioned(engine):
+            if not dry_run:
+                ensure_partitions(engine)
+            results["sms_logs"] = _archive_partitions(engine, cutoff, run_id, dry_run)
+        else:
+            results["sms_logs"] = _archive_rows(SMSLog, "sms_logs", cutoff, run_id, dry_run)
+
+    if settings.soil_test_retention_days > 0:
+        cutoff = now - timedelta(days=settings.soil_test_retention_days)
+        results["soil_tests"] = _archive_rows(
+            SoilTest, "soil_tests", cutoff, run_id, dry_run,
+            serialize=_soil_test_record, delete_children=_delete_soil_test_children,
+            load=(selectinload(SoilTest.recommendations),)
+        )
+
+    logger.info("Retention run complete", extra={"dry_run": dry_run, **results})
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Count rows past retention without archiving")
+    parser.add_argument("--partition-sms-logs", action="store_true",
+                        help="Convert sms_logs to monthly partitions (Postgres, run once)")
+    args = parser.parse_args()
+    if args.partition_sms_logs:
+        partition_sms_logs(get_engine())
+    else:
+        print(run_retention(dry_run=args.dry_run))
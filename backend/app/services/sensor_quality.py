@@ -0,0 +1,272 @@
+"""
+Ingestion-time checks for soil sensor readings.
+
+Each upload is checked before it can reach the agronomist or the farmer:
+
+- bounds: values no soil probe can legitimately report (pH 0, moisture 400%)
+- outlier: more than ANOMALY_Z_THRESHOLD standard deviations from the device's
+  running mean, once the device has ANOMALY_MIN_SAMPLES readings
+- stuck: the last ANOMALY_WINDOW_SIZE readings are identical in every field
+
+Flagged samples are stored with quality_status "quarantined" and get no
+recommendation or SMS. Per device and field the detector keeps Welford's
+running mean/variance and a fixed-size window of recent values, so a check
+costs O(1). The state is a JSON column on the device row (`quality_stats`),
+read and written under a row lock in the upload's own transaction, after the
+sample is inserted: a duplicate upload fails on the unique index first and
+never reaches the statistics, and a failed insert rolls the update back. Every
+worker checks against, and reports, the same statistics. A device without
+stored state is seeded from its other recent tests (one indexed query), using
+the same rule as a check: every in-bounds value counts, outliers included.
+
+Drift compares a field's recent window mean with its long-run mean: a probe
+that slowly loses calibration shows growing drift before it trips the
+outlier check.
+"""
+
+import logging
+import math
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.database_models import Device, SoilTest
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+QUARANTINED = "quarantined"
+
+# SoilTest column -> (lowest, highest) value a working probe can report
+PHYSICAL_BOUNDS = {
+    "ph": (2.0, 12.0),
+    "moisture": (0.0, 100.0),  # percent
+    "temperature": (-20.0, 70.0),  # deg C at sampling depth
+    "nitrogen": (0.0, 5000.0),  # mg/kg
+    "phosphorus": (0.0, 5000.0),
+    "potassium": (0.0, 10000.0),
+}
+
+# Smallest standard deviation used for z-scores, so a device with very steady
+# readings is not flagged for ordinary sensor noise
+MIN_STD = {
+    "ph": 0.1,
+    "moisture": 1.0,
+    "temperature": 0.5,
+    "nitrogen": 2.0,
+    "phosphorus": 2.0,
+    "potassium": 5.0,
+}
+
+FIELDS = tuple(PHYSICAL_BOUNDS)
+
+# Recent tests read to seed a device that has no stored statistics
+SEED_SAMPLES = 100
+
+
+def in_bounds(name: str, value: float) -> bool:
+    low, high = PHYSICAL_BOUNDS[name]
+    return math.isfinite(value) and low <= value <= high
+
+
+class FieldStats:
+    """Welford running mean/variance plus the last `window_size` values of one field"""
+    __slots__ = ("count", "mean", "m2", "window")
+
+    def __init__(self, window_size: int):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.window: Deque[float] = deque(maxlen=window_size)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.window.append(value)
+
+    def to_json(self) -> List:
+        return [self.count, self.mean, self.m2, list(self.window)]
+
+    @classmethod
+    def from_json(cls, data: List, window_size: int) -> "FieldStats":
+        stats = cls(window_size)
+        stats.count, stats.mean, stats.m2 = data[0], data[1], data[2]
+        stats.window.extend(data[3])
+        return stats
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def z_score(self, value: float, min_std: float) -> float:
+        return (value - self.mean) / max(self.std, min_std)
+
+    def is_stuck(self) -> bool:
+        return len(self.window) == self.window.maxlen and min(self.window) == max(self.window)
+
+    def drift(self, min_std: float) -> Optional[float]:
+        """Recent window mean vs long-run mean, in standard errors of the window mean"""
+        if self.count < settings.anomaly_min_samples or not self.window:
+            return None
+        window_mean = sum(self.window) / len(self.window)
+        return (window_mean - self.mean) / (max(self.std, min_std) / math.sqrt(len(self.window)))
+
+    def report(self, min_std: float) -> Dict:
+        drift = self.drift(min_std)
+        return {
+            "samples": self.count,
+            "mean": round(self.mean, 3),
+            "std": round(self.std, 3),
+            "window_mean": round(sum(self.window) / len(self.window), 3) if self.window else None,
+            "last": self.window[-1] if self.window else None,
+            "drift_z": round(drift, 2) if drift is not None else None,
+        }
+
+
+class DeviceStats:
+    __slots__ = ("fields", "checked", "quarantined", "last_flags", "last_seen", "last_quarantined_at")
+
+    def __init__(self, window_size: int):
+        self.fields = {name: FieldStats(window_size) for name in FIELDS}
+        self.checked = 0
+        self.quarantined = 0
+        self.last_flags: List[str] = []
+        self.last_seen: Optional[datetime] = None
+        self.last_quarantined_at: Optional[datetime] = None
+
+    def to_json(self) -> Dict:
+        return {
+            "fields": {name: fs.to_json() for name, fs in self.fields.items() if fs.count},
+            "checked": self.checked,
+            "quarantined": self.quarantined,
+            "last_flags": self.last_flags,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+            "last_quarantined_at": self.last_quarantined_at.isoformat() if self.last_quarantined_at else None,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict, window_size: int) -> "DeviceStats":
+        stats = cls(window_size)
+        for name, values in data.get("fields", {}).items():
+            if name in stats.fields:
+                stats.fields[name] = FieldStats.from_json(values, window_size)
+        stats.checked = data.get("checked", 0)
+        stats.quarantined = data.get("quarantined", 0)
+        stats.last_flags = data.get("last_flags") or []
+        for name in ("last_seen", "last_quarantined_at"):
+            if data.get(name):
+                setattr(stats, name, datetime.fromisoformat(data[name]))
+        return stats
+
+
+class SensorQualityMonitor:
+    def _seed(self, db: Session, device_id: str, exclude_id: Optional[str] = None) -> DeviceStats:
+        """Statistics rebuilt from the device's recent tests, by the same rule as check()"""
+        stats = DeviceStats(settings.anomaly_window_size)
+        # Quarantined tests count too: check() folds outliers in and leaves out only out-of-bounds values
+        recent = db.query(*(getattr(SoilTest, name) for name in FIELDS))\
+            .filter(SoilTest.device_id == device_id, SoilTest.id != exclude_id)\
+            .order_by(SoilTest.timestamp.desc())\
+            .limit(SEED_SAMPLES)\
+            .all()
+        for row in reversed(recent):
+            for name, value in zip(FIELDS, row):
+                if value is not None and in_bounds(name, value):
+                    stats.fields[name].add(value)
+        return stats
+
+    def _load(self, db: Session, device_id: str, stored: Optional[Dict], exclude_id: Optional[str] = None) -> DeviceStats:
+        if stored is None:
+            return self._seed(db, device_id, exclude_id)
+        return DeviceStats.from_json(stored, settings.anomaly_window_size)
+
+    def check(self, db: Session, soil_test: SoilTest) -> List[str]:
+        """Flags for a just-inserted test (empty if it is usable); updates the device's stored statistics.
+
+        Runs in the caller's transaction, after the insert has been flushed, and does not commit.
+        """
+        device_id = soil_test.device_id
+        # Row lock: concurrent uploads from one device, in any worker, update the statistics in turn
+        stored = db.query(Device.quality_stats).filter(Device.id == device_id).with_for_update().scalar()
+        stats = self._load(db, device_id, stored, exclude_id=soil_test.id)
+        flags = self._check(stats, {name: getattr(soil_test, name) for name in FIELDS})
+        db.query(Device).filter(Device.id == device_id)\
+            .update({Device.quality_stats: stats.to_json()}, synchronize_session=False)
+        if flags:
+            logger.warning("Soil reading quarantined", extra={"device_id": device_id, "flags": flags})
+        return flags
+
+    @staticmethod
+    def _check(stats: DeviceStats, reading: Dict[str, Optional[float]]) -> List[str]:
+        flags = []
+        accepted = {}
+        for name in FIELDS:
+            value = reading.get(name)
+            if value is None:
+                continue
+            if not in_bounds(name, value):
+                flags.append(f"bounds:{name}")
+                continue
+            fs = stats.fields[name]
+            if fs.count >= settings.anomaly_min_samples:
+                if abs(fs.z_score(value, MIN_STD[name])) > settings.anomaly_z_threshold:
+                    flags.append(f"outlier:{name}")
+            accepted[name] = value
+
+        # Impossible readings say nothing about the soil, so they stay out of the statistics.
+        # Outliers are kept: a real change of field or season is absorbed instead of flagged forever.
+        for name, value in accepted.items():
+            stats.fields[name].add(value)
+        # Single fields repeat on low-resolution probes; every field frozen means the probe is not sampling
+        if accepted and all(stats.fields[name].is_stuck() for name in accepted):
+            flags.append("stuck")
+
+        now = datetime.utcnow()
+        stats.checked += 1
+        stats.last_seen = now
+        stats.last_flags = flags
+        if flags:
+            stats.quarantined += 1
+            stats.last_quarantined_at = now
+        return flags
+
+    @staticmethod
+    def _report(device_id: str, stats: DeviceStats) -> Dict:
+        fields = {name: fs.report(MIN_STD[name]) for name, fs in stats.fields.items()}
+        return {
+            "device_id": device_id,
+            "checked": stats.checked,
+            "quarantined": stats.quarantined,
+            "last_flags": stats.last_flags,
+            "last_seen": stats.last_seen,
+            "last_quarantined_at": stats.last_quarantined_at,
+            "drifting": sorted(
+                name for name, report in fields.items()
+                if report["drift_z"] is not None and abs(report["drift_z"]) > settings.anomaly_drift_threshold
+            ),
+            "fields": fields,
+        }
+
+    def device_report(self, db: Session, device_id: str) -> Dict:
+        """Statistics and drift per field; a device without stored statistics is seeded from its history"""
+        stored = db.query(Device.quality_stats).filter(Device.id == device_id).scalar()
+        return self._report(device_id, self._load(db, device_id, stored))
+
+    def report(self, db: Session) -> Dict:
+        """Every device that has been checked, most suspicious first"""
+        devices = [
+            self._report(device_id, DeviceStats.from_json(stored, settings.anomaly_window_size))
+            for device_id, stored in db.query(Device.id, Device.quality_stats).filter(Device.quality_stats.isnot(None))
+        ]
+        devices.sort(key=lambda d: (len(d["drifting"]), d["quarantined"]), reverse=True)
+        return {
+            "devices": devices,
+            "bounds": {name: {"min": low, "max": high} for name, (low, high) in PHYSICAL_BOUNDS.items()},
+        }
+
+sensor_quality = SensorQualityMonitor()
@@ -1,19 +1,72 @@
+import asyncio
+import logging
 import httpx
-from app.core.config import settings
+from app.core.circuit_breaker import CircuitOpenError, get_breaker
+from app.core.config import on_reload, settings
+from app.core.http_cache import bump_farmer_version
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Optional, Set
 from app.models.database_models import SMSLog
+from app.services.dashboard import record_sms
+
+logger = logging.getLogger(__name__)
+
+# A replaced connection pool is closed once requests already on it are done
+CLIENT_DRAIN_SECONDS = 30
 
 class TelerivetSMSService:
+    SETTINGS = {"telerivet_api_key", "telerivet_project_id", "telerivet_base_url"}
+
     def __init__(self):
         self.api_key = settings.telerivet_api_key
         self.project_id = settings.telerivet_project_id
-        self.base_url = "https://api.telerivet.com/v1"
+        self.base_url = settings.telerivet_base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._closing: Set[asyncio.Task] = set()
+        self.breaker = get_breaker("sms")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    @property
+    def client_state(self) -> str:
+        if self._client is None:
+            return "not_started"
+        return "closed" if self._client.is_closed else "open"
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def reconfigure(self, changed: Set[str]) -> None:
+        """Settings reload hook: new credentials, and a new pool for requests made from now on"""
+        if not changed & self.SETTINGS:
+            return
+        self.api_key = settings.telerivet_api_key
+        self.project_id = settings.telerivet_project_id
+        self.base_url = settings.telerivet_base_url
+        old, self._client = self._client, None
+        if old is not None:
+            # Requests already on the old pool finish first
+            task = asyncio.create_task(self._close_later(old))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_later(client: httpx.AsyncClient) -> None:
+        await asyncio.sleep(CLIENT_DRAIN_SECONDS)
+        await client.aclose()
 
     async def send_sms(self, phone_number: str, message: str, farmer_id: Optional[str] = None, db: Optional[Session] = None) -> dict:
         """Send SMS via Telerivet"""
         if not self.api_key or not self.project_id:
             err = {"status": "error", "message": "TELERIVET_API_KEY or TELERIVET_PROJECT_ID not set"}
+            logger.warning("SMS not sent: Telerivet is not configured", extra={"farmer_id": farmer_id})
             if db and farmer_id:
                 sms_log = SMSLog(
                     farmer_id=farmer_id,
@@ -23,6 +76,8 @@ class TelerivetSMSService:
                     status="failed"
                 )
                 db.add(sms_log)
+                record_sms(db, sms_log.status)
+                bump_farmer_version(db, farmer_id)
                 db.commit()
             return err
 
@@ -49,24 +104,31 @@ class TelerivetSMSService:
                 "to_number": phone_number
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    auth=(self.api_key, "")
-                )
-
             try:
-                result = response.json()
-            except Exception:
-                result = {}
-
-            if response.status_code >= 400:
-                result = {
-                    "status": "failed",
-                    "http_status": response.status_code,
-                    "error": result or response.text
-                }
+                response = await self.breaker.call(self._post, url, payload)
+                try:
+                    result = response.json()
+                except Exception:
+                    result = {}
+                if response.status_code >= 400:
+                    result = {
+                        "status": "failed",
+                        "http_status": response.status_code,
+                        "error": result or response.text
+                    }
+            except CircuitOpenError:
+                # Degraded mode: fail fast instead of waiting on a provider that is down
+                result = {"status": "failed", "error": "Telerivet unavailable (circuit open)"}
+            except httpx.HTTPStatusError as e:
+                result = {"status": "failed", "http_status": e.response.status_code, "error": e.response.text}
+            except httpx.HTTPError as e:
+                result = {"status": "failed", "error": str(e) or type(e).__name__}
+
+            if result.get("status") == "failed":
+                logger.warning(
+                    "Telerivet send failed",
+                    extra={"farmer_id": farmer_id, "http_status": result.get("http_status"), "error": result.get("error")}
+                )
             results.append(result)
 
             # Log to database if db session provided
@@ -80,13 +142,35 @@ class TelerivetSMSService:
                     telerivet_id=result.get("id")
                 )
                 db.add(sms_log)
-        
+                record_sms(db, sms_log.status)
+
+        if db and farmer_id:
+            bump_farmer_version(db, farmer_id)
+
         # Commit logs if db session provided
         if db:
             db.commit()
 
+        failed = sum(1 for result in results if result.get("status") == "failed")
+        if failed:
+            # Each failed part was logged above with its error
+            logger.warning("SMS not fully sent", extra={"farmer_id": farmer_id, "parts": len(messages), "failed": failed})
+        else:
+            logger.info("SMS sent", extra={"farmer_id": farmer_id, "parts": len(messages)})
+
         return results[0] if results else {}
 
+    async def _post(self, url: str, payload: dict) -> httpx.Response:
+        response = await self.client.post(
+            url,
+            json=payload,
+            auth=(self.api_key, "")
+        )
+        # Provider-side errors count against the circuit; 4xx are our own mistakes
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        return response
+
     def _split_message(self, message: str, max_length: int = 160) -> list:
         """Split long messages into SMS-sized chunks"""
         if len(message) <= max_length:
@@ -122,4 +206,5 @@ Reply:
 PIN: {pin}"""
 
 sms_service = TelerivetSMSService()
+on_reload(sms_service.reconfigure)
 
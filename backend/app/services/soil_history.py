@@ -0,0 +1,263 @@
+"""
+Per-farmer and per-field soil history, maintained as samples arrive.
+
+The agronomist used to see only the sample being advised on. Each accepted
+sample now also updates two `soil_history` rows, inside its ingestion
+transaction. One row covers the farmer's whole farm and one the field the
+sample came from (a grid cell of SOIL_HISTORY_FIELD_GRID_DEGREES). Each row
+holds, per soil field:
+
+- a time-decayed weighted mean: a sample's weight halves every
+  SOIL_HISTORY_HALF_LIFE_DAYS, so the average follows the soil rather than
+  the number of probes taken on one afternoon
+- a trend slope from a weighted least-squares fit over the same decayed sums,
+  reported per 30 days once the samples span enough time
+- the mean over the previous season (half-years A = Jan-Jun, B = Jul-Dec,
+  matching Uganda's two rainy seasons)
+
+An update rescales a handful of running sums, so it costs the same however
+long the history is. The summary that goes to the agronomist comes from
+those rows, not from the farmer's soil tests, and it outlives retention.
+`rebuild()` recomputes everything from the tests still in the database.
+"""
+
+import logging
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.database_models import SoilHistory, SoilTest
+from app.models.schemas import naive_utc
+from app.services.sensor_quality import FIELDS, OK
+
+logger = logging.getLogger(__name__)
+
+FARM = ""  # field_key of the farm-wide row
+
+# Below this spread of sample times (weighted std, days) a slope is mostly noise
+MIN_TREND_SPREAD_DAYS = 7.0
+TREND_DAYS = 30
+
+DECIMALS = {"ph": 2}  # everything else to one decimal
+
+REBUILD_BATCH = 2000
+
+
+def field_key(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    cell = settings.soil_history_field_grid_degrees
+    return f"{math.floor(latitude / cell)}:{math.floor(longitude / cell)}"
+
+
+def season_of(at: datetime) -> str:
+    return f"{at.year}{'A' if at.month <= 6 else 'B'}"
+
+
+def _new(farmer_id: str, key: str) -> SoilHistory:
+    return SoilHistory(farmer_id=farmer_id, field_key=key, sample_count=0, stats={}, season_sums={})
+
+
+def _days(row: SoilHistory, at: datetime) -> float:
+    return (at - row.first_at).total_seconds() / 86400
+
+
+def _move_origin(row: SoilHistory, origin: datetime) -> None:
+    """Re-express the sums with t measured from an earlier `origin` (t' = t + shift)"""
+    shift = _days(row, row.first_at) - _days(row, origin)
+    row.stats = {
+        name: [w, st + shift * w, sy, stt + 2 * shift * st + shift * shift * w, sty + shift * sy]
+        for name, (w, st, sy, stt, sty) in (row.stats or {}).items()
+    }
+    row.first_at = origin
+
+
+def _apply(row: SoilHistory, at: datetime, values: Dict[str, Optional[float]]) -> None:
+    """Fold one sample into a row's running sums"""
+    if row.first_at is None:
+        row.first_at = row.last_at = at
+    elif at < row.first_at:
+        _move_origin(row, at)
+    half_life = settings.soil_history_half_life_days
+    t = _days(row, at)
+    elapsed = t - _days(row, row.last_at)
+    # Sums are kept as of last_at: age them to this sample, or, for a sample that arrives
+    # out of order, give it the weight it would have by now
+    decay = 0.5 ** (elapsed / half_life) if elapsed > 0 else 1.0
+    weight = 0.5 ** (-elapsed / half_life) if elapsed < 0 else 1.0
+
+    stats = {}
+    for name in FIELDS:
+        w, st, sy, stt, sty = [s * decay for s in (row.stats or {}).get(name, (0.0,) * 5)]
+        y = values.get(name)
+        if y is not None:
+            w, st, sy, stt, sty = w + weight, st + weight * t, sy + weight * y, stt + weight * t * t, sty + weight * t * y
+        if w:
+            stats[name] = [w, st, sy, stt, sty]
+    row.stats = stats  # reassigned, not mutated, so the JSON column is written
+
+    season = season_of(at)
+    if row.season is None or season > row.season:
+        if row.season is not None and row.season_sums:
+            sums = row.season_sums
+            row.last_season = row.season
+            row.last_season_values = {
+                "samples": sums.get("samples", 0),
+                **{name: sums[name][1] / sums[name][0] for name in FIELDS if name in sums},
+            }
+        row.season, row.season_sums = season, {}
+    if season == row.season:
+        # A late sample from an earlier season only counts towards the decayed sums
+        sums = dict(row.season_sums or {})
+        sums["samples"] = sums.get("samples", 0) + 1
+        for name in FIELDS:
+            if values.get(name) is not None:
+                count, total = sums.get(name, (0, 0.0))
+                sums[name] = [count + 1, total + values[name]]
+        row.season_sums = sums
+
+    row.sample_count = (row.sample_count or 0) + 1
+    row.last_at = max(row.last_at, at)
+
+
+def _round(name: str, value: float) -> float:
+    return round(value, DECIMALS.get(name, 1))
+
+
+def summarize(row: SoilHistory) -> Dict:
+    """Compact view of a row for the agronomist"""
+    averages, trends = {}, {}
+    for name, (w, st, sy, stt, sty) in (row.stats or {}).items():
+        averages[name] = _round(name, sy / w)
+        spread = stt / w - (st / w) ** 2
+        if spread >= MIN_TREND_SPREAD_DAYS ** 2:
+            trend = _round(name, (sty / w - st / w * sy / w) / spread * TREND_DAYS)
+            if trend:  # flat fields are left out to keep the context short
+                trends[name] = trend
+
+    summary = {
+        "samples": row.sample_count,
+        "since": row.first_at.date().isoformat() if row.first_at else None,
+        "avg": averages,
+    }
+    if trends:
+        summary["trend_per_month"] = trends
+    if row.last_season:
+        values = row.last_season_values or {}
+        summary["last_season"] = {
+            "season": row.last_season,
+            "samples": values.get("samples", 0),
+            **{name: _round(name, values[name]) for name in FIELDS if name in values},
+        }
+    return summary
+
+
+def _context(rows: Iterable[SoilHistory]) -> Optional[Dict]:
+    context = {"farm" if row.field_key == FARM else "field": summarize(row) for row in rows if row.sample_count}
+    return context or None
+
+
+def _locked_rows(db: Session, farmer_id: str, keys: List[str]) -> List[SoilHistory]:
+    """The farmer's rows for `keys`, created if missing and locked for update (Postgres)"""
+    def select():
+        # Fixed order, so two uploads for one farmer lock the rows in the same order
+        return db.query(SoilHistory)\
+            .filter(SoilHistory.farmer_id == farmer_id, SoilHistory.field_key.in_(keys))\
+            .order_by(SoilHistory.field_key)\
+            .with_for_update()\
+            .all()
+
+    rows = select()
+    if len(rows) == len(keys):
+        return rows
+
+    missing = set(keys) - {row.field_key for row in rows}
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        for key in sorted(missing):
+            db.add(_new(farmer_id, key))
+        db.flush()
+        return select()
+
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    # Another worker may create the same row concurrently; whoever is second just locks it
+    db.execute(insert(SoilHistory).values([
+        {"farmer_id": farmer_id, "field_key": key, "sample_count": 0, "stats": {}, "season_sums": {}}
+        for key in sorted(missing)
+    ]).on_conflict_do_nothing(index_elements=["farmer_id", "field_key"]))
+    return select()
+
+
+def record(db: Session, soil_test: SoilTest) -> Optional[Dict]:
+    """Add an accepted sample to its farmer's history (caller's transaction); returns the new context"""
+    keys = [FARM]
+    key = field_key(soil_test.latitude, soil_test.longitude)
+    if key is not None:
+        keys.append(key)
+    # Rows read back from the DB are naive UTC; comparing them with an aware timestamp would raise
+    at = naive_utc(soil_test.timestamp or datetime.utcnow())
+    values = {name: getattr(soil_test, name) for name in FIELDS}
+
+    rows = _locked_rows(db, soil_test.farmer_id, keys)
+    for row in rows:
+        _apply(row, at, values)
+    return _context(rows)
+
+
+def load_context(db: Session, farmer_id: str, latitude: Optional[float] = None,
+                 longitude: Optional[float] = None) -> Optional[Dict]:
+    """History for advice on a farmer's field: one primary-key read of at most two rows"""
+    keys = [FARM]
+    key = field_key(latitude, longitude)
+    if key is not None:
+        keys.append(key)
+    rows = db.query(SoilHistory)\
+        .filter(SoilHistory.farmer_id == farmer_id, SoilHistory.field_key.in_(keys))\
+        .all()
+    return _context(rows)
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Recompute every row from the accepted tests still in the database (backfill or repair); commits"""
+    db.query(SoilHistory).delete(synchronize_session=False)
+    tests = db.query(SoilTest.farmer_id, SoilTest.timestamp, SoilTest.created_at,
+                     SoilTest.latitude, SoilTest.longitude, *(getattr(SoilTest, name) for name in FIELDS))\
+        .filter(SoilTest.quality_status == OK, SoilTest.farmer_id.isnot(None))\
+        .order_by(SoilTest.farmer_id, SoilTest.timestamp)\
+        .yield_per(REBUILD_BATCH)
+
+    rows: Dict[str, SoilHistory] = {}
+    farmer_id = None
+    farmers = samples = written = 0
+
+    def flush() -> int:
+        db.add_all(rows.values())
+        db.flush()
+        db.expunge_all()
+        count = len(rows)
+        rows.clear()
+        return count
+
+    for test in tests:
+        if test.farmer_id != farmer_id:
+            written += flush()
+            farmer_id = test.farmer_id
+            farmers += 1
+        at = naive_utc(test.timestamp or test.created_at or datetime.utcnow())
+        values = {name: getattr(test, name) for name in FIELDS}
+        for key in (FARM, field_key(test.latitude, test.longitude)):
+            if key is not None:
+                if key not in rows:
+                    rows[key] = _new(farmer_id, key)
+                _apply(rows[key], at, values)
+        samples += 1
+    written += flush()
+    db.commit()
+
+    result = {"farmers": farmers, "samples": samples, "rows": written}
+    logger.info("Soil history rebuilt", extra=result)
+    return result
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import socket
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import get_cache
+from app.core.circuit_breaker import CLOSED
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.core.rate_limit import RateLimitExceeded
+from app.models.database_models import SoilTest
+from app.services.weather_service import weather_service
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[float, float]
+
+
+class WeatherPrefetcher:
+    """Keeps the weather cache warm for the grid cells where farmers are active.
+
+    Every interval it derives the active cells from recent soil tests and each
+    farmer's last known location, then refreshes the cells whose cache entry
+    would expire before the next run, busiest first, paced to stay inside the
+    configured share of the OpenWeather quota.
+    """
+
+    LEADER_KEY = "weather_prefetch:leader"
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        # With several workers only the lease holder prefetches
+        self._locks = get_cache("locks", settings.weather_prefetch_interval_seconds)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.pending = 0
+        self.last_run: Dict = {}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def cells_per_minute(self) -> float:
+        return settings.openweather_calls_per_minute * settings.weather_prefetch_quota_share / weather_service.CALLS_PER_FETCH
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Weather prefetch failed")
+            await asyncio.sleep(settings.weather_prefetch_interval_seconds)
+
+    def _is_leader(self) -> bool:
+        """One atomic set-if-absent: the lease covers a single run and expires before the next tick"""
+        return self._locks.add(self.LEADER_KEY, self.worker_id, settings.weather_prefetch_interval_seconds * 0.9)
+
+    async def run_once(self) -> Dict:
+        interval = settings.weather_prefetch_interval_seconds
+        if not await run_in_threadpool(self._is_leader):
+            self.last_run = {"at": datetime.utcnow().isoformat(), "skipped": "not_leader"}
+            return self.last_run
+        if weather_service.breaker.state != CLOSED:
+            # Leave the half-open probes to user traffic
+            self.last_run = {"at": datetime.utcnow().isoformat(), "skipped": "circuit_open"}
+            return self.last_run
+
+        demand = await run_in_threadpool(self._active_cells)
+
+        # Refresh anything that would go stale before the next run
+        refresh_before = interval * 1.5
+        due = await run_in_threadpool(
+            lambda: [cell for cell in demand if (weather_service.cache_ttl_remaining(cell) or 0) < refresh_before]
+        )
+
+        budget = max(1, int(self.cells_per_minute * interval / 60))
+        skipped = max(0, len(due) - budget)
+        due = due[:budget]
+        spacing = 60 / self.cells_per_minute if self.cells_per_minute > 0 else interval
+
+        refreshed = failed = 0
+        self.pending = len(due)
+        for cell in due:
+            try:
+                await weather_service.refresh_cell(cell)
+                refreshed += 1
+            except RateLimitExceeded:
+                # Quota used up by cache misses; leave the rest for the next run
+                skipped += self.pending
+                self.pending = 0
+                break
+            except Exception as e:
+                failed += 1
+                logger.warning("Weather prefetch failed for cell", extra={"cell": cell, "error": str(e)})
+            self.pending -= 1
+            await asyncio.sleep(spacing)
+
+        self.last_run = {
+            "at": datetime.utcnow().isoformat(),
+            "active_cells": len(demand),
+            "refreshed": refreshed,
+            "failed": failed,
+            "over_budget": skipped,
+            "worker": self.worker_id,
+        }
+        logger.info("Weather prefetch complete", extra=self.last_run)
+        return self.last_run
+
+    def _active_cells(self) -> List[Cell]:
+        """Grid cells with recent activity or a farmer's last test, busiest first"""
+        get_engine()
+        db = SessionLocal()
+        try:
+            demand: Counter = Counter()
+            since = datetime.utcnow() - timedelta(days=settings.weather_prefetch_lookback_days)
+
+            recent = db.query(SoilTest.latitude, SoilTest.longitude, func.count(SoilTest.id))\
+                .filter(SoilTest.created_at >= since)\
+                .group_by(SoilTest.latitude, SoilTest.longitude)
+            for latitude, longitude, count in recent:
+                demand[weather_service.grid_cell(latitude, longitude)] += count
+
+            # Every farmer's last known location, so quiet farmers still get fresh weather
+            latest = db.query(SoilTest.farmer_id, func.max(SoilTest.created_at).label("created_at"))\
+                .group_by(SoilTest.farmer_id)\
+                .subquery()
+            last_known = db.query(SoilTest.latitude, SoilTest.longitude).join(latest, and_(
+                SoilTest.farmer_id == latest.c.farmer_id,
+                SoilTest.created_at == latest.c.created_at
+            ))
+            for latitude, longitude in last_known:
+                demand[weather_service.grid_cell(latitude, longitude)] += 1
+
+            return [cell for cell, _ in demand.most_common()]
+        finally:
+            db.close()
+
+
+weather_prefetcher = WeatherPrefetcher()
@@ -1,118 +1,186 @@
+import asyncio
+import logging
 import httpx
-from app.core.config import settings
-from typing import Dict, Optional
-from datetime import datetime, timedelta
+from app.core.cache import HitCounter, get_cache
+from app.core.circuit_breaker import CircuitOpenError, get_breaker
+from app.core.config import on_reload, settings
+from app.core.rate_limit import RateLimitExceeded, get_rate_limiter
+from app.services.forecast import WeatherSnapshot
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A replaced connection pool is closed once requests already on it are done
+CLIENT_DRAIN_SECONDS = 30
 
 class WeatherService:
     """OpenWeather API integration"""
 
+    CALLS_PER_FETCH = 2  # /weather + /forecast
+    SETTINGS = {"openweather_api_key", "openweather_base_url"}
+
     def __init__(self):
         self.api_key = settings.openweather_api_key
-        self.base_url = "https://api.openweathermap.org/data/2.5"
+        self.base_url = settings.openweather_base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._closing: Set[asyncio.Task] = set()
+        codec = (WeatherSnapshot.to_cache, WeatherSnapshot.from_cache)
+        self._cache = get_cache("weather", settings.weather_cache_ttl_seconds, codec=codec)
+        # Outlives the fresh cache; served while OpenWeather is failing
+        self._last_known = get_cache("weather_last_known", settings.weather_last_known_ttl_seconds, codec=codec)
+        self.stats = HitCounter("weather")
+        self.breaker = get_breaker("weather")
+        # OpenWeather quota, shared by all workers when the cache backend is
+        self.rate_limiter = get_rate_limiter("openweather", settings.openweather_calls_per_minute)
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool, created on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    @property
+    def client_state(self) -> str:
+        if self._client is None:
+            return "not_started"
+        return "closed" if self._client.is_closed else "open"
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def reconfigure(self, changed: Set[str]) -> None:
+        """Settings reload hook: new credentials, and a new pool for requests made from now on"""
+        if "openweather_calls_per_minute" in changed:
+            self.rate_limiter.limit = settings.openweather_calls_per_minute
+        if not changed & self.SETTINGS:
+            return
+        self.api_key = settings.openweather_api_key
+        self.base_url = settings.openweather_base_url
+        old, self._client = self._client, None
+        if old is not None:
+            # Requests already on the old pool finish first
+            task = asyncio.create_task(self._close_later(old))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_later(client: httpx.AsyncClient) -> None:
+        await asyncio.sleep(CLIENT_DRAIN_SECONDS)
+        await client.aclose()
+
+    @staticmethod
+    def grid_cell(latitude: float, longitude: float) -> Tuple[float, float]:
+        """Snap a location to the centre of its weather grid cell"""
+        step = settings.weather_grid_degrees
+        return (round(round(latitude / step) * step, 4), round(round(longitude / step) * step, 4))
+
+    @staticmethod
+    def _cache_key(cell: Tuple[float, float]) -> str:
+        return f"weather:{cell[0]:.4f}:{cell[1]:.4f}"
+
+    def clear_cache(self) -> None:
+        """Drop fresh entries (last-known data is kept for degraded mode)"""
+        self._cache.clear()
+
+    def cache_ttl_remaining(self, cell: Tuple[float, float]) -> Optional[float]:
+        return self._cache.ttl_remaining(self._cache_key(cell))
 
     async def get_weather_data(self, latitude: float, longitude: float) -> Dict:
-        """Get current weather and forecast for location"""
-
+        """Get current weather and forecast for location (cached per grid cell)"""
+        cell = self.grid_cell(latitude, longitude)
+        cached = await self._cache.aget(self._cache_key(cell))
+        if cached is not None:
+            self.stats.hit()
+            return cached.to_dict()
+
+        self.stats.miss()
         try:
-            async with httpx.AsyncClient() as client:
-                # Current weather
-                current_url = f"{self.base_url}/weather"
-                current_params = {
-                    "lat": latitude,
-                    "lon": longitude,
-                    "appid": self.api_key,
-                    "units": "metric"
-                }
-                current_response = await client.get(current_url, params=current_params)
-                current_data = current_response.json()
-
-                # 5-day forecast (free tier)
-                forecast_url = f"{self.base_url}/forecast"
-                forecast_params = {
-                    "lat": latitude,
-                    "lon": longitude,
-                    "appid": self.api_key,
-                    "units": "metric"
-                }
-                forecast_response = await client.get(forecast_url, params=forecast_params)
-                forecast_data = forecast_response.json()
-
-                # Process forecast data
-                forecast_summary = self._process_forecast(forecast_data)
-
-                return {
-                    "location": current_data.get("name", "Unknown"),
-                    "current": {
-                        "temperature": current_data["main"]["temp"],
-                        "humidity": current_data["main"]["humidity"],
-                        "pressure": current_data["main"]["pressure"],
-                        "description": current_data["weather"][0]["description"],
-                        "rainfall_1h": current_data.get("rain", {}).get("1h", 0)
-                    },
-                    "forecast": forecast_summary
-                }
+            return (await self.refresh_cell(cell)).to_dict()
+        except CircuitOpenError:
+            # Degraded mode: answer instantly instead of waiting for a timeout
+            pass
+        except RateLimitExceeded as e:
+            logger.warning("OpenWeather quota exhausted", extra={"retry_after": round(e.retry_after, 1)})
         except Exception as e:
-            print(f"Weather API error: {e}")
-            # Return default/fallback data
-            return {
-                "location": "Unknown",
-                "current": {
-                    "temperature": 25,
-                    "humidity": 60,
-                    "description": "Data unavailable",
-                    "rainfall_1h": 0
-                },
-                "forecast": {
-                    "avg_temperature": 25,
-                    "total_rainfall_mm": 0,
-                    "rainy_days": 0,
-                    "summary": "Weather data unavailable"
-                }
-            }
-
-    def _process_forecast(self, forecast_data: Dict) -> Dict:
-        """Process 5-day forecast into useful summary"""
+            logger.warning(
+                "Weather API error",
+                extra={"error": str(e), "latitude": latitude, "longitude": longitude}
+            )
+        last_known = await self._last_known.aget(self._cache_key(cell))
+        return last_known.to_dict() if last_known is not None else self._fallback_weather()
+
+    async def refresh_cell(self, cell: Tuple[float, float]) -> WeatherSnapshot:
+        """Fetch a grid cell from OpenWeather and store it in the cache.
+
+        Concurrent refreshes of the same cell share one pair of API calls.
+        """
+        key = self._cache_key(cell)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, cell))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: str, cell: Tuple[float, float]) -> WeatherSnapshot:
+        # Quota is only taken for calls that will go out: an open circuit fails first, with no I/O
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name)
+        try:
+            await self.rate_limiter.aacquire(self.CALLS_PER_FETCH)
+        except BaseException:
+            self.breaker.release()
+            raise
+        weather = await self.breaker.call_admitted(self._fetch, *cell)
+        await self._cache.aset(key, weather)
+        await self._last_known.aset(key, weather)
+        return weather
+
+    async def _fetch(self, latitude: float, longitude: float) -> WeatherSnapshot:
+        """Call the current-weather and forecast endpoints for one location"""
+        params = {
+            "lat": latitude,
+            "lon": longitude,
+            "appid": self.api_key,
+            "units": "metric"
+        }
 
-        if "list" not in forecast_data:
-            return {
-                "avg_temperature": 0,
+        # Current weather and 5-day forecast (free tier) are independent
+        responses = await asyncio.gather(
+            self.client.get(f"{self.base_url}/weather", params=params),
+            self.client.get(f"{self.base_url}/forecast", params=params),
+            return_exceptions=True
+        )
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+        current_response, forecast_response = responses
+        current_response.raise_for_status()
+        forecast_response.raise_for_status()
+        return WeatherSnapshot.from_openweather(current_response.json(), forecast_response.json())
+
+    @staticmethod
+    def _fallback_weather() -> Dict:
+        """Default data used when OpenWeather cannot be reached"""
+        return {
+            "location": "Unknown",
+            "current": {
+                "temperature": 25,
+                "humidity": 60,
+                "description": "Data unavailable",
+                "rainfall_1h": 0
+            },
+            "forecast": {
+                "avg_temperature": 25,
                 "total_rainfall_mm": 0,
                 "rainy_days": 0,
-                "summary": "No forecast available"
+                "summary": "Weather data unavailable"
             }
-
-        temps = []
-        total_rain = 0
-        rainy_days = set()
-
-        for item in forecast_data["list"]:
-            temps.append(item["main"]["temp"])
-
-            # Check for rainfall
-            rain = item.get("rain", {}).get("3h", 0)
-            if rain > 0:
-                total_rain += rain
-                # Get date for this forecast
-                date = datetime.fromtimestamp(item["dt"]).date()
-                rainy_days.add(date)
-
-        avg_temp = sum(temps) / len(temps) if temps else 0
-
-        # Generate summary
-        if total_rain > 100:
-            rain_summary = "Heavy rainfall expected"
-        elif total_rain > 50:
-            rain_summary = "Moderate rainfall expected"
-        elif total_rain > 10:
-            rain_summary = "Light rainfall expected"
-        else:
-            rain_summary = "Little to no rainfall expected"
-
-        return {
-            "avg_temperature": round(avg_temp, 1),
-            "total_rainfall_mm": round(total_rain, 1),
-            "rainy_days": len(rainy_days),
-            "summary": f"{rain_summary} over next 5 days. Avg temp: {avg_temp:.1f}°C"
         }
 
 weather_service = WeatherService()
+on_reload(weather_service.reconfigure)
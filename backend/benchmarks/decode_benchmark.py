@@ -0,0 +1,75 @@
+"""
+Compare payload size and decode time of JSON and compact binary soil uploads.
+
+    python -m benchmarks.decode_benchmark --iterations 20000
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from app.models.compact_upload import decode_soil_upload, encode_soil_upload
+from app.models.schemas import SoilDataUpload
+
+SAMPLE = SoilDataUpload(
+    device_id="SOIL-SENSOR-001",
+    farmer_id=str(uuid.uuid4()),
+    phone_number="256701234567",
+    timestamp=datetime(2026, 3, 1, 10, 50),
+    gps_latitude=1.352101,
+    gps_longitude=34.275512,
+    sample_number=3,
+    sample_depth_cm=20,
+    soil_temperature_c=24.5,
+    soil_moisture_percent=45.2,
+    soil_nitrogen_mgkg=12.3,
+    soil_phosphorus_mgkg=8.5,
+    soil_potassium_mgkg=150.0,
+    soil_ph=7.2,
+)
+
+
+def time_per_call_us(fn, payload, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--min-ratio", type=float, default=5.0, help="Fail if JSON/compact size ratio is lower")
+    args = parser.parse_args()
+
+    json_body = json.dumps(SAMPLE.model_dump(mode="json")).encode()
+    compact_body = encode_soil_upload(SAMPLE)
+    assert decode_soil_upload(compact_body) == SAMPLE
+
+    results = {
+        "bytes": {
+            "json": len(json_body),
+            "json_gzip": len(gzip.compress(json_body)),
+            "compact": len(compact_body),
+            "compact_gzip": len(gzip.compress(compact_body)),
+        },
+        "decode_us": {
+            "json": round(time_per_call_us(SoilDataUpload.model_validate_json, json_body, args.iterations), 2),
+            "compact": round(time_per_call_us(decode_soil_upload, compact_body, args.iterations), 2),
+        },
+    }
+    results["size_ratio"] = round(len(json_body) / len(compact_body), 2)
+    print(json.dumps(results, indent=2))
+
+    if results["size_ratio"] < args.min_ratio:
+        print(f"Compact payload only {results['size_ratio']}x smaller than JSON", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Compare encode time of a large soil-test response on the old and new paths.
+
+Builds a `GET /api/admin/soil-tests/{farmer_id}` payload with `--rows` tests
+(two recommendations each) from ORM objects and times:
+
+- jsonable_encoder_json: dicts + jsonable_encoder + json.dumps (old default JSONResponse)
+- jsonable_encoder_orjson: dicts + jsonable_encoder + orjson (ORJSONResponse, no response_model)
+- response_model_orjson: ORM rows validated by the response model, serialized by
+  pydantic-core, written by orjson (route with response_model)
+- model_dump_json: ORM rows validated and written by pydantic-core (cached admin reads)
+
+    python -m benchmarks.encode_benchmark --rows 10000
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.database_models import Recommendation, SoilTest
+from app.models.schemas import SoilTestListResponse
+
+
+def build_rows(count: int):
+    started = datetime(2026, 1, 1)
+    rows = []
+    for i in range(count):
+        test = SoilTest(
+            id=str(uuid.uuid4()), timestamp=started + timedelta(minutes=i), location_name="Mbale",
+            ph=6.5, moisture=35.2, temperature=24.1, nitrogen=12.3, phosphorus=8.5, potassium=150.0,
+            latitude=1.0821, longitude=34.1753, created_at=started + timedelta(minutes=i, seconds=3),
+            quality_status="ok", quality_flags=None,
+        )
+        test.recommendations = [
+            Recommendation(id=str(uuid.uuid4()), recommendation_type="crop_suggestion",
+                           content="1. MAIZE (90/100)\n2. BEANS (86/100)", crops_suggested={"ai_response": "MAIZE"}),
+            Recommendation(id=str(uuid.uuid4()), recommendation_type="fertilizer_advice",
+                           content="NPK 17:17:17, 50 kg per acre", crops_suggested=None),
+        ]
+        rows.append(test)
+    return rows
+
+
+def as_dicts(tests):
+    """The hand-built dicts the endpoint used to return"""
+    return {"tests": [{
+        "id": t.id,
+        "timestamp": t.timestamp,
+        "location": t.location_name,
+        "ph": t.ph,
+        "moisture": t.moisture,
+        "temperature": t.temperature,
+        "nitrogen": t.nitrogen,
+        "phosphorus": t.phosphorus,
+        "potassium": t.potassium,
+        "latitude": t.latitude,
+        "longitude": t.longitude,
+        "quality_status": t.quality_status,
+        "quality_flags": t.quality_flags,
+        "field_session_id": t.field_session_id,
+        "created_at": t.created_at,
+        "recommendations": [{
+            "id": r.id,
+            "recommendation_type": r.recommendation_type,
+            "crop": r.crop,
+            "content": r.content,
+            "crops_suggested": r.crops_suggested
+        } for r in t.recommendations]
+    } for t in tests]}
+
+
+def median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-speedup", type=float, default=0.0,
+                        help="Fail if response_model_orjson is not this many times faster than the old path")
+    args = parser.parse_args()
+
+    tests = build_rows(args.rows)
+    adapter = TypeAdapter(SoilTestListResponse)
+
+    def old_path():
+        return json.dumps(jsonable_encoder(as_dicts(tests)), ensure_ascii=False, separators=(",", ":")).encode()
+
+    def orjson_only():
+        return orjson.dumps(jsonable_encoder(as_dicts(tests)))
+
+    def response_model_orjson():
+        # What FastAPI does for a route with response_model and ORJSONResponse
+        validated = adapter.validate_python({"tests": tests}, from_attributes=True)
+        return orjson.dumps(adapter.dump_python(validated, mode="json"))
+
+    def model_dump_json():
+        return SoilTestListResponse.model_validate({"tests": tests}, from_attributes=True).model_dump_json().encode()
+
+    assert json.loads(old_path()) == json.loads(response_model_orjson()) == json.loads(model_dump_json())
+
+    results = {
+        "jsonable_encoder_json": median_ms(old_path, args.repeats),
+        "jsonable_encoder_orjson": median_ms(orjson_only, args.repeats),
+        "response_model_orjson": median_ms(response_model_orjson, args.repeats),
+        "model_dump_json": median_ms(model_dump_json, args.repeats),
+    }
+    speedup = round(results["jsonable_encoder_json"] / results["response_model_orjson"], 2)
+    print(json.dumps({
+        "rows": args.rows,
+        "bytes": len(old_path()),
+        "encode_ms": results,
+        "speedup": speedup,
+    }, indent=2))
+
+    if speedup < args.min_speedup:
+        print(f"response_model path only {speedup}x faster than jsonable_encoder", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
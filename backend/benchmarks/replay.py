@@ -0,0 +1,369 @@
+"""
+Replay captured device uploads and Telerivet webhooks against a local build.
+
+Reads the gzip NDJSON files written with CAPTURE_ENABLED=true (see
+app/core/traffic_capture.py), seeds a fresh database with one farmer per
+pseudonymous phone and one device per pseudonymous device ID, starts the
+provider stubs and the API, and re-sends every request at its original pace
+(or `--speed` times faster; 0 sends as fast as `--max-in-flight` allows).
+
+The report has the latency distribution per request kind, plus the behaviour
+of the run:
+- each response's status and outcome
+- the SMS texts each phone received
+- SMS session states
+- soil test quality and field session counts
+
+With `--compare`, it is diffed against a report from another build.
+
+Examples:
+    python -m benchmarks.replay captures/ --output before.json
+    python -m benchmarks.replay captures/ --speed 10 --compare before.json --fail-on-diff
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+from benchmarks.load_test import BACKEND_DIR, app_env, free_port, percentile, running, summarize
+
+WEBHOOK_SECRET = "replay-secret"
+# Differences listed per section; the counts cover all of them
+MAX_EXAMPLES = 10
+
+
+def load_records(paths: List[str], limit: Optional[int] = None) -> List[Dict]:
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "*.ndjson.gz"))) if os.path.isdir(path) else [path]
+    records = []
+    for name in files:
+        with gzip.open(name, "rb") as fh:
+            records += [orjson.loads(line) for line in fh if line.strip()]
+    # Several workers write their own files; merge them back into arrival order
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+
+def seed(database_url: str, records: List[Dict]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """Fresh schema with the farmers (by phone) and devices the capture refers to"""
+    os.environ["SUPABASE_DB_URL"] = database_url
+    sys.path.insert(0, BACKEND_DIR)
+    from app.core.database import Base, SessionLocal, dispose_engine, get_engine
+    from app.models.database_models import Device, Farmer
+
+    device_phones: Dict[str, str] = {}
+    phones: List[str] = []
+    for record in records:
+        body = record["b"]
+        phone = body.get("phone_number") if record["k"] == "soil" else body.get("from_number")
+        if phone and phone not in phones:
+            phones.append(phone)
+        if record["k"] == "soil" and body.get("device_id"):
+            device_phones.setdefault(body["device_id"], phone)
+
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    farmers: Dict[str, Dict] = {}
+    devices: Dict[str, Dict] = {}
+    try:
+        for i, phone in enumerate(phones):
+            farmer = Farmer(name=f"Replay Farmer {i}", phone_number=phone, region="Eastern",
+                            district="Mbale", pin="123456")
+            db.add(farmer)
+            db.flush()
+            farmers[phone] = {"farmer_id": farmer.id}
+        for i, (device_id, phone) in enumerate(device_phones.items()):
+            if phone not in farmers:
+                farmer = Farmer(name=f"Replay Device Owner {i}", phone_number=f"2569{i:08d}",
+                                region="Eastern", district="Mbale", pin="123456")
+                db.add(farmer)
+                db.flush()
+                farmers[phone] = {"farmer_id": farmer.id}
+            device = Device(device_id=device_id, sim_number=phone, farmer_id=farmers[phone]["farmer_id"],
+                            api_token=f"replay-{device_id}")
+            db.add(device)
+            devices[device_id] = {"farmer_id": farmers[phone]["farmer_id"], "api_token": device.api_token}
+        db.commit()
+    finally:
+        db.close()
+    dispose_engine()
+    return farmers, devices
+
+
+def build_request(record: Dict, devices: Dict[str, Dict]) -> Dict:
+    body = dict(record["b"])
+    if record["k"] == "sms":
+        # The original was rejected for a bad secret: send a bad one again
+        body["secret"] = WEBHOOK_SECRET if record["s"] != 403 else "wrong"
+        if record.get("form"):
+            return {"method": "POST", "url": "/api/sms/receive", "data": body}
+        return {"method": "POST", "url": "/api/sms/receive", "json": body}
+
+    device = devices.get(body.get("device_id"), {})
+    body["farmer_id"] = device.get("farmer_id", "")
+    # Rejected originals are replayed without a valid token, so they are rejected again
+    token = device.get("api_token") if record["s"] != 401 else "replay-invalid"
+    headers = {"Authorization": f"Bearer {token}"}
+    if record.get("ik"):
+        headers["Idempotency-Key"] = record["ik"]
+    if record.get("ct") == "compact":
+        from app.models.compact_upload import CONTENT_TYPE, encode_soil_upload
+        from app.models.schemas import SoilDataUpload
+        content = encode_soil_upload(SoilDataUpload(**body))
+        headers["Content-Type"] = CONTENT_TYPE
+    else:
+        content = orjson.dumps(body)
+        headers["Content-Type"] = "application/json"
+    if record.get("ce") == "gzip":
+        content = gzip.compress(content)
+        headers["Content-Encoding"] = "gzip"
+    return {"method": "POST", "url": "/api/soil/upload", "content": content, "headers": headers}
+
+
+def outcome(record: Dict, response: httpx.Response) -> Dict:
+    """What the caller observed, without IDs that differ between runs"""
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    if record["k"] == "soil":
+        keys = ("status", "duplicate", "quality_flags", "field_session_status")
+    else:
+        keys = ("status", "action", "message")
+    return {"status_code": response.status_code, **{key: body[key] for key in keys if key in body}}
+
+
+async def drive(base_url: str, records: List[Dict], devices: Dict[str, Dict], speed: float, max_in_flight: int) -> List[Dict]:
+    results: List[Optional[Dict]] = [None] * len(records)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def send(i: int, record: Dict, due: float, started: float):
+            async with semaphore:
+                sent = time.perf_counter()
+                try:
+                    response = await client.request(**build_request(record, devices))
+                    observed = outcome(record, response)
+                except httpx.HTTPError as e:
+                    observed = {"status_code": 0, "error": type(e).__name__}
+                results[i] = {
+                    "i": i,
+                    "k": record["k"],
+                    "ms": round((time.perf_counter() - sent) * 1000, 2),
+                    # How far behind schedule the request went out (the replayer or the app could not keep up)
+                    "late_ms": round(max(0.0, sent - started - due) * 1000, 2),
+                    "captured_status": record["s"],
+                    **observed,
+                }
+
+        t0 = records[0]["t"] if records else 0
+        started = time.perf_counter()
+        tasks = []
+        for i, record in enumerate(records):
+            due = (record["t"] - t0) / speed if speed > 0 else 0.0
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(i, record, due, started)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def observe(stub_url: str, farmers: Dict[str, Dict]) -> Dict:
+    """SMS texts per phone, session states per phone and row counts, read after the run"""
+    from app.core.database import SessionLocal, get_engine
+    from app.models.database_models import Farmer, FieldSession, SMSSession, SoilTest
+
+    sms: Dict[str, List[str]] = defaultdict(list)
+    for message in httpx.get(f"{stub_url}/_sent", timeout=30.0).json()["messages"]:
+        sms[message.get("to_number", "").lstrip("+")].append(message.get("content", ""))
+
+    get_engine()
+    db = SessionLocal()
+    try:
+        sessions: Dict[str, List[str]] = defaultdict(list)
+        rows = db.query(Farmer.phone_number, SMSSession.state)\
+            .join(SMSSession, SMSSession.farmer_id == Farmer.id)\
+            .order_by(Farmer.phone_number, SMSSession.created_at)
+        for phone, state in rows:
+            sessions[phone].append(state)
+        quality = Counter(status for (status,) in db.query(SoilTest.quality_status))
+        field_sessions = Counter(status for (status,) in db.query(FieldSession.status))
+    finally:
+        db.close()
+    return {
+        "sms": dict(sorted(sms.items())),
+        "sessions": dict(sorted(sessions.items())),
+        "soil_tests": dict(quality),
+        "field_sessions": dict(field_sessions),
+    }
+
+
+def latency_report(results: List[Dict], elapsed: float) -> Dict:
+    report = {}
+    for kind in ("soil", "sms"):
+        rows = [r for r in results if r["k"] == kind]
+        if rows:
+            errors = sum(1 for r in rows if r["status_code"] >= 500 or r["status_code"] == 0)
+            report[kind] = summarize([r["ms"] for r in rows], errors, elapsed)
+    late = sorted(r["late_ms"] for r in results)
+    report["schedule_lag_ms"] = {"p50": round(percentile(late, 50), 2), "max": late[-1] if late else 0.0}
+    return report
+
+
+def _list_diff(before: List, after: List) -> Dict:
+    position = next((i for i, (a, b) in enumerate(zip(before, after)) if a != b), min(len(before), len(after)))
+    return {
+        "first_difference": position,
+        "before": before[position] if position < len(before) else None,
+        "after": after[position] if position < len(after) else None,
+        "counts": [len(before), len(after)],
+    }
+
+
+def compare(current: Dict, previous: Dict) -> Dict:
+    """Latency deltas and behavioural differences between two replay reports"""
+    latency = {}
+    for kind in ("soil", "sms"):
+        now, before = current["latency_ms"].get(kind), previous["latency_ms"].get(kind)
+        if now and before:
+            latency[kind] = {
+                pct: {"before": before["latency_ms"][pct], "after": now["latency_ms"][pct],
+                      "change": round(now["latency_ms"][pct] - before["latency_ms"][pct], 2)}
+                for pct in ("p50", "p95", "p99")
+            }
+
+    diffs: Dict[str, Dict] = {}
+    strip = ("i", "ms", "late_ms")
+    before_responses = {r["i"]: {k: v for k, v in r.items() if k not in strip} for r in previous["responses"]}
+    changed = [
+        {"i": r["i"], "before": before_responses.get(r["i"]), "after": {k: v for k, v in r.items() if k not in strip}}
+        for r in current["responses"]
+        if before_responses.get(r["i"]) != {k: v for k, v in r.items() if k not in strip}
+    ]
+    diffs["responses"] = {"count": len(changed), "examples": changed[:MAX_EXAMPLES]}
+
+    for section in ("sms", "sessions"):
+        now, before = current["behavior"][section], previous["behavior"][section]
+        phones = sorted(p for p in set(now) | set(before) if now.get(p, []) != before.get(p, []))
+        diffs[section] = {
+            "count": len(phones),
+            "examples": {p: _list_diff(before.get(p, []), now.get(p, [])) for p in phones[:MAX_EXAMPLES]},
+        }
+    for section in ("soil_tests", "field_sessions"):
+        now, before = current["behavior"][section], previous["behavior"][section]
+        if now != before:
+            diffs[section] = {"before": before, "after": now}
+
+    return {
+        "latency_ms": latency,
+        "behavior_changed": any(d.get("count", 1) for d in diffs.values()),
+        "diffs": diffs,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="Capture files or directories of *.ndjson.gz")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time multiplier; 0 = as fast as possible")
+    parser.add_argument("--max-in-flight", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="Replay only the first N records")
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file in a temp dir")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--stub-latency-ms", type=float, default=20.0)
+    parser.add_argument("--settle-seconds", type=float, default=1.0,
+                        help="Wait after the last response before reading SMS and sessions")
+    parser.add_argument("--output", help="Write the report to this file as well as stdout")
+    parser.add_argument("--compare", help="Report from another build to diff against")
+    parser.add_argument("--fail-on-diff", action="store_true", help="Exit 1 when behaviour differs from --compare")
+    args = parser.parse_args()
+
+    records = load_records(args.captures, args.limit)
+    if not records:
+        print("No captured records found", file=sys.stderr)
+        return 1
+
+    tmp_dir = tempfile.mkdtemp(prefix="smart-soil-replay-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(tmp_dir, 'replay.db')}"
+    farmers, devices = seed(database_url, records)
+
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    env = app_env(database_url, stub_url)
+    env.update({
+        "TELERIVET_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "STUB_SENT_LIMIT": str(max(100000, len(records) * 10)),
+        "WEATHER_PREFETCH_ENABLED": "false",
+        "CAPTURE_ENABLED": "false",
+    })
+
+    stub_cmd = [sys.executable, "-m", "benchmarks.stubs", "--port", str(stub_port),
+                "--latency-ms", str(args.stub_latency_ms)]
+    app_cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+               "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"]
+
+    with running(stub_cmd, env, f"{stub_url}/_sent"), running(app_cmd, env, f"{app_url}/health"):
+        started = time.perf_counter()
+        results = asyncio.run(drive(app_url, records, devices, args.speed, args.max_in_flight))
+        elapsed = time.perf_counter() - started
+        time.sleep(args.settle_seconds)
+        behavior = observe(stub_url, farmers)
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "records": len(records),
+            "speed": args.speed,
+            "max_in_flight": args.max_in_flight,
+            "workers": args.workers,
+            "stub_latency_ms": args.stub_latency_ms,
+            "database": database_url.split(":", 1)[0],
+        },
+        "latency_ms": latency_report(results, elapsed),
+        "status_vs_capture": dict(Counter(
+            "same" if r["status_code"] == r["captured_status"] else "changed" for r in results
+        )),
+        "behavior": behavior,
+        "responses": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output)
+    summary = {key: report[key] for key in ("config", "latency_ms", "status_vs_capture")}
+
+    if args.compare:
+        with open(args.compare) as fh:
+            diff = compare(report, json.load(fh))
+        print(json.dumps({**summary, "compare": diff}, indent=2))
+        if args.fail_on_diff and diff["behavior_changed"]:
+            print("BEHAVIOUR CHANGED against the compared build", file=sys.stderr)
+            return 1
+        return 0
+    print(json.dumps(summary, indent=2) if args.output else output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
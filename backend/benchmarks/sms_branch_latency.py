@@ -0,0 +1,108 @@
+"""
+Per-branch latency of the SMS reply webhook and of the soil upload.
+
+Runs the app in-process against the provider stubs (with artificial latency)
+and reports p50/p95 latency for each SMS menu branch and for uploads. By
+default the weather cache is cleared before every request, so the numbers
+show the cost of the provider calls each branch actually makes.
+
+    python -m benchmarks.sms_branch_latency --iterations 50 --stub-latency-ms 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import app_env, free_port, percentile, running, seed, soil_payload
+
+# (label, messages sent in order; only the last one is timed)
+BRANCHES = [
+    ("1_crop_suggestions", ["1"]),
+    ("2_ask_crop", ["2"]),
+    ("2_check_crop", ["2", "MAIZE"]),
+    ("3_fertilizer", ["3"]),
+    ("invalid_reply", ["HELLO"]),
+]
+
+
+async def measure(iterations: int, warm_cache: bool, farmers):
+    from app.main import app
+    from app.services.weather_service import weather_service
+
+    farmer = farmers[0]
+    results = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60.0) as client:
+        async def timed(request) -> float:
+            if not warm_cache:
+                weather_service.clear_cache()
+            started = time.perf_counter()
+            response = await request()
+            response.raise_for_status()
+            return (time.perf_counter() - started) * 1000
+
+        upload_latencies = []
+        for i in range(iterations):
+            upload_latencies.append(await timed(lambda: client.post(
+                "/api/soil/upload",
+                json=soil_payload(farmer, i),
+                headers={"Authorization": f"Bearer {farmer['api_token']}"}
+            )))
+        results["soil_upload"] = upload_latencies
+
+        for label, messages in BRANCHES:
+            latencies = []
+            for _ in range(iterations):
+                for content in messages[:-1]:
+                    await client.post("/api/sms/receive", json={"from_number": farmer["phone_number"], "content": content})
+                latencies.append(await timed(lambda: client.post(
+                    "/api/sms/receive",
+                    json={"from_number": farmer["phone_number"], "content": messages[-1]}
+                )))
+            results[label] = latencies
+
+    return {
+        label: {
+            "p50_ms": round(percentile(sorted(values), 50), 2),
+            "p95_ms": round(percentile(sorted(values), 95), 2),
+        }
+        for label, values in results.items()
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--stub-latency-ms", type=float, default=100.0)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the weather cache between requests")
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'branches.db')}"
+    stub_port = free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    env = app_env(database_url, stub_url)
+    env["WEATHER_PREFETCH_ENABLED"] = "false"
+    os.environ.update(env)
+
+    farmers = seed(database_url, 1)
+    stub_cmd = [sys.executable, "-m", "benchmarks.stubs", "--port", str(stub_port),
+                "--latency-ms", str(args.stub_latency_ms)]
+    with running(stub_cmd, env, f"{stub_url}/_sent"):
+        results = asyncio.run(measure(args.iterations, args.warm_cache, farmers))
+
+    print(json.dumps({
+        "iterations": args.iterations,
+        "stub_latency_ms": args.stub_latency_ms,
+        "warm_cache": args.warm_cache,
+        "branches": results,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Measure cold-start time of the API.
+
+Reports, as JSON, the median over several runs of:
+  - import_ms: importing app.main in a fresh interpreter
+  - health_ms: spawning uvicorn until /health answers
+  - ready_ms:  spawning uvicorn until /ready answers (first DB connection)
+
+Examples:
+    python -m benchmarks.startup_time --runs 5
+    python -m benchmarks.startup_time --max-health-ms 3000   # exit 1 if slower
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import BACKEND_DIR, free_port
+
+
+def measure_import(env) -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_until_ok(url: str, started: float, timeout: float = 30.0) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            if httpx.get(url, timeout=0.5).status_code == 200:
+                return (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def measure_server(env) -> dict:
+    port = free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    try:
+        health_ms = wait_until_ok(f"http://127.0.0.1:{port}/health", started)
+        ready_ms = wait_until_ok(f"http://127.0.0.1:{port}/ready", started)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {"health_ms": health_ms, "ready_ms": ready_ms}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--database-url", help="Defaults to a SQLite file in a temp dir")
+    parser.add_argument("--max-health-ms", type=float, help="Fail if median time to /health exceeds this")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["SUPABASE_DB_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    env["LOG_LEVEL"] = "WARNING"
+
+    imports, health, ready = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import(env))
+        server = measure_server(env)
+        health.append(server["health_ms"])
+        ready.append(server["ready_ms"])
+
+    results = {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(imports), 1),
+        "health_ms": round(statistics.median(health), 1),
+        "ready_ms": round(statistics.median(ready), 1),
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.max_health_ms and results["health_ms"] > args.max_health_ms:
+        print(f"Startup too slow: {results['health_ms']}ms > {args.max_health_ms}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
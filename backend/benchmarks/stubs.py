@@ -0,0 +1,86 @@
+"""
+Stub OpenWeather and Telerivet servers for benchmarks.
+
+Run standalone with:
+    python -m benchmarks.stubs --port 9100 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+from fastapi import FastAPI, Request
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+# Sent messages kept for /_sent (replay.py raises it to see every message of a run)
+SENT_LIMIT = int(os.getenv("STUB_SENT_LIMIT", "1000"))
+
+app = FastAPI(title="Smart Soil provider stubs")
+_message_ids = itertools.count(1)
+sent_messages = []
+
+
+async def _simulate_latency():
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+
+
+@app.get("/data/2.5/weather")
+async def current_weather(lat: float, lon: float):
+    await _simulate_latency()
+    return {
+        "name": f"Cell {lat:.1f},{lon:.1f}",
+        "main": {"temp": 24.5, "humidity": 68, "pressure": 1012},
+        "weather": [{"description": "scattered clouds"}],
+        "rain": {"1h": 0.2},
+    }
+
+
+@app.get("/data/2.5/forecast")
+async def forecast(lat: float, lon: float):
+    await _simulate_latency()
+    start = int(time.time())
+    return {
+        "list": [
+            {
+                "dt": start + i * 3 * 3600,
+                "main": {"temp": 20 + (i % 8), "humidity": 60 + (i % 5)},
+                "rain": {"3h": 1.5} if i % 6 == 0 else {},
+            }
+            for i in range(40)
+        ]
+    }
+
+
+@app.post("/v1/projects/{project_id}/messages/send")
+async def send_message(project_id: str, request: Request):
+    await _simulate_latency()
+    payload = await request.json()
+    message_id = f"SM{next(_message_ids)}"
+    sent_messages.append({"id": message_id, **payload})
+    del sent_messages[:-SENT_LIMIT]
+    return {"id": message_id, "status": "queued", "to_number": payload.get("to_number")}
+
+
+@app.get("/_sent")
+async def list_sent():
+    """Messages accepted by the Telerivet stub (most recent STUB_SENT_LIMIT)."""
+    return {"messages": sent_messages}
+
+
+def main():
+    import uvicorn
+
+    global LATENCY_MS
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    args = parser.parse_args()
+    LATENCY_MS = args.latency_ms
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
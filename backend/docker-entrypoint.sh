@@ -0,0 +1,10 @@
+#!/bin/sh
+set -e
+
+# Bring the schema up to date before the workers start (see app/core/migrations.py).
+# Set RUN_MIGRATIONS=false when a separate release step already runs them.
+if [ "${RUN_MIGRATIONS:-true}" != "false" ]; then
+    python -m app.core.migrations
+fi
+
+exec "$@"
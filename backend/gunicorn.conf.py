@@ -0,0 +1,48 @@
+"""
+Gunicorn profile for running the API with several worker processes.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Each worker is a separate process with its own event loop, so per-process
+state (weather cache, idempotency cache, rate limits) would be split N ways.
+When more than one worker is configured this profile defaults CACHE_BACKEND to
+"sqlite", a file shared by every worker on the host; set CACHE_BACKEND=redis
+and REDIS_URL to share it across hosts as well.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# The app is I/O bound (OpenWeather, Telerivet, Postgres); 2 x cores is plenty
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count() * 2))))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Each worker runs the app lifespan itself (pool, clients, prefetcher), so don't preload
+preload_app = False
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+
+accesslog = None  # request logging is done by the app, with correlation IDs
+errorlog = "-"
+
+if workers > 1:
+    # Read by the workers' settings after fork
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+
+def on_starting(server):
+    server.log.info(
+        "Starting %s workers, cache backend %s, DB pool %s+%s per worker",
+        workers, os.getenv("CACHE_BACKEND", "memory"),
+        os.getenv("DB_POOL_SIZE", "5"), os.getenv("DB_MAX_OVERFLOW", "10"),
+    )
+    if workers > 1 and os.getenv("CACHE_BACKEND", "memory").lower() == "memory":
+        server.log.warning("CACHE_BACKEND=memory with %s workers: caches and rate limits are per worker", workers)
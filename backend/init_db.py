@@ -1,19 +1,15 @@
 """
 Database initialization script for Smart Soil Platform
-Creates SQLite database and tables on first run
+Creates the database tables; equivalent to `python -m app.core.migrations`
 """
 
-from app.core.database import engine, Base
-from app.models.database_models import (
-    Farmer, Device, SoilTest, Recommendation, SMSLog, SMSSession
-)
+from app.core.migrations import run_migrations
 
 def init_db():
     """Create all database tables"""
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    run_migrations()
     print("✅ Database initialized successfully!")
-    print("Database file: smart_soil.db")
 
 if __name__ == "__main__":
     init_db()
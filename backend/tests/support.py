@@ -0,0 +1,47 @@
+"""Shared setup: a throwaway SQLite database and no provider credentials. Import before `app`."""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="smart-soil-test-")
+os.environ.update({
+    "SUPABASE_DB_URL": f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    "API_SECRET_KEY": "test-secret",
+    "OPENWEATHER_API_KEY": "",
+    "TELERIVET_API_KEY": "",
+    "WEATHER_PREFETCH_ENABLED": "false",
+    "FIELD_SESSIONS_ENABLED": "false",
+    "LOG_LEVEL": "CRITICAL",
+})
+
+from app.core.database import SessionLocal  # noqa: E402
+from app.core.migrations import run_migrations  # noqa: E402
+from app.models.database_models import Device, Farmer  # noqa: E402
+
+run_migrations()
+
+
+def create_device(phone_number: str, device_id: str, api_token: str) -> str:
+    """A farmer with one device; returns the farmer ID"""
+    db = SessionLocal()
+    try:
+        farmer = Farmer(name=f"Farmer {phone_number}", phone_number=phone_number, region="Eastern",
+                        district="Mbale", pin="123456")
+        db.add(farmer)
+        db.flush()
+        db.add(Device(device_id=device_id, sim_number=phone_number, farmer_id=farmer.id, api_token=api_token))
+        db.commit()
+        return farmer.id
+    finally:
+        db.close()
+
+
+def soil_upload(device_id: str, phone_number: str, sample_number: int, timestamp: str, **values) -> dict:
+    return {
+        "device_id": device_id, "farmer_id": "", "phone_number": phone_number,
+        "timestamp": timestamp, "gps_latitude": 1.0, "gps_longitude": 34.0,
+        "sample_number": sample_number, "sample_depth_cm": 10,
+        "soil_temperature_c": 22.0, "soil_moisture_percent": 30.0, "soil_nitrogen_mgkg": 40.0,
+        "soil_phosphorus_mgkg": 15.0, "soil_potassium_mgkg": 150.0, "soil_ph": 6.2,
+        **values,
+    }
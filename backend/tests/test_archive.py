@@ -0,0 +1,117 @@
+"""Archive manifest, farmer index and concurrent writers. Run from backend/: python -m unittest discover tests"""
+
+import gzip
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import support
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+
+from app.core.database import SessionLocal, get_engine
+from app.models.database_models import Recommendation, SoilTest
+from app.services import retention
+from app.services.archive import Archive
+
+
+def _write_parts(root: str, writer: int) -> None:
+    archive = Archive(root)
+    for batch in range(5):
+        rows = [{"id": f"{writer}-{batch}-{i}", "farmer_id": f"farmer-{i % 3}", "created_at": datetime(2026, 1, 5, 10)}
+                for i in range(6)]
+        archive.write_part("sms_logs", "2026-01", rows, f"{writer}-{batch}")
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="archive-", dir=support._tmp)
+        self.archive = Archive(self.root)
+
+    def _rows(self, farmer_id: str, count: int = 2):
+        return [{"id": f"{farmer_id}-{i}", "farmer_id": farmer_id, "created_at": datetime(2026, 2, i + 1, 8)}
+                for i in range(count)]
+
+    def test_writers_in_several_processes_keep_every_part(self):
+        processes = [multiprocessing.get_context("fork").Process(target=_write_parts, args=(self.root, n))
+                     for n in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(len(self.archive.manifest()), 20)
+        self.assertEqual(len(list(self.archive.read("sms_logs", farmer_id="farmer-1"))), 40)
+
+    def test_farmer_read_opens_only_that_farmers_parts(self):
+        self.archive.write_part("soil_tests", "2026-02", self._rows("a"), "run-1")
+        self.archive.write_part("soil_tests", "2026-02", self._rows("b"), "run-2")
+        # A part from before the index existed is still read
+        legacy = os.path.join("soil_tests", "2026-01", "part-legacy.ndjson.gz")
+        os.makedirs(os.path.join(self.root, os.path.dirname(legacy)))
+        with gzip.open(os.path.join(self.root, legacy), "wt") as f:
+            f.write(json.dumps({"id": "a-old", "farmer_id": "a", "created_at": "2026-01-02T08:00:00"}) + "\n")
+        manifest = {"version": 1, "parts": self.archive.manifest() + [{
+            "table": "soil_tests", "month": "2026-01", "path": legacy, "rows": 1,
+            "min_created_at": "2026-01-02T08:00:00", "max_created_at": "2026-01-02T08:00:00",
+        }]}
+        with open(self.archive.manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+        with mock.patch("app.services.archive.gzip.open", wraps=gzip.open) as opened:
+            rows = list(self.archive.read("soil_tests", farmer_id="a"))
+        self.assertEqual(sorted(row["id"] for row in rows), ["a-0", "a-1", "a-old"])
+        self.assertEqual(sorted(call.args[0] for call in opened.call_args_list), sorted([
+            os.path.join(self.root, "soil_tests", "2026-02", "part-run-1.ndjson.gz"),
+            os.path.join(self.root, legacy),
+        ]))
+
+
+class RetentionTest(unittest.TestCase):
+    def setUp(self):
+        self.archive = Archive(tempfile.mkdtemp(prefix="archive-", dir=support._tmp))
+        patcher = mock.patch.object(retention, "archive", self.archive)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_soil_test_batch_loads_recommendations_in_one_query(self):
+        farmer_id = support.create_device("256700000061", "RET-1", "ret-token")
+        db = SessionLocal()
+        try:
+            for i in range(5):
+                test = SoilTest(device_id="RET-1", farmer_id=farmer_id, timestamp=datetime(2020, 1, i + 1),
+                                latitude=1.0, longitude=34.0, created_at=datetime(2020, 1, i + 1))
+                test.recommendations = [Recommendation(recommendation_type="crop_suggestion", content=f"{i}-{n}")
+                                        for n in range(2)]
+                db.add(test)
+            db.commit()
+        finally:
+            db.close()
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT") and "recommendations" in statement:
+                statements.append(statement)
+
+        event.listen(get_engine(), "before_cursor_execute", count)
+        try:
+            archived = retention._archive_rows(
+                SoilTest, "soil_tests", datetime(2021, 1, 1), "run", False,
+                serialize=retention._soil_test_record, delete_children=retention._delete_soil_test_children,
+                load=(selectinload(SoilTest.recommendations),)
+            )
+        finally:
+            event.remove(get_engine(), "before_cursor_execute", count)
+
+        self.assertEqual(archived, 5)
+        self.assertEqual(len(statements), 1)
+        rows = list(self.archive.read("soil_tests", farmer_id=farmer_id))
+        self.assertEqual(sorted(len(row["recommendations"]) for row in rows), [2] * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
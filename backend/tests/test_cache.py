@@ -0,0 +1,88 @@
+"""Shared cache backend encoding and hit counters. Run from backend/: python -m unittest discover tests"""
+
+import os
+import pickle
+import sqlite3
+import unittest
+
+import support
+
+from app.core.cache import HitCounter, SQLiteCache
+from app.services.forecast import WeatherSnapshot
+
+CURRENT = {"name": "Gulu", "main": {"temp": 24.5, "humidity": 61, "pressure": 1011},
+           "weather": [{"description": "light rain"}], "rain": {"1h": 0.4}}
+FORECAST = {"city": {"timezone": 10800}, "list": [
+    {"dt": 1772352000 + i * 10800, "main": {"temp": 20 + i % 6, "humidity": 70}, "rain": {"3h": 0.6 * (i % 3)}}
+    for i in range(40)
+]}
+
+
+class SQLiteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(support._tmp, "cache.sqlite3")
+        self.cache = SQLiteCache(self.path, self.id(), 60)
+
+    def test_values_round_trip_as_json(self):
+        self.cache.set("dict", {"status": "success", "values": [1, 2.5, None]})
+        self.cache.set("bytes", b'{"a":1}')
+        self.assertEqual(self.cache.get("dict"), {"status": "success", "values": [1, 2.5, None]})
+        self.assertEqual(self.cache.get("bytes"), b'{"a":1}')
+
+    def test_weather_snapshot_codec(self):
+        cache = SQLiteCache(self.path, self.id(), 60, codec=(WeatherSnapshot.to_cache, WeatherSnapshot.from_cache))
+        snapshot = WeatherSnapshot.from_openweather(CURRENT, FORECAST)
+        cache.set("cell", snapshot)
+        self.assertEqual(cache.get("cell").to_dict(), snapshot.to_dict())
+        # Stored as columns only: no per-day dicts in the cached form
+        self.assertTrue(all(isinstance(value, (int, float, list, type(None)))
+                            for value in snapshot.to_cache()["forecast_days"].values()))
+
+    def test_weather_snapshot_response_is_a_copy(self):
+        snapshot = WeatherSnapshot.from_openweather(CURRENT, FORECAST)
+        response = snapshot.to_dict()
+        response["forecast"]["daily"].clear()
+        response["forecast"]["summary"] = "changed by a caller"
+        self.assertEqual(snapshot.to_dict(), WeatherSnapshot.from_openweather(CURRENT, FORECAST).to_dict())
+
+    def test_pickled_value_is_a_miss(self):
+        self.cache.set("key", {"a": 1})
+        self.cache._connect().execute("UPDATE cache_entries SET value = ? WHERE namespace = ? AND key = ?",
+                                      (pickle.dumps({"a": 1}), self.id(), "key"))
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_hit_counter_totals_include_other_workers(self):
+        first, second = HitCounter("stats", self.cache), HitCounter("stats", self.cache)
+        first.hit()
+        first.hit()
+        second.miss()
+        second.flush()
+        snapshot = first.snapshot()
+        self.assertEqual((snapshot["hits"], snapshot["misses"]), (2, 1))
+        self.assertEqual((snapshot["worker"]["hits"], snapshot["worker"]["misses"]), (2, 0))
+
+    def test_hit_counter_survives_clearing_the_cache(self):
+        counter = HitCounter("cleared", SQLiteCache(self.path, "cache_stats", 60))
+        counter.hit()
+        counter.flush()
+        self.cache.clear()
+        self.assertEqual(counter.snapshot()["hits"], 1)
+
+    def test_failed_flush_is_retried_once(self):
+        counter = HitCounter("retried", self.cache)
+        counter.hit()
+        counter.miss()
+        # The misses counter fails to write after the hits counter was written
+        conn = self.cache._connect()
+        conn.execute("CREATE TRIGGER fail_misses BEFORE INSERT ON cache_entries WHEN NEW.key = 'retried:misses' "
+                     "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        with self.assertRaises(sqlite3.IntegrityError):
+            counter.flush()
+        conn.execute("DROP TRIGGER fail_misses")
+        counter.flush()
+        snapshot = counter.snapshot()
+        self.assertEqual((snapshot["hits"], snapshot["misses"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Dashboard counter writes. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+
+import support
+
+from app.core.database import SessionLocal
+from app.core.http_cache import bump_farmer_version
+from app.models.database_models import DashboardCounter, Farmer
+from app.services import dashboard
+
+
+class PendingCountersTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000037", "DASH-1", "dash-token")
+
+    def _state(self):
+        db = SessionLocal()
+        try:
+            sent = db.query(DashboardCounter.value)\
+                .filter(DashboardCounter.metric == dashboard.SMS_SENT, DashboardCounter.bucket == dashboard._day())\
+                .scalar()
+            return sent or 0, db.get(Farmer, self.farmer_id).data_version
+        finally:
+            db.close()
+
+    def test_rows_are_locked_only_by_the_commit(self):
+        sent, version = self._state()
+        first, second = SessionLocal(), SessionLocal()
+        try:
+            # While the first transaction is still open (awaiting an SMS send), the second commits
+            dashboard.record_sms(first, "sent")
+            dashboard.record_sms(first, "sent")
+            bump_farmer_version(first, self.farmer_id)
+            dashboard.record_sms(second, "sent")
+            bump_farmer_version(second, self.farmer_id)
+            second.commit()
+            first.commit()
+        finally:
+            first.close()
+            second.close()
+        self.assertEqual(self._state(), (sent + 3, version + 2))
+
+    def test_rollback_drops_pending_counts(self):
+        before = self._state()
+        db = SessionLocal()
+        try:
+            dashboard.record_sms(db, "sent")
+            bump_farmer_version(db, self.farmer_id)
+            db.rollback()
+            db.commit()
+        finally:
+            db.close()
+        self.assertEqual(self._state(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
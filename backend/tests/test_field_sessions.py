@@ -0,0 +1,117 @@
+"""Grouping samples into field sessions. Run from backend/: python -m unittest discover tests"""
+
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import support
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.main import app
+from app.models.database_models import FieldSession, SMSSession
+from app.services import field_sessions
+from app.services.field_sessions import field_session_finalizer
+
+
+class FieldSessionGroupingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000101", "FS-1", "fs-token")
+
+    def setUp(self):
+        settings.field_sessions_enabled = True
+
+    def tearDown(self):
+        settings.field_sessions_enabled = False
+
+    def test_buffered_uploads_group_by_sample_time(self):
+        """Samples uploaded together after being buffered offline for hours are separate fields"""
+        timestamps = ["2026-05-01T08:00:00", "2026-05-01T08:03:00", "2026-05-01T13:00:00"]
+        with TestClient(app) as client:
+            for i, timestamp in enumerate(timestamps):
+                response = client.post("/api/soil/upload", json=support.soil_upload("FS-1", "256700000101", i, timestamp),
+                                       headers={"Authorization": "Bearer fs-token"})
+                self.assertEqual(response.status_code, 200, response.text)
+
+        db = SessionLocal()
+        try:
+            counts = sorted(count for (count,) in db.query(FieldSession.sample_count)
+                            .filter(FieldSession.farmer_id == self.farmer_id))
+        finally:
+            db.close()
+        self.assertEqual(counts, [1, 2])
+
+
+class FieldSessionCompletionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000043", "FS-2", "fs2-token")
+
+    def setUp(self):
+        settings.field_sessions_enabled = True
+
+    def tearDown(self):
+        settings.field_sessions_enabled = False
+
+    def _session(self):
+        db = SessionLocal()
+        try:
+            session = db.query(FieldSession).filter(FieldSession.farmer_id == self.farmer_id).one()
+            advised = db.query(SMSSession).filter(SMSSession.field_session_id == session.id).count()
+            return session, advised
+        finally:
+            db.close()
+
+    def _complete(self, session_id):
+        db = SessionLocal()
+        try:
+            return asyncio.run(field_sessions.complete(db, session_id))
+        finally:
+            db.close()
+
+    def test_failed_completion_is_retried(self):
+        with TestClient(app) as client:
+            response = client.post("/api/soil/upload",
+                                   json=support.soil_upload("FS-2", "256700000043", 1, "2026-05-02T08:00:00"),
+                                   headers={"Authorization": "Bearer fs2-token"})
+            self.assertEqual(response.status_code, 200, response.text)
+        session, _ = self._session()
+
+        with mock.patch.object(field_sessions.weather_service, "get_weather_data",
+                               mock.AsyncMock(side_effect=RuntimeError("weather down"))):
+            with self.assertRaises(RuntimeError):
+                self._complete(session.id)
+        session, advised = self._session()
+        self.assertEqual((session.status, advised), (field_sessions.ADVISING, 0))
+        # Still within its claim: nobody else takes it over
+        self.assertIsNone(self._complete(session.id))
+
+        db = SessionLocal()
+        try:
+            db.query(FieldSession).filter(FieldSession.id == session.id)\
+                .update({"claimed_at": datetime.utcnow() - timedelta(seconds=field_sessions.ADVISE_RETRY_SECONDS + 1)})
+            db.commit()
+        finally:
+            db.close()
+        self.assertIn(session.id, field_session_finalizer._idle_sessions())
+        self.assertIsNotNone(self._complete(session.id))
+        session, advised = self._session()
+        self.assertEqual((session.status, advised), (field_sessions.COMPLETED, 1))
+
+
+class FinalizerLeaseTest(unittest.TestCase):
+    def test_one_leader_per_interval(self):
+        other = field_sessions.FieldSessionFinalizer()
+        other.worker_id = "other-worker"
+        other._locks = field_session_finalizer._locks  # another worker on the same shared cache
+        field_session_finalizer._locks.delete(field_session_finalizer.LEADER_KEY)
+        self.assertTrue(field_session_finalizer._is_leader())
+        self.assertFalse(other._is_leader())
+        self.assertFalse(field_session_finalizer._is_leader())
+
+
+if __name__ == "__main__":
+    unittest.main()
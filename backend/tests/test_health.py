@@ -0,0 +1,37 @@
+"""Deep health check failures. Run from backend/: python -m unittest discover tests"""
+
+import time
+import unittest
+from unittest import mock
+
+import support  # noqa: F401
+from fastapi.testclient import TestClient
+
+from app.core import health
+from app.core.config import settings
+from app.main import app
+
+
+class DeepHealthTest(unittest.TestCase):
+    def _deep(self) -> dict:
+        health.health_checker._result = None  # no cached result from another test
+        with TestClient(app) as client:
+            response = client.get("/health/deep")
+        self.assertEqual(response.status_code, 503)
+        return response.json()["checks"]["database"]
+
+    def test_database_error_is_not_echoed(self):
+        engine = mock.Mock(pool=health.get_engine().pool)
+        engine.connect.side_effect = RuntimeError("could not connect to db.internal as admin:hunter2")
+        with mock.patch.object(health, "get_engine", return_value=engine):
+            self.assertEqual(self._deep(), {"ok": False, "error": "database unavailable"})
+
+    def test_slow_database_times_out(self):
+        check = health._check_database
+        with mock.patch.object(health, "_check_database", lambda: time.sleep(1) or check()), \
+                mock.patch.object(settings, "health_check_timeout_seconds", 0.1):
+            self.assertEqual(self._deep(), {"ok": False, "error": "database check timed out"})
+
+
+if __name__ == "__main__":
+    unittest.main()
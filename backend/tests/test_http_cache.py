@@ -0,0 +1,55 @@
+"""Conditional GET on per-farmer admin reads. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+
+import support
+from fastapi.testclient import TestClient
+
+from app.core.database import SessionLocal
+from app.core.http_cache import bump_farmer_version
+from app.core.security import get_current_admin
+from app.main import app
+from app.models.database_models import Farmer
+
+
+class FarmerResponseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000038", "ETAG-1", "etag-token")
+        app.dependency_overrides[get_current_admin] = lambda: None
+
+    @classmethod
+    def tearDownClass(cls):
+        app.dependency_overrides.pop(get_current_admin, None)
+
+    def _bump(self):
+        db = SessionLocal()
+        try:
+            before = db.get(Farmer, self.farmer_id).updated_at
+            bump_farmer_version(db, self.farmer_id)
+            db.commit()
+            db.expire_all()
+            self.assertGreater(db.get(Farmer, self.farmer_id).updated_at, before)
+        finally:
+            db.close()
+
+    def test_write_in_the_same_second_is_not_a_304(self):
+        url = f"/api/admin/sms-logs/{self.farmer_id}"
+        with TestClient(app) as client:
+            first = client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertNotIn("last-modified", first.headers)
+            self.assertEqual(client.get(url, headers={"If-None-Match": first.headers["etag"]}).status_code, 304)
+
+            self._bump()
+            # A date-based validator from a client clock ahead of ours must not hide the write
+            polled = client.get(url, headers={"If-None-Match": first.headers["etag"],
+                                              "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+            self.assertEqual(polled.status_code, 200)
+            self.assertNotEqual(polled.headers["etag"], first.headers["etag"])
+            self.assertEqual(client.get(url, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}).status_code,
+                             200)
+
+
+if __name__ == "__main__":
+    unittest.main()
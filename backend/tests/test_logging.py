@@ -0,0 +1,32 @@
+"""Records crossing the logging queue. Run from backend/: python -m unittest discover tests"""
+
+import json
+import logging
+import queue
+import unittest
+
+import support  # noqa: F401
+
+from app.core.logging_config import JSONFormatter, StructuredQueueHandler
+
+
+class StructuredQueueHandlerTest(unittest.TestCase):
+    def test_traceback_stays_out_of_the_message(self):
+        records = queue.Queue()
+        logger = logging.getLogger("tests.logging")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(StructuredQueueHandler(records))
+        try:
+            raise ValueError("bad reading")
+        except ValueError:
+            logger.exception("Upload failed for %s", "DEV-1", extra={"device_id": "DEV-1"})
+
+        entry = json.loads(JSONFormatter().format(records.get_nowait()))
+        self.assertEqual(entry["message"], "Upload failed for DEV-1")
+        self.assertEqual(entry["device_id"], "DEV-1")
+        self.assertIn("ValueError: bad reading", entry["exc_info"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+"""Schema migrations over existing data. Run from backend/: python -m unittest discover tests"""
+
+import os
+import unittest
+
+import support
+from sqlalchemy import create_engine, text
+
+from app.core import migrations
+from app.core.database import Base
+
+
+class UniqueIndexTest(unittest.TestCase):
+    def test_duplicates_stop_the_migration(self):
+        engine = create_engine(f"sqlite:///{os.path.join(support._tmp, 'migrations.db')}")
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_soil_tests_device_sample"))
+            for test_id in ("a", "b"):
+                conn.execute(text(
+                    "INSERT INTO soil_tests (id, device_id, timestamp, latitude, longitude, sample_number) "
+                    "VALUES (:id, 'dev', '2026-05-01 08:00:00', 1.0, 34.0, 1)"
+                ), {"id": test_id})
+
+        with self.assertRaisesRegex(RuntimeError, r"ix_soil_tests_device_sample .*\(1 duplicated keys\)"):
+            migrations._create_missing_indexes(engine)
+
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM soil_tests WHERE id = 'b'"))
+        migrations._create_missing_indexes(engine)
+
+
+if __name__ == "__main__":
+    unittest.main()
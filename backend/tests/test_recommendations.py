@@ -0,0 +1,73 @@
+"""Menu answers while the AI provider is unavailable. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+from unittest import mock
+
+import support
+from fastapi.testclient import TestClient
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.database import SessionLocal
+from app.main import app
+from app.models.database_models import Recommendation, SoilTest
+from app.services import recommendations
+from app.services.ai_agronomist import UNAVAILABLE_MESSAGE, ai_agronomist
+from app.services.sms_service import sms_service
+
+PROVIDER_CALLS = ("_crop_recommendations", "_check_crop", "_fertilizer_advice")
+
+
+class DegradedAdviceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000033", "AI-1", "ai-token")
+
+    def setUp(self):
+        # A breaker of its own, so failures here do not open the shared "ai" circuit
+        patcher = mock.patch.object(ai_agronomist, "breaker", CircuitBreaker("ai-test", 1000, 30))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _provider_down(self):
+        return mock.patch.multiple(ai_agronomist, **{name: mock.AsyncMock(side_effect=RuntimeError("503"))
+                                                     for name in PROVIDER_CALLS})
+
+    def _reply(self, client, content: str) -> str:
+        with mock.patch.object(sms_service, "send_sms", mock.AsyncMock()) as send:
+            response = client.post("/api/sms/receive", json={"from_number": "256700000033", "content": content})
+        self.assertEqual(response.status_code, 200, response.text)
+        return send.call_args.args[1]
+
+    def _stored(self):
+        db = SessionLocal()
+        try:
+            return db.query(Recommendation).join(SoilTest).filter(SoilTest.farmer_id == self.farmer_id).count()
+        finally:
+            db.close()
+
+    def test_nothing_is_stored_until_the_provider_answers(self):
+        with TestClient(app) as client:
+            with self._provider_down():
+                upload = client.post("/api/soil/upload", json=support.soil_upload("AI-1", "256700000033", 1,
+                                                                                   "2026-06-01T08:00:00Z"),
+                                     headers={"Authorization": "Bearer ai-token"})
+                self.assertEqual(upload.status_code, 200, upload.text)
+                self.assertEqual(self._stored(), 0)
+
+                self.assertEqual(self._reply(client, "1"), UNAVAILABLE_MESSAGE)
+                self.assertEqual(self._stored(), 0)
+
+            self.assertNotEqual(self._reply(client, "1"), UNAVAILABLE_MESSAGE)
+            self.assertEqual(self._stored(), 1)
+
+    def test_store_skips_a_missing_answer(self):
+        db = SessionLocal()
+        try:
+            recommendations.store(db, "no-such-test", self.farmer_id, recommendations.CROP_SUGGESTION, None)
+            self.assertFalse(db.new)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
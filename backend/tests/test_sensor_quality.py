@@ -0,0 +1,82 @@
+"""Sensor quality statistics shared through the device row. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import support
+from fastapi.testclient import TestClient
+
+from app.core.database import SessionLocal
+from app.api import soil
+from app.main import app
+from app.models.database_models import Device, SoilTest
+from app.services.sensor_quality import OK, QUARANTINED, FIELDS, SensorQualityMonitor, sensor_quality
+
+
+class SensorQualityTest(unittest.TestCase):
+    def setUp(self):
+        self.db = SessionLocal()
+        self.farmer_id = support.create_device(f"2567001{len(self.id()):05d}", self.id(), self.id())
+        self.device_id = self.db.query(Device.id).filter(Device.device_id == self.id()).scalar()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _upload(self, at: datetime, reading: dict) -> list:
+        """The stored test, then check() in the same transaction, as the upload endpoint does"""
+        soil_test = SoilTest(device_id=self.device_id, farmer_id=self.farmer_id, timestamp=at,
+                             latitude=1.0, longitude=34.0, **reading)
+        self.db.add(soil_test)
+        self.db.flush()
+        flags = sensor_quality.check(self.db, soil_test)
+        soil_test.quality_status = QUARANTINED if flags else OK
+        soil_test.quality_flags = flags or None
+        self.db.commit()
+        return flags
+
+    def _readings(self):
+        started = datetime(2026, 5, 1, 8)
+        for i in range(15):
+            yield started + timedelta(hours=i), {"ph": 6.0 + 0.05 * (i % 4), "moisture": 30.0 + i % 3}
+        yield started + timedelta(hours=15), {"ph": 11.5, "moisture": 31.0}  # outlier, still in bounds
+        yield started + timedelta(hours=16), {"ph": 25.0, "moisture": 31.0}  # out of bounds
+
+    def test_statistics_are_shared_and_reseed_matches_checks(self):
+        flags = [self._upload(at, reading) for at, reading in self._readings()]
+        self.assertEqual(flags[-2], ["outlier:ph"])
+        self.assertEqual(flags[-1], ["bounds:ph"])
+
+        # Another worker's monitor reads the same statistics
+        stored = SensorQualityMonitor().device_report(self.db, self.device_id)
+        self.assertEqual((stored["checked"], stored["quarantined"]), (17, 2))
+
+        # Rebuilt from the tests, the statistics match what the checks accumulated
+        self.db.query(Device).filter(Device.id == self.device_id).update({Device.quality_stats: None})
+        self.db.commit()
+        seeded = sensor_quality.device_report(self.db, self.device_id)
+        for name in FIELDS:
+            self.assertEqual(seeded["fields"][name], stored["fields"][name], name)
+        self.assertEqual(seeded["fields"]["ph"]["samples"], 16)
+
+    def test_duplicate_upload_is_not_counted(self):
+        body = support.soil_upload(self.id(), "256700000042", 1, "2026-05-03T08:00:00Z")
+        find = soil._find_existing_test
+        calls = []
+
+        def raced(*args):
+            # Each retry's pre-check misses, as if it reached another worker before the insert committed
+            calls.append(args)
+            return None if len(calls) % 2 else find(*args)
+
+        with TestClient(app) as client, mock.patch.object(soil, "_find_existing_test", side_effect=raced):
+            for attempt in range(3):
+                response = client.post("/api/soil/upload", json=body, headers={
+                    "Authorization": f"Bearer {self.id()}", "Idempotency-Key": f"retry-{attempt}"})
+                self.assertEqual(response.status_code, 200, response.text)
+                self.assertEqual(bool(response.json().get("duplicate")), attempt > 0)
+        self.assertEqual(sensor_quality.device_report(self.db, self.device_id)["checked"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Soil history updates at ingestion. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+from datetime import datetime, timezone
+
+import support
+from fastapi.testclient import TestClient
+
+from app.core.database import SessionLocal
+from app.main import app
+from app.models.database_models import Farmer, SoilHistory, SoilTest
+from app.services import soil_history
+
+
+class SoilHistoryTimestampTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.farmer_id = support.create_device("256700000001", "HIST-1", "hist-token")
+
+    def _rows(self):
+        db = SessionLocal()
+        try:
+            return {row.field_key: row for row in db.query(SoilHistory).filter(SoilHistory.farmer_id == self.farmer_id)}
+        finally:
+            db.close()
+
+    def test_uploads_with_aware_timestamps(self):
+        with TestClient(app) as client:
+            for i, timestamp in enumerate(["2026-03-01T08:00:00Z", "2026-03-20T11:00:00+03:00"]):
+                response = client.post("/api/soil/upload", json=support.soil_upload("HIST-1", "256700000001", i, timestamp),
+                                       headers={"Authorization": "Bearer hist-token"})
+                self.assertEqual(response.status_code, 200, response.text)
+
+        farm = self._rows()[soil_history.FARM]
+        self.assertEqual(farm.sample_count, 2)
+        self.assertEqual(farm.first_at, datetime(2026, 3, 1, 8, 0))
+        self.assertEqual(farm.last_at, datetime(2026, 3, 20, 8, 0))  # +03:00 stored as UTC
+
+    def test_record_mixes_aware_and_stored_naive_timestamps(self):
+        db = SessionLocal()
+        try:
+            farmer = Farmer(name="Record", phone_number="256700000002", region="Eastern", district="Mbale", pin="123456")
+            db.add(farmer)
+            db.flush()
+            for day in (1, 2):
+                test = SoilTest(farmer_id=farmer.id, latitude=1.0, longitude=34.0, ph=6.0, nitrogen=40.0,
+                                timestamp=datetime(2026, 4, day, tzinfo=timezone.utc))
+                soil_history.record(db, test)
+                db.commit()  # the next record() reads first_at/last_at back naive
+            self.assertEqual(db.get(SoilHistory, (farmer.id, soil_history.FARM)).sample_count, 2)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
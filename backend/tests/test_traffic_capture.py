@@ -0,0 +1,29 @@
+"""Sanitizing captured requests. Run from backend/: python -m unittest discover tests"""
+
+import unittest
+
+import support
+
+from app.core.traffic_capture import OTHER_REPLY, SOIL_FIELDS, sanitize_sms, sanitize_soil
+
+
+class SanitizeTest(unittest.TestCase):
+    def test_soil_keeps_only_upload_fields(self):
+        body = {**support.soil_upload("DEV-1", "0700111222", 1, "2026-06-01T08:00:00Z"),
+                "farmer_id": "farmer-1", "owner_name": "Jane", "notes": {"village": "Kasese"}}
+        clean = sanitize_soil(body)
+        self.assertEqual(set(clean), set(SOIL_FIELDS))
+        self.assertNotEqual(clean["phone_number"], body["phone_number"])
+        self.assertNotEqual(clean["device_id"], body["device_id"])
+
+    def test_sms_keeps_only_menu_replies(self):
+        replies = {" 1 ": "1", "two": "TWO", "Maize": "MAIZE", "": "",
+                   "call me on 0700111222": OTHER_REPLY, "0700111222": OTHER_REPLY, "SORGHUM": OTHER_REPLY}
+        for content, kept in replies.items():
+            clean = sanitize_sms({"from_number": "0700111222", "content": content, "secret": "s3", "contact_name": "Jane"})
+            self.assertEqual(set(clean), {"from_number", "content"})
+            self.assertEqual(clean["content"], kept, content)
+
+
+if __name__ == "__main__":
+    unittest.main()
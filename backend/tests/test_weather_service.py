@@ -0,0 +1,40 @@
+"""OpenWeather quota and the circuit breaker. Run from backend/: python -m unittest discover tests"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+import support  # noqa: F401
+
+from app.core.circuit_breaker import HALF_OPEN, CircuitBreaker
+from app.core.rate_limit import RateLimitExceeded
+from app.services.weather_service import weather_service
+
+
+class QuotaTest(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker("weather-test", failure_threshold=1, recovery_seconds=60)
+        patchers = [mock.patch.object(weather_service, "breaker", self.breaker),
+                    mock.patch.object(weather_service.rate_limiter, "aacquire", mock.AsyncMock())]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        weather_service.clear_cache()
+
+    def test_open_circuit_takes_no_quota(self):
+        self.breaker.record_failure()
+        weather = asyncio.run(weather_service.get_weather_data(2.5, 31.5))
+        self.assertEqual(weather["location"], "Unknown")
+        weather_service.rate_limiter.aacquire.assert_not_called()
+
+    def test_quota_refusal_gives_back_the_probe(self):
+        self.breaker.record_failure()
+        self.breaker.recovery_seconds = 0
+        weather_service.rate_limiter.aacquire.side_effect = RateLimitExceeded("openweather", 1.0)
+        asyncio.run(weather_service.get_weather_data(2.5, 31.5))
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+
+if __name__ == "__main__":
+    unittest.main()
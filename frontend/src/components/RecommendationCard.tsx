@@ -5,6 +5,11 @@ import { motion } from "framer-motion";
 import type { Recommendation } from "../types";
 import { useNotify } from "../contexts/NotificationProvider";
 
+// A test holds an answer per SMS menu option; the crop suggestion is the one to show first
+export function primaryRecommendation(recommendations?: Recommendation[]): Recommendation | undefined {
+  return recommendations?.find((r) => r.recommendation_type === "crop_suggestion") ?? recommendations?.[0];
+}
+
 export default function RecommendationCard({ recommendation, collapsedLines = 3 }: { recommendation: Recommendation; collapsedLines?: number; }) {
   const [expanded, setExpanded] = useState(false);
   const notify = useNotify();
@@ -23,7 +28,7 @@ export default function RecommendationCard({ recommendation, collapsedLines = 3
     <motion.div whileHover={{ translateY: -4 }} style={{ display: "block" }}>
       <Box sx={{ p: 2, bgcolor: "background.paper", borderRadius: 1, boxShadow: 1 }}>
         <Stack direction="row" justifyContent="space-between" alignItems="center">
-          <Chip label={recommendation.recommendation_type ?? "recommendation"} size="small" color="primary" />
+          <Chip label={[recommendation.recommendation_type ?? "recommendation", recommendation.crop].filter(Boolean).join(" · ")} size="small" color="primary" />
           <Stack direction="row" spacing={0.5}>
             <IconButton size="small" onClick={copy} aria-label="copy rec"><FiCopy /></IconButton>
             <IconButton size="small" onClick={share} aria-label="share rec"><FiShare2 /></IconButton>
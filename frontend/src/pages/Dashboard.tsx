@@ -3,37 +3,17 @@ import PeopleIcon from "@mui/icons-material/People";
 import PlaceIcon from "@mui/icons-material/Place";
 import AccessTimeIcon from "@mui/icons-material/AccessTime";
 import { useQuery } from "@tanstack/react-query";
-import { getFarmers } from "../api/mockApi";
+import { getDashboardSummary } from "../api/mockApi";
 import { motion } from "framer-motion";
 import PageShell from "../components/PageShell";
 
 export default function Dashboard() {
-  const { data: farmersData } = useQuery({ queryKey: ["farmers"], queryFn: getFarmers });
+  // Pre-aggregated on the server, so the page costs one request however many farmers there are
+  const { data: summary } = useQuery({ queryKey: ["dashboard-summary"], queryFn: () => getDashboardSummary() });
 
-  const farmers = farmersData?.farmers ?? [];
-  const totalFarmers = farmers.length;
-
-  const newestFarmer = (() => {
-    if (!farmers.length) return null;
-    const valid = farmers.filter((f) => f.created_at);
-    if (!valid.length) return null;
-    return valid.reduce((latest, cur) => {
-      const latestDate = new Date(latest.created_at ?? 0).getTime();
-      const curDate = new Date(cur.created_at ?? 0).getTime();
-      return curDate > latestDate ? cur : latest;
-    });
-  })();
-
-  const farmersByRegion = (() => {
-    const map = new Map<string, number>();
-    farmers.forEach((f) => {
-      const key = f.region?.trim() || "Unknown";
-      map.set(key, (map.get(key) ?? 0) + 1);
-    });
-    return Array.from(map.entries())
-      .map(([region, count]) => ({ region, count }))
-      .sort((a, b) => b.count - a.count || a.region.localeCompare(b.region));
-  })();
+  const totalFarmers = summary?.farmers.total ?? 0;
+  const newestFarmer = summary?.farmers.newest ?? null;
+  const farmersByRegion = summary?.farmers.by_region ?? [];
 
   const newestDate = newestFarmer?.created_at
     ? new Date(newestFarmer.created_at).toLocaleString()
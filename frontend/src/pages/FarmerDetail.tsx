@@ -24,7 +24,7 @@ import SoilTestDetail from "./SoilTestDetail";
 import SMSLogs from "./SMSLogs";
 import { FiCopy } from "react-icons/fi";
 import { motion } from "framer-motion";
-import RecommendationCard from "../components/RecommendationCard";
+import RecommendationCard, { primaryRecommendation } from "../components/RecommendationCard";
 import PageShell from "../components/PageShell";
 
 export default function FarmerDetail() {
@@ -160,7 +160,7 @@ export default function FarmerDetail() {
                       <Typography variant="h6">{t.location_name}</Typography>
                       <Typography color="text.secondary">pH: {t.ph} • Moisture: {t.moisture}%</Typography>
                       <Box mt={1}>
-                        <RecommendationCard recommendation={t.recommendations?.[0] ?? { id: "n/a", recommendation_type: "none", content: "No recommendation available." }} collapsedLines={2} />
+                        <RecommendationCard recommendation={primaryRecommendation(t.recommendations) ?? { id: "n/a", recommendation_type: "none", content: "No recommendation available." }} collapsedLines={2} />
                       </Box>
                     </Stack>
                   </Paper>
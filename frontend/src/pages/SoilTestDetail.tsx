@@ -7,7 +7,7 @@ import type { SoilTest } from "../types";
 import { ResponsiveContainer, BarChart, Bar, Cell, XAxis, YAxis, Tooltip as ReTooltip, CartesianGrid, LabelList } from "recharts";
 import { MapContainer, TileLayer, Marker, Popup } from "react-leaflet";
 import { FiCopy } from "react-icons/fi";
-import RecommendationCard from "../components/RecommendationCard";
+import RecommendationCard, { primaryRecommendation } from "../components/RecommendationCard";
 
 export default function SoilTestDetail({ test }: { test: SoilTest }) {
   const hasNumber = (v: unknown): v is number => typeof v === "number" && !Number.isNaN(v);
@@ -70,7 +70,7 @@ export default function SoilTestDetail({ test }: { test: SoilTest }) {
   }));
 
   const copyRecommendation = async () => {
-    const text = test.recommendations?.[0]?.content ?? "";
+    const text = primaryRecommendation(test.recommendations)?.content ?? "";
     await navigator.clipboard?.writeText(text);
   };
 
@@ -195,7 +195,7 @@ export default function SoilTestDetail({ test }: { test: SoilTest }) {
 
           <Typography variant="subtitle2">AI Recommendation</Typography>
           <Box mt={1}>
-            <RecommendationCard recommendation={test.recommendations?.[0] ?? { id: "n/a", recommendation_type: "none", content: "No recommendation available." }} />
+            <RecommendationCard recommendation={primaryRecommendation(test.recommendations) ?? { id: "n/a", recommendation_type: "none", content: "No recommendation available." }} />
           </Box>
         </Box>
       </Box>
@@ -1,54 +1,55 @@
-export type Farmer = {
-  id: string;
-  name: string;
-  phone_number: string;
-  region?: string;
-  district?: string;
-  pin?: string;
-  created_at?: string;
-  updated_at?: string;
-  };
-  
-  export type Device = {
-  id: string;
-  device_id: string;
-  sim_number?: string;
-  farmer_id?: string;
-  api_token?: string;
-  is_active?: boolean;
-  created_at?: string;
-  updated_at?: string;
-  };
-  
-  export type Recommendation = {
-  id: string;
-  recommendation_type: string;
-  content: string;
-  crops_suggested?: any;
-  created_at?: string;
-  };
-  
-  export type SoilTest = {
-  id: string;
-  device_id?: string;
-  farmer_id?: string;
-  timestamp: string;
-  latitude?: number;
-  longitude?: number;
-  ph?: number;
-  moisture?: number;
-  temperature?: number;
-  ec?: number;
-  nitrogen?: number;
-  phosphorus?: number;
-  potassium?: number;
-  location_name?: string;
-  sample_number?: number;
-  sample_depth_cm?: number;
-  recommendations?: Recommendation[];
-  created_at?: string;
-  };
-  
+export type Farmer = {
+  id: string;
+  name: string;
+  phone_number: string;
+  region?: string;
+  district?: string;
+  pin?: string;
+  created_at?: string;
+  updated_at?: string;
+  };
+  
+  export type Device = {
+  id: string;
+  device_id: string;
+  sim_number?: string;
+  farmer_id?: string;
+  api_token?: string;
+  is_active?: boolean;
+  created_at?: string;
+  updated_at?: string;
+  };
+  
+  export type Recommendation = {
+  id: string;
+  recommendation_type: string;
+  crop?: string;
+  content: string;
+  crops_suggested?: any;
+  created_at?: string;
+  };
+  
+  export type SoilTest = {
+  id: string;
+  device_id?: string;
+  farmer_id?: string;
+  timestamp: string;
+  latitude?: number;
+  longitude?: number;
+  ph?: number;
+  moisture?: number;
+  temperature?: number;
+  ec?: number;
+  nitrogen?: number;
+  phosphorus?: number;
+  potassium?: number;
+  location_name?: string;
+  sample_number?: number;
+  sample_depth_cm?: number;
+  recommendations?: Recommendation[];
+  created_at?: string;
+  };
+  
 export type SMSLog = {
   id: string;
   farmer_id?: string;
@@ -67,6 +68,26 @@ export type AdminUser = {
   created_at: string;
 };
 
+export type DashboardSummary = {
+  generated_at: string;
+  farmers: {
+    total: number;
+    regions: number;
+    by_region: { region: string; count: number }[];
+    newest: { id: string; name: string; created_at?: string } | null;
+  };
+  devices: { total: number; active: number; active_window_days: number };
+  soil_tests: { total: number; today: number };
+  sms: { sent: number; failed: number; received: number };
+  per_day: {
+    date: string;
+    soil_tests: number;
+    sms_sent: number;
+    sms_failed: number;
+    sms_received: number;
+  }[];
+};
+
 export type AuthResponse = {
   access_token: string;
   token_type: "bearer";